@@ -0,0 +1,93 @@
+"""
+Measures per-invocation overhead of asyncio.run with a new client per invocation, as lambda_handler used to do,
+against a persistent event loop runner with a shared client, using both the asyncio and uvloop event loops.
+
+Each simulated invocation sends a few concurrent requests to a local keep-alive HTTP server.
+
+Usage: python -m benchmarks.bench_event_loop [--invocations N] [--requests N]
+"""
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from src.event_loop import create_runner
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = b"[]"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+async def invoke(client: httpx.AsyncClient, url: str, requests: int):
+    await asyncio.gather(*[client.get(url) for _ in range(requests)])
+
+
+async def invoke_with_new_client(url: str, requests: int):
+    async with httpx.AsyncClient() as client:
+        await invoke(client, url, requests)
+
+
+def time_invocations(run_invocation, invocations: int) -> list[float]:
+    durations = []
+
+    for _ in range(invocations):
+        start = time.perf_counter()
+        run_invocation()
+        durations.append(time.perf_counter() - start)
+
+    return durations
+
+
+def report(name: str, durations: list[float]):
+    durations_ms = [duration * 1000 for duration in durations]
+    print(
+        f"{name:>18} {statistics.mean(durations_ms):>8.2f} {statistics.median(durations_ms):>8.2f} "
+        f"{statistics.quantiles(durations_ms, n=100)[98]:>8.2f}"
+    )
+
+
+def main(invocations: int, requests: int):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/data/me/top/artists"
+
+    print(f"invocations={invocations} requests_per_invocation={requests}")
+    print(f"{'mode':>18} {'mean_ms':>8} {'p50_ms':>8} {'p99_ms':>8}")
+
+    report(
+        "asyncio.run",
+        time_invocations(lambda: asyncio.run(invoke_with_new_client(url, requests)), invocations)
+    )
+
+    for event_loop in ["asyncio", "uvloop"]:
+        with create_runner(event_loop) as runner:
+            client = httpx.AsyncClient()
+            durations = time_invocations(lambda: runner.run(invoke(client, url, requests)), invocations)
+            runner.run(client.aclose())
+            report(f"persistent {event_loop}", durations)
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--invocations", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=4)
+    args = parser.parse_args()
+    main(invocations=args.invocations, requests=args.requests)
@@ -0,0 +1,117 @@
+"""
+Compares the original message format against the dictionary-encoded format for size (raw and gzip-compressed, as
+stored by the claim check) and for encode and decode time.
+
+Usage: python -m benchmarks.bench_message_format [--items N] [--overlap F] [--repeats N]
+"""
+import argparse
+import gzip
+import json
+import random
+import string
+import time
+
+from src.message_format import create_message_data
+from src.message_format import decode_user_spotify_data
+from src.models import UserSpotifyData, TopArtistsData, TopArtist, TopTracksData, TopTrack, TopGenresData, TopGenre, \
+    TopEmotionsData, TopEmotion, TimeRange
+
+
+def create_spotify_id(rng: random.Random) -> str:
+    return "".join(rng.choices(string.ascii_letters + string.digits, k=22))
+
+
+def create_ids_per_time_range(rng: random.Random, items: int, overlap: float) -> list[list[str]]:
+    shared = [create_spotify_id(rng) for _ in range(int(items * overlap))]
+    ids_per_time_range = []
+
+    for _ in TimeRange:
+        ids = shared + [create_spotify_id(rng) for _ in range(items - len(shared))]
+        rng.shuffle(ids)
+        ids_per_time_range.append(ids)
+
+    return ids_per_time_range
+
+
+def create_user_spotify_data(items: int, overlap: float) -> UserSpotifyData:
+    rng = random.Random(0)
+    artist_ids = create_ids_per_time_range(rng, items, overlap)
+    track_ids = create_ids_per_time_range(rng, items, overlap)
+    genres = [f"genre {index}" for index in range(items)]
+    emotions = ["joy", "sadness", "anger", "fear", "surprise", "love", "calm"]
+
+    return UserSpotifyData(
+        refresh_token="refresh",
+        top_artists_data=[
+            TopArtistsData(
+                top_artists=[TopArtist(id=artist_id, position=index + 1) for index, artist_id in enumerate(ids)],
+                time_range=time_range
+            )
+            for time_range, ids in zip(TimeRange, artist_ids)
+        ],
+        top_tracks_data=[
+            TopTracksData(
+                top_tracks=[TopTrack(id=track_id, position=index + 1) for index, track_id in enumerate(ids)],
+                time_range=time_range
+            )
+            for time_range, ids in zip(TimeRange, track_ids)
+        ],
+        top_genres_data=[
+            TopGenresData(
+                top_genres=[TopGenre(name=genre, count=rng.randint(1, 20)) for genre in rng.sample(genres, items // 2)],
+                time_range=time_range
+            )
+            for time_range in TimeRange
+        ],
+        top_emotions_data=[
+            TopEmotionsData(
+                top_emotions=[
+                    TopEmotion(name=rng.choice(emotions), percentage=round(rng.random(), 4), track_id=track_id)
+                    for track_id in ids
+                ],
+                time_range=time_range
+            )
+            for time_range, ids in zip(TimeRange, track_ids)
+        ]
+    )
+
+
+def time_per_call(function, repeats: int) -> float:
+    start = time.perf_counter()
+
+    for _ in range(repeats):
+        function()
+
+    return (time.perf_counter() - start) / repeats
+
+
+def main(items: int, overlap: float, repeats: int):
+    user_spotify_data = create_user_spotify_data(items, overlap)
+    print(f"items_per_time_range={items} overlap={overlap} repeats={repeats}")
+    print(f"{'version':>7} {'bytes':>8} {'gzip_bytes':>10} {'encode_us':>10} {'decode_us':>10}")
+
+    for format_version in [1, 2]:
+        def encode() -> str:
+            return json.dumps(create_message_data("user", user_spotify_data, format_version))
+
+        message = encode()
+
+        def decode() -> UserSpotifyData:
+            return decode_user_spotify_data(json.loads(message))
+
+        assert decode() == user_spotify_data
+        encode_seconds = time_per_call(encode, repeats)
+        decode_seconds = time_per_call(decode, repeats)
+        print(
+            f"{format_version:>7} {len(message.encode()):>8} {len(gzip.compress(message.encode())):>10} "
+            f"{encode_seconds * 1_000_000:>10.0f} {decode_seconds * 1_000_000:>10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=50)
+    parser.add_argument("--overlap", type=float, default=0.6, help="Share of ids repeated across time ranges")
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+    main(items=args.items, overlap=args.overlap, repeats=args.repeats)
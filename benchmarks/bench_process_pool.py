@@ -0,0 +1,95 @@
+"""
+Compares parsing and serializing a batch of users inline on the event loop against offloading the same work to a
+process pool, to find the batch size where the process pool starts to pay off.
+
+Usage: python -m benchmarks.bench_process_pool [--workers N] [--items N]
+"""
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+
+from src.data_service import build_user_message
+from src.models import ItemType, TimeRange
+from src.process_pool import get_available_cpus
+
+BATCH_SIZES = [1, 5, 10, 25, 50, 100]
+
+Responses = list[tuple[ItemType, TimeRange, bytes]]
+
+
+def create_item(item_type: ItemType, index: int) -> dict:
+    if item_type == ItemType.GENRE:
+        return {"name": f"genre{index}", "count": index}
+
+    if item_type == ItemType.EMOTION:
+        return {"name": f"emotion{index}", "percentage": index / 100, "track_id": f"track{index:018d}"}
+
+    return {
+        "id": f"{item_type.value}{index:018d}",
+        "name": f"Some {item_type.value} name {index}",
+        "popularity": index,
+        "uri": f"spotify:{item_type.value}:{index:022d}",
+        "images": [{"url": f"https://i.scdn.co/image/{index:040d}", "height": 640, "width": 640}] * 3,
+        "external_urls": {"spotify": f"https://open.spotify.com/{item_type.value}/{index:022d}"}
+    }
+
+
+def create_responses(items: int) -> Responses:
+    return [
+        (item_type, time_range, json.dumps([create_item(item_type, index) for index in range(items)]).encode())
+        for item_type in ItemType
+        for time_range in TimeRange
+    ]
+
+
+def process_user_inline(responses: Responses) -> bytes:
+    return build_user_message(user_id="user", refresh_token="refresh", responses=responses)
+
+
+async def process_user_in_executor(executor: Executor, responses: Responses) -> bytes:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, build_user_message, "user", "refresh", responses)
+
+
+async def run_inline(batch_size: int, responses: Responses) -> float:
+    start = time.perf_counter()
+
+    for _ in range(batch_size):
+        process_user_inline(responses)
+        await asyncio.sleep(0)
+
+    return time.perf_counter() - start
+
+
+async def run_in_executor(executor: Executor, batch_size: int, responses: Responses) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*[process_user_in_executor(executor, responses) for _ in range(batch_size)])
+    return time.perf_counter() - start
+
+
+async def main(workers: int, items: int):
+    responses = create_responses(items)
+    response_bytes = sum(len(content) for _, _, content in responses)
+    print(f"workers={workers} items_per_response={items} response_bytes={response_bytes}")
+    print(f"{'batch':>6} {'inline_ms':>10} {'pool_ms':>10} {'speedup':>8}")
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        await run_in_executor(executor, workers, responses)
+
+        for batch_size in BATCH_SIZES:
+            inline_seconds = await run_inline(batch_size, responses)
+            pool_seconds = await run_in_executor(executor, batch_size, responses)
+            print(
+                f"{batch_size:>6} {inline_seconds * 1000:>10.1f} {pool_seconds * 1000:>10.1f} "
+                f"{inline_seconds / pool_seconds:>7.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=get_available_cpus())
+    parser.add_argument("--items", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(workers=args.workers, items=args.items))
@@ -0,0 +1,352 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+from typing import AsyncIterator, TextIO
+
+import boto3
+import httpx
+from botocore.client import BaseClient
+from loguru import logger
+
+from src.claim_check import ClaimCheck, create_object_store
+from src.data_service import DataService
+from src.lambda_function import publish_message, DEFAULT_CLAIM_CHECK_THRESHOLD_BYTES
+from src.models import User
+from src.process_pool import get_process_pool, parse_process_pool_workers
+from src.queue_router import QueueRouter, get_queue_router, parse_queue_urls
+
+
+class BackfillException(Exception):
+    def __init__(self, message: str):
+        super().__init__(message)
+
+
+class Checkpoint:
+    """
+    Tracks how many input records have been fully processed.
+
+    Records complete out of order under concurrency, so only the contiguous prefix of completed records is persisted.
+    Records completed beyond that prefix are held in memory until it catches up, so one slow record holds the watermark
+    back while every record completed after it accumulates.
+    """
+
+    def __init__(self, path: str | None):
+        self.path = path
+        self.watermark = 0
+        self._completed_above_watermark = set()
+
+    def load(self) -> int:
+        if self.path is None or not os.path.exists(self.path):
+            return self.watermark
+
+        with open(self.path) as file:
+            data = json.load(file)
+
+        self.watermark = data["processed"]
+        logger.info(f"Resuming backfill from checkpoint - {self.watermark} records already processed")
+        return self.watermark
+
+    def _save(self):
+        if self.path is None:
+            return
+
+        temp_path = f"{self.path}.tmp"
+
+        with open(temp_path, "w") as file:
+            json.dump({"processed": self.watermark}, file)
+
+        os.replace(temp_path, self.path)
+
+    def mark_done(self, index: int):
+        self._completed_above_watermark.add(index)
+        previous_watermark = self.watermark
+
+        while self.watermark in self._completed_above_watermark:
+            self._completed_above_watermark.remove(self.watermark)
+            self.watermark += 1
+
+        if self.watermark != previous_watermark:
+            self._save()
+
+
+class JsonlSink:
+    def __init__(self, file: TextIO):
+        self.file = file
+
+    async def write(self, user_id: str, message: bytes):
+        self.file.write(f"{message.decode()}\n")
+        self.file.flush()
+
+
+class SQSSink:
+    def __init__(
+            self,
+            sqs: BaseClient,
+            queue_url: str,
+            claim_check: ClaimCheck | None = None,
+            queue_router: QueueRouter | None = None
+    ):
+        self.sqs = sqs
+        self.queue_url = queue_url
+        self.claim_check = claim_check
+        self.queue_router = queue_router
+
+    async def write(self, user_id: str, message: bytes):
+        await asyncio.to_thread(
+            publish_message,
+            sqs=self.sqs,
+            queue_url=self.queue_url,
+            user_id=user_id,
+            message=message.decode(),
+            claim_check=self.claim_check,
+            queue_router=self.queue_router
+        )
+
+
+async def read_users(file: TextIO, skip: int = 0) -> AsyncIterator[tuple[int, User | None]]:
+    index = 0
+
+    while True:
+        line = await asyncio.to_thread(file.readline)
+
+        if not line:
+            break
+
+        if not line.strip():
+            continue
+
+        if index >= skip:
+            try:
+                data = json.loads(line)
+                user = User(id=data["user_id"], refresh_token=data["refresh_token"])
+            except (json.JSONDecodeError, KeyError, TypeError) as e:
+                logger.error(f"Invalid user record at index {index} - {e}")
+                user = None
+
+            yield index, user
+
+        index += 1
+
+
+async def _fetch_user_message(
+        index: int,
+        user: User | None,
+        data_service: DataService,
+        format_version: int
+) -> tuple[int, User | None, bytes | None]:
+    if user is None:
+        return index, user, None
+
+    try:
+        message = await data_service.get_user_spotify_message(
+            refresh_token=user.refresh_token,
+            user_id=user.id,
+            format_version=format_version
+        )
+        return index, user, message
+    except Exception as e:
+        logger.error(f"Failed to fetch data for user {user.id} - {e}")
+        return index, user, None
+
+
+async def process_users(
+        users: AsyncIterator[tuple[int, User | None]],
+        data_service: DataService,
+        concurrency: int,
+        format_version: int = 1
+) -> AsyncIterator[tuple[int, User | None, bytes | None]]:
+    pending = set()
+
+    async for index, user in users:
+        if len(pending) >= concurrency:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+            for task in done:
+                yield task.result()
+
+        pending.add(
+            asyncio.create_task(
+                _fetch_user_message(index=index, user=user, data_service=data_service, format_version=format_version)
+            )
+        )
+
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+        for task in done:
+            yield task.result()
+
+
+def write_reject(rejects: TextIO, user: User):
+    rejects.write(f"{json.dumps({'user_id': user.id, 'refresh_token': user.refresh_token})}\n")
+    rejects.flush()
+
+
+async def run_backfill(
+        input_file: TextIO,
+        data_service: DataService,
+        sink: JsonlSink | SQSSink,
+        checkpoint: Checkpoint,
+        concurrency: int,
+        format_version: int = 1,
+        rejects: TextIO | None = None
+) -> dict[str, int]:
+    """
+    Fetches and writes every user in input_file, checkpointing progress so an interrupted run can resume.
+
+    Records are checkpointed whether or not they succeed. Users whose fetch or write failed are appended to rejects,
+    in the same format as the input, so they can be replayed with another run.
+    """
+    skip = checkpoint.load()
+    users = read_users(file=input_file, skip=skip)
+    summary = {"succeeded": 0, "failed": 0}
+
+    async for index, user, message in process_users(
+            users=users,
+            data_service=data_service,
+            concurrency=concurrency,
+            format_version=format_version
+    ):
+        failed = message is None
+
+        if not failed:
+            try:
+                await sink.write(user_id=user.id, message=message)
+            except Exception as e:
+                logger.error(f"Failed to write data for user {user.id} - {e}")
+                failed = True
+
+        if failed:
+            summary["failed"] += 1
+
+            if rejects is not None and user is not None:
+                write_reject(rejects=rejects, user=user)
+        else:
+            summary["succeeded"] += 1
+
+        checkpoint.mark_done(index)
+
+    logger.info(f"Backfill complete: {summary}")
+
+    if summary["failed"] and rejects is None:
+        logger.warning(f"{summary['failed']} failed records were not saved - pass --rejects to keep them for replay")
+
+    return summary
+
+
+def parse_args(args: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Backfill user Spotify top items outside Lambda")
+    parser.add_argument("--input", default="-", help="JSONL file of user_id/refresh_token records, or - for stdin")
+    parser.add_argument("--sink", choices=["sqs", "jsonl"], default="sqs")
+    parser.add_argument("--output", default="-", help="Output path for the jsonl sink, or - for stdout")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file used to resume an interrupted backfill")
+    parser.add_argument(
+        "--rejects",
+        default=None,
+        help="JSONL file that failed user records are appended to, which can be replayed with --input"
+    )
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--data-api-base-url", default=os.environ.get("DATA_API_BASE_URL"))
+    parser.add_argument("--request-timeout", type=float, default=float(os.environ.get("REQUEST_TIMEOUT", "10.0")))
+    parser.add_argument("--queue-url", default=os.environ.get("QUEUE_URL"))
+    parser.add_argument(
+        "--output-queue-urls",
+        type=parse_queue_urls,
+        default=os.environ.get("OUTPUT_QUEUE_URLS"),
+        help="Comma-separated output queues to shard users across with consistent hashing, instead of --queue-url"
+    )
+    parser.add_argument(
+        "--claim-check-location",
+        default=os.environ.get("CLAIM_CHECK_LOCATION"),
+        help="s3://bucket/prefix or local directory for messages too large to send inline to SQS"
+    )
+    parser.add_argument(
+        "--claim-check-threshold-bytes",
+        type=int,
+        default=int(os.environ.get("CLAIM_CHECK_THRESHOLD_BYTES", str(DEFAULT_CLAIM_CHECK_THRESHOLD_BYTES)))
+    )
+    parser.add_argument(
+        "--process-pool-workers",
+        type=parse_process_pool_workers,
+        default=os.environ.get("PROCESS_POOL_WORKERS", "0"),
+        help="Number of processes for CPU-bound parsing, or auto to use every available CPU"
+    )
+    parser.add_argument(
+        "--message-format-version",
+        type=int,
+        choices=[1, 2],
+        default=int(os.environ.get("MESSAGE_FORMAT_VERSION", "1")),
+        help="Published message format, 2 being the dictionary-encoded format"
+    )
+    return parser.parse_args(args)
+
+
+async def main(args: argparse.Namespace) -> dict[str, int]:
+    if args.data_api_base_url is None:
+        raise BackfillException("DATA_API_BASE_URL must be set")
+
+    if args.sink == "sqs" and args.queue_url is None and not args.output_queue_urls:
+        raise BackfillException("QUEUE_URL or OUTPUT_QUEUE_URLS must be set for the sqs sink")
+
+    if args.concurrency < 1:
+        raise BackfillException("Concurrency must be at least 1")
+
+    input_file = sys.stdin if args.input == "-" else open(args.input)
+    output_file = None
+    rejects_file = None if args.rejects is None else open(args.rejects, "a")
+
+    if args.sink == "jsonl":
+        output_file = sys.stdout if args.output == "-" else open(args.output, "a")
+        sink = JsonlSink(output_file)
+    else:
+        claim_check = None
+
+        if args.claim_check_location is not None:
+            claim_check = ClaimCheck(
+                object_store=create_object_store(args.claim_check_location),
+                threshold_bytes=args.claim_check_threshold_bytes
+            )
+
+        sink = SQSSink(
+            sqs=boto3.client("sqs"),
+            queue_url=args.queue_url,
+            claim_check=claim_check,
+            queue_router=get_queue_router(args.output_queue_urls)
+        )
+
+    client = httpx.AsyncClient(limits=httpx.Limits(max_connections=args.concurrency * 4))
+
+    try:
+        data_service = DataService(
+            client=client,
+            data_api_base_url=args.data_api_base_url,
+            request_timeout=args.request_timeout,
+            executor=get_process_pool(args.process_pool_workers)
+        )
+
+        return await run_backfill(
+            input_file=input_file,
+            data_service=data_service,
+            sink=sink,
+            checkpoint=Checkpoint(args.checkpoint),
+            concurrency=args.concurrency,
+            format_version=args.message_format_version,
+            rejects=rejects_file
+        )
+    finally:
+        await client.aclose()
+
+        if input_file is not sys.stdin:
+            input_file.close()
+
+        if output_file is not None and output_file is not sys.stdout:
+            output_file.close()
+
+        if rejects_file is not None:
+            rejects_file.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,143 @@
+import time
+from collections import deque
+from functools import cache
+from typing import Callable
+
+from loguru import logger
+
+from src.models import CircuitState, CircuitBreakerSettings
+
+
+class CircuitBreaker:
+    """
+    Tracks the outcome of recent calls to one endpoint and stops calls to it while it is unhealthy.
+
+    The breaker opens once at least minimum_calls have been recorded in the sliding window and either the failure
+    rate or the slow call rate reaches its threshold. After open_duration it lets a limited number of probe calls
+    through (half-open), closing again if they all succeed and re-opening on the first bad one.
+    """
+
+    def __init__(self, name: str, settings: CircuitBreakerSettings, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.settings = settings
+        self.clock = clock
+        self._state = CircuitState.CLOSED
+        self._outcomes = deque(maxlen=settings.window_size)
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._half_open_successes = 0
+
+    @property
+    def state(self) -> CircuitState:
+        if self._state == CircuitState.OPEN and self.retry_after == 0:
+            self._transition(CircuitState.HALF_OPEN)
+
+        return self._state
+
+    @property
+    def retry_after(self) -> float:
+        if self._state != CircuitState.OPEN:
+            return 0.0
+
+        return max(0.0, self._opened_at + self.settings.open_duration - self.clock())
+
+    def _transition(self, state: CircuitState):
+        logger.warning(f"Circuit breaker {self.name} changed state from {self._state} to {state}")
+        self._state = state
+        self._half_open_calls = 0
+        self._half_open_successes = 0
+
+        if state == CircuitState.OPEN:
+            self._opened_at = self.clock()
+        elif state == CircuitState.CLOSED:
+            self._outcomes.clear()
+
+    def allow_request(self) -> bool:
+        state = self.state
+
+        if state == CircuitState.CLOSED:
+            return True
+
+        if state == CircuitState.HALF_OPEN and self._half_open_calls < self.settings.half_open_max_calls:
+            self._half_open_calls += 1
+            return True
+
+        return False
+
+    def release(self):
+        """Gives back a half-open probe slot for a call that was cancelled before it completed."""
+        if self._state == CircuitState.HALF_OPEN and self._half_open_calls > 0:
+            self._half_open_calls -= 1
+
+    def _rates(self) -> tuple[float, float]:
+        if not self._outcomes:
+            return 0.0, 0.0
+
+        failures = sum(1 for failed, _ in self._outcomes if failed)
+        slow_calls = sum(1 for _, slow in self._outcomes if slow)
+        return failures / len(self._outcomes), slow_calls / len(self._outcomes)
+
+    def record(self, failed: bool, latency: float):
+        slow = latency >= self.settings.slow_call_duration
+
+        if self._state == CircuitState.HALF_OPEN:
+            if failed or slow:
+                self._transition(CircuitState.OPEN)
+                return
+
+            self._half_open_successes += 1
+
+            if self._half_open_successes >= self.settings.half_open_max_calls:
+                self._transition(CircuitState.CLOSED)
+
+            return
+
+        if self._state == CircuitState.OPEN:
+            return
+
+        self._outcomes.append((failed, slow))
+
+        if len(self._outcomes) < self.settings.minimum_calls:
+            return
+
+        failure_rate, slow_call_rate = self._rates()
+
+        if (
+                failure_rate >= self.settings.failure_rate_threshold
+                or slow_call_rate >= self.settings.slow_call_rate_threshold
+        ):
+            self._transition(CircuitState.OPEN)
+
+    def health(self) -> dict:
+        failure_rate, slow_call_rate = self._rates()
+        return {
+            "state": self.state.value,
+            "calls": len(self._outcomes),
+            "failure_rate": failure_rate,
+            "slow_call_rate": slow_call_rate,
+            "retry_after": self.retry_after
+        }
+
+
+class CircuitBreakerRegistry:
+    def __init__(self, settings: CircuitBreakerSettings, clock: Callable[[], float] = time.monotonic):
+        self.settings = settings
+        self.clock = clock
+        self._circuit_breakers = {}
+
+    def get(self, name: str) -> CircuitBreaker:
+        if name not in self._circuit_breakers:
+            self._circuit_breakers[name] = CircuitBreaker(name=name, settings=self.settings, clock=self.clock)
+
+        return self._circuit_breakers[name]
+
+    def health(self) -> dict[str, dict]:
+        return {name: circuit_breaker.health() for name, circuit_breaker in self._circuit_breakers.items()}
+
+
+@cache
+def get_circuit_breaker_registry(settings: CircuitBreakerSettings | None) -> CircuitBreakerRegistry | None:
+    if settings is None:
+        return None
+
+    return CircuitBreakerRegistry(settings)
@@ -0,0 +1,152 @@
+import gzip
+import json
+import os
+import uuid
+from abc import ABC, abstractmethod
+from functools import cache
+
+import boto3
+from botocore.client import BaseClient
+from loguru import logger
+
+from src.models import ClaimCheckSettings
+
+
+class ObjectStoreException(Exception):
+    def __init__(self, message: str):
+        super().__init__(message)
+
+
+class ObjectNotFoundException(ObjectStoreException):
+    def __init__(self, message: str):
+        super().__init__(message)
+
+
+class ObjectStore(ABC):
+    @abstractmethod
+    def uri(self, key: str) -> str:
+        pass
+
+    @abstractmethod
+    def put(self, key: str, data: bytes):
+        pass
+
+    @abstractmethod
+    def get(self, key: str) -> bytes:
+        pass
+
+
+class S3ObjectStore(ObjectStore):
+    def __init__(self, s3: BaseClient, bucket: str, prefix: str = ""):
+        self.s3 = s3
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def uri(self, key: str) -> str:
+        return f"s3://{self.bucket}/{self.prefix}{key}"
+
+    def put(self, key: str, data: bytes):
+        self.s3.put_object(Bucket=self.bucket, Key=f"{self.prefix}{key}", Body=data)
+
+    def get(self, key: str) -> bytes:
+        try:
+            res = self.s3.get_object(Bucket=self.bucket, Key=f"{self.prefix}{key}")
+        except self.s3.exceptions.NoSuchKey:
+            raise ObjectNotFoundException(f"Object not found: {self.uri(key)}")
+
+        return res["Body"].read()
+
+
+class LocalObjectStore(ObjectStore):
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+
+        if not path.startswith(os.path.abspath(self.root) + os.sep):
+            raise ObjectStoreException(f"Invalid object key: {key}")
+
+        return path
+
+    def uri(self, key: str) -> str:
+        return f"file://{self._path(key)}"
+
+    def put(self, key: str, data: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(path, "wb") as file:
+            file.write(data)
+
+    def get(self, key: str) -> bytes:
+        try:
+            with open(self._path(key), "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            raise ObjectNotFoundException(f"Object not found: {self.uri(key)}")
+
+
+def create_object_store(location: str) -> ObjectStore:
+    """Creates an object store from an s3://bucket/prefix URI, or a local directory path for testing."""
+    if location.startswith("s3://"):
+        bucket, _, prefix = location.removeprefix("s3://").partition("/")
+        return S3ObjectStore(s3=boto3.client("s3"), bucket=bucket, prefix=prefix)
+
+    return LocalObjectStore(root=location.removeprefix("file://"))
+
+
+class ClaimCheck:
+    """
+    Moves message bodies larger than threshold_bytes out of SQS.
+
+    Oversized bodies are gzip-compressed and written to the object store, and the queue carries a small pointer
+    message in their place. Consumers resolve pointers with read_message.
+    """
+
+    def __init__(self, object_store: ObjectStore, threshold_bytes: int):
+        self.object_store = object_store
+        self.threshold_bytes = threshold_bytes
+
+    def prepare_message(self, user_id: str, message: str) -> str:
+        message_bytes = message.encode()
+
+        if len(message_bytes) <= self.threshold_bytes:
+            return message
+
+        key = f"{user_id}/{uuid.uuid4()}.json.gz"
+        compressed = gzip.compress(message_bytes)
+        self.object_store.put(key=key, data=compressed)
+        logger.info(
+            f"Message of {len(message_bytes)} bytes exceeds claim check threshold - "
+            f"stored {len(compressed)} compressed bytes at {self.object_store.uri(key)}"
+        )
+
+        pointer_message_data = {
+            "user_id": user_id,
+            "claim_check": {"uri": self.object_store.uri(key), "key": key, "content_encoding": "gzip"}
+        }
+        return json.dumps(pointer_message_data)
+
+
+def read_message(body: str, object_store: ObjectStore) -> dict:
+    message_data = json.loads(body)
+    claim_check = message_data.get("claim_check")
+
+    if claim_check is None:
+        return message_data
+
+    data = object_store.get(claim_check["key"])
+
+    if claim_check.get("content_encoding") == "gzip":
+        data = gzip.decompress(data)
+
+    return json.loads(data)
+
+
+@cache
+def get_claim_check(settings: ClaimCheckSettings | None) -> ClaimCheck | None:
+    if settings is None:
+        return None
+
+    return ClaimCheck(object_store=create_object_store(settings.location), threshold_bytes=settings.threshold_bytes)
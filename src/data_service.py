@@ -1,10 +1,29 @@
 import asyncio
+import json
+import time
+from concurrent.futures import Executor
 
 from loguru import logger
 import httpx
 
+from src.circuit_breaker import CircuitBreakerRegistry
+from src.hedging import HedgePolicy
+from src.message_format import serialize_message
+from src.metrics import TransferMetrics
+from src.top_items_cache import TopItemsCache
 from src.models import Tokens, ItemType, TimeRange, UserSpotifyData, TopArtist, TopTrack, TopGenre, TopEmotion, \
-    TopArtistsData, TopTracksData, TopGenresData, TopEmotionsData
+    TopArtistsData, TopTracksData, TopGenresData, TopEmotionsData, CachedTopItems
+
+
+TOP_ITEMS_ENDPOINT_PREFIX = "/data/me/top/"
+RETRY_BACKOFF_SECONDS = 0.1
+
+TOP_ITEMS_FIELDS = {
+    ItemType.ARTIST: "id",
+    ItemType.TRACK: "id",
+    ItemType.GENRE: "name,count",
+    ItemType.EMOTION: "name,percentage,track_id"
+}
 
 
 class DataServiceException(Exception):
@@ -12,30 +31,225 @@ class DataServiceException(Exception):
         super().__init__(message)
 
 
+class RetryableDataServiceException(DataServiceException):
+    def __init__(self, message: str):
+        super().__init__(message)
+
+
+class CircuitOpenException(DataServiceException):
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DeadlineExceededException(DataServiceException):
+    def __init__(self, message: str):
+        super().__init__(message)
+
+
+def build_user_message(
+        user_id: str,
+        refresh_token: str,
+        responses: list[tuple[ItemType, TimeRange, bytes]],
+        format_version: int = 1
+) -> bytes:
+    """
+    Parses every raw top items response for a user and serializes the result as the published message.
+
+    Module level so a process pool worker can do all of a user's CPU-bound work in one call, with only the response
+    bodies going in and the message bytes coming back.
+    """
+    top_items = {item_type: [] for item_type in ItemType}
+
+    for item_type, time_range, content in responses:
+        try:
+            data = json.loads(content)
+        except json.JSONDecodeError as e:
+            raise DataServiceException(f"Invalid JSON in top {item_type}s response - {e}")
+
+        top_items[item_type].append(
+            DataService._create_top_items_data(data=data, item_type=item_type, time_range=time_range)
+        )
+
+    user_spotify_data = UserSpotifyData(
+        refresh_token=refresh_token,
+        top_artists_data=top_items[ItemType.ARTIST],
+        top_tracks_data=top_items[ItemType.TRACK],
+        top_genres_data=top_items[ItemType.GENRE],
+        top_emotions_data=top_items[ItemType.EMOTION]
+    )
+    message = serialize_message(user_id=user_id, user_spotify_data=user_spotify_data, format_version=format_version)
+    return message.encode()
+
+
 class DataService:
-    def __init__(self, client: httpx.AsyncClient, data_api_base_url: str, request_timeout: float):
+    def __init__(
+            self,
+            client: httpx.AsyncClient,
+            data_api_base_url: str,
+            request_timeout: float,
+            executor: Executor | None = None,
+            circuit_breakers: CircuitBreakerRegistry | None = None,
+            hedge_policy: HedgePolicy | None = None,
+            top_items_cache: TopItemsCache | None = None,
+            field_projection: bool = False,
+            limits: dict[ItemType, int] | None = None,
+            transfer_metrics: TransferMetrics | None = None,
+            retry_attempts: int = 0
+    ):
         self.client = client
         self.data_api_base_url = data_api_base_url
         self.request_timeout = request_timeout
+        self.executor = executor
+        self.circuit_breakers = circuit_breakers
+        self.hedge_policy = hedge_policy
+        self.top_items_cache = top_items_cache
+        self.field_projection = field_projection
+        self.limits = limits or {}
+        self.transfer_metrics = transfer_metrics
+        self.retry_attempts = retry_attempts
+
+    def _get_endpoint(self, url: str) -> str:
+        return url.removeprefix(self.data_api_base_url)
+
+    async def _post(
+            self,
+            endpoint: str,
+            url: str,
+            json_data: dict,
+            params: dict | None,
+            headers: dict | None
+    ) -> httpx.Response:
+        start = time.perf_counter()
+        res = await self.client.post(
+            url=url,
+            params=params,
+            json=json_data,
+            headers=headers,
+            timeout=self.request_timeout
+        )
+
+        conditional = headers is not None and ("If-None-Match" in headers or "If-Modified-Since" in headers)
+
+        if not (conditional and res.status_code == httpx.codes.NOT_MODIFIED):
+            res.raise_for_status()
+
+        if self.transfer_metrics is not None:
+            self.transfer_metrics.record(
+                endpoint=endpoint,
+                wire_bytes=res.num_bytes_downloaded,
+                decoded_bytes=len(res.content)
+            )
+
+        if self.hedge_policy is not None:
+            self.hedge_policy.observe(endpoint=endpoint, latency=time.perf_counter() - start)
+
+        return res
+
+    async def _post_with_hedging(
+            self,
+            endpoint: str,
+            url: str,
+            json_data: dict,
+            params: dict | None,
+            headers: dict | None
+    ) -> httpx.Response:
+        hedge_delay = self.hedge_policy.hedge_delay(endpoint)
+        post_kwargs = {"endpoint": endpoint, "url": url, "json_data": json_data, "params": params, "headers": headers}
+        tasks = {asyncio.create_task(self._post(**post_kwargs))}
+
+        try:
+            if hedge_delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+
+                if not done and self.hedge_policy.try_acquire_hedge():
+                    logger.info(f"No response from {endpoint} after {hedge_delay:.3f}s - sending hedged request")
+                    tasks.add(asyncio.create_task(self._post(**post_kwargs)))
+
+            first_error = None
+
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+
+                    first_error = first_error or task.exception()
+
+            raise first_error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _send_request(
+            self,
+            url: str,
+            json_data: dict,
+            params: dict | None = None,
+            headers: dict | None = None
+    ) -> httpx.Response:
+        endpoint = self._get_endpoint(url)
+        circuit_breaker = None if self.circuit_breakers is None else self.circuit_breakers.get(endpoint)
+
+        if circuit_breaker is not None and not circuit_breaker.allow_request():
+            error_message = f"Circuit open for {circuit_breaker.name}"
+            logger.warning(error_message)
+            raise CircuitOpenException(message=error_message, retry_after=circuit_breaker.retry_after)
+
+        start = time.perf_counter()
+        failed = None
 
-    async def _get_data_from_api(self, url: str, json_data: dict, params: dict | None = None):
         try:
             logger.info(f"Sending POST request to {url}")
-            res = await self.client.post(url=url, params=params, json=json_data, timeout=self.request_timeout)
-            res.raise_for_status()
-            return res.json()
+
+            if self.hedge_policy is not None and endpoint.startswith(TOP_ITEMS_ENDPOINT_PREFIX):
+                res = await self._post_with_hedging(
+                    endpoint=endpoint,
+                    url=url,
+                    json_data=json_data,
+                    params=params,
+                    headers=headers
+                )
+            else:
+                res = await self._post(endpoint=endpoint, url=url, json_data=json_data, params=params, headers=headers)
+
+            failed = False
+            return res
         except httpx.HTTPStatusError as e:
-            if e.response.status_code == 401:
+            status_code = e.response.status_code
+            failed = status_code >= 500 or status_code == 429
+
+            if status_code == 401:
                 error_message = "Unauthorised API request"
             else:
                 error_message = "Unsuccessful API request"
 
             logger.error(f"{error_message} - {e}")
+
+            if failed:
+                raise RetryableDataServiceException(error_message)
+
             raise DataServiceException(error_message)
         except httpx.RequestError as e:
+            failed = True
             error_message = "Failed to make API request"
             logger.error(f"{error_message} - {e}")
-            raise DataServiceException(error_message)
+            raise RetryableDataServiceException(error_message)
+        finally:
+            if circuit_breaker is not None:
+                if failed is None:
+                    circuit_breaker.release()
+                else:
+                    circuit_breaker.record(failed=failed, latency=time.perf_counter() - start)
+
+    async def _get_data_from_api(self, url: str, json_data: dict, params: dict | None = None):
+        res = await self._send_request(url=url, json_data=json_data, params=params)
+        return res.json()
+
+    async def _get_raw_data_from_api(self, url: str, json_data: dict, params: dict | None = None) -> bytes:
+        res = await self._send_request(url=url, json_data=json_data, params=params)
+        return res.content
 
     async def _refresh_tokens(self, refresh_token: str) -> Tokens:
         url = f"{self.data_api_base_url}/auth/tokens/refresh"
@@ -91,47 +305,251 @@ class DataService:
             logger.error(error_message)
             raise DataServiceException(error_message)
 
-    async def _get_top_items_data(self, access_token: str, item_type: ItemType, time_range: TimeRange):
+    async def _get_top_items_data_conditionally(
+            self,
+            url: str,
+            json_data: dict,
+            params: dict,
+            user_id: str,
+            item_type: ItemType,
+            time_range: TimeRange
+    ):
+        cached_top_items = self.top_items_cache.get(user_id=user_id, item_type=item_type, time_range=time_range)
+        headers = {}
+
+        if cached_top_items is not None:
+            if cached_top_items.etag is not None:
+                headers["If-None-Match"] = cached_top_items.etag
+
+            if cached_top_items.last_modified is not None:
+                headers["If-Modified-Since"] = cached_top_items.last_modified
+
+        res = await self._send_request(url=url, json_data=json_data, params=params, headers=headers or None)
+
+        if res.status_code == httpx.codes.NOT_MODIFIED:
+            if cached_top_items is None:
+                error_message = f"Top {item_type}s for time range {time_range} not modified but nothing cached"
+                logger.error(error_message)
+                raise DataServiceException(error_message)
+
+            logger.info(f"Top {item_type}s for time range {time_range} not modified - using cached data")
+            return cached_top_items.top_items
+
+        top_items = self._create_top_items_data(data=res.json(), item_type=item_type, time_range=time_range)
+        etag = res.headers.get("ETag")
+        last_modified = res.headers.get("Last-Modified")
+
+        if etag is not None or last_modified is not None:
+            self.top_items_cache.put(
+                user_id=user_id,
+                item_type=item_type,
+                time_range=time_range,
+                cached_top_items=CachedTopItems(etag=etag, last_modified=last_modified, top_items=top_items)
+            )
+
+        return top_items
+
+    def _get_top_items_request(
+            self,
+            access_token: str,
+            item_type: ItemType,
+            time_range: TimeRange
+    ) -> tuple[str, dict, dict]:
         logger.info(f"Fetching top {item_type}s for time range: {time_range}")
 
         url = f"{self.data_api_base_url}/data/me/top/{item_type.value}s"
         json_data = {"access_token": access_token}
         params = {"time_range": time_range.value}
 
-        data = await self._get_data_from_api(url=url, json_data=json_data, params=params)
-        top_items = self._create_top_items_data(data=data, item_type=item_type, time_range=time_range)
+        if self.field_projection:
+            params["fields"] = TOP_ITEMS_FIELDS[item_type]
 
-        return top_items
+        if item_type in self.limits:
+            params["limit"] = self.limits[item_type]
+
+        return url, json_data, params
 
-    async def _get_all_top_items(self, access_token: str, item_type: ItemType):
-        logger.info(f"Fetching top {item_type}s for all time ranges")
+    async def _get_raw_top_items_data(
+            self,
+            access_token: str,
+            item_type: ItemType,
+            time_range: TimeRange
+    ) -> bytes:
+        url, json_data, params = self._get_top_items_request(
+            access_token=access_token,
+            item_type=item_type,
+            time_range=time_range
+        )
+        return await self._get_raw_data_from_api(url=url, json_data=json_data, params=params)
+
+    async def _get_top_items_data(
+            self,
+            access_token: str,
+            item_type: ItemType,
+            time_range: TimeRange,
+            user_id: str | None = None
+    ):
+        url, json_data, params = self._get_top_items_request(
+            access_token=access_token,
+            item_type=item_type,
+            time_range=time_range
+        )
 
-        tasks = [
-            self._get_top_items_data(
-                access_token=access_token,
+        if self.top_items_cache is not None and user_id is not None:
+            top_items = await self._get_top_items_data_conditionally(
+                url=url,
+                json_data=json_data,
+                params=params,
+                user_id=user_id,
                 item_type=item_type,
                 time_range=time_range
             )
-            for time_range in TimeRange
-        ]
+        else:
+            data = await self._get_data_from_api(url=url, json_data=json_data, params=params)
+            top_items = self._create_top_items_data(data=data, item_type=item_type, time_range=time_range)
+
+        return top_items
+
+    async def _get_top_items_data_with_retries(
+            self,
+            access_token: str,
+            item_type: ItemType,
+            time_range: TimeRange,
+            user_id: str | None = None,
+            raw: bool = False
+    ):
+        for attempt in range(self.retry_attempts + 1):
+            try:
+                if raw:
+                    return await self._get_raw_top_items_data(
+                        access_token=access_token,
+                        item_type=item_type,
+                        time_range=time_range
+                    )
+
+                return await self._get_top_items_data(
+                    access_token=access_token,
+                    item_type=item_type,
+                    time_range=time_range,
+                    user_id=user_id
+                )
+            except RetryableDataServiceException as e:
+                if attempt == self.retry_attempts:
+                    raise
+
+                logger.warning(f"Retrying top {item_type}s for time range {time_range} - {e}")
+                await asyncio.sleep(RETRY_BACKOFF_SECONDS * 2 ** attempt)
 
-        all_top_items = await asyncio.gather(*tasks)
+    async def _get_all_top_items(
+            self,
+            access_token: str,
+            item_type: ItemType,
+            user_id: str | None = None,
+            time_ranges: list[TimeRange] | None = None,
+            raw: bool = False
+    ):
+        if time_ranges is None:
+            logger.info(f"Fetching top {item_type}s for all time ranges")
+            time_ranges = list(TimeRange)
+        else:
+            logger.info(f"Fetching top {item_type}s for time ranges: {time_ranges}")
+
+        try:
+            async with asyncio.TaskGroup() as task_group:
+                tasks = [
+                    task_group.create_task(
+                        self._get_top_items_data_with_retries(
+                            access_token=access_token,
+                            item_type=item_type,
+                            time_range=time_range,
+                            user_id=user_id,
+                            raw=raw
+                        )
+                    )
+                    for time_range in time_ranges
+                ]
+        except ExceptionGroup as e:
+            raise e.exceptions[0]
+
+        all_top_items = [task.result() for task in tasks]
         return all_top_items
 
-    async def get_user_spotify_data(self, refresh_token: str) -> UserSpotifyData:
+    async def get_user_spotify_data(
+            self,
+            refresh_token: str,
+            user_id: str | None = None,
+            time_ranges: dict[ItemType, list[TimeRange]] | None = None,
+            timeout: float | None = None
+    ) -> UserSpotifyData:
+        """
+        Fetches the user's top items. If time_ranges is given, only those time ranges are fetched for each item type
+        and the rest are reported as unchanged.
+
+        Requests for an item type run in a task group, so the first non-retryable failure cancels the others.
+        Retryable failures are retried within their own task up to retry_attempts times first. If timeout is given,
+        every request still in flight for the user is cancelled once it elapses.
+        """
+        if timeout is None:
+            return await self._fetch_user_spotify_data(
+                refresh_token=refresh_token,
+                user_id=user_id,
+                time_ranges=time_ranges
+            )
+
+        try:
+            async with asyncio.timeout(timeout):
+                return await self._fetch_user_spotify_data(
+                    refresh_token=refresh_token,
+                    user_id=user_id,
+                    time_ranges=time_ranges
+                )
+        except TimeoutError:
+            error_message = f"Deadline of {timeout:.1f}s exceeded fetching user data"
+            logger.error(error_message)
+            raise DeadlineExceededException(error_message)
+
+    async def _fetch_user_spotify_data(
+            self,
+            refresh_token: str,
+            user_id: str | None,
+            time_ranges: dict[ItemType, list[TimeRange]] | None
+    ) -> UserSpotifyData:
         tokens = await self._refresh_tokens(refresh_token)
         logger.debug(f"Tokens: {tokens}")
 
-        all_top_artists = await self._get_all_top_items(access_token=tokens.access_token, item_type=ItemType.ARTIST)
+        if time_ranges is None:
+            time_ranges = {item_type: list(TimeRange) for item_type in ItemType}
+
+        all_top_artists = await self._get_all_top_items(
+            access_token=tokens.access_token,
+            item_type=ItemType.ARTIST,
+            user_id=user_id,
+            time_ranges=time_ranges[ItemType.ARTIST]
+        )
         logger.debug(f"All top artists: {all_top_artists}")
 
-        all_top_tracks = await self._get_all_top_items(access_token=tokens.access_token, item_type=ItemType.TRACK)
+        all_top_tracks = await self._get_all_top_items(
+            access_token=tokens.access_token,
+            item_type=ItemType.TRACK,
+            user_id=user_id,
+            time_ranges=time_ranges[ItemType.TRACK]
+        )
         logger.debug(f"All top tracks: {all_top_tracks}")
 
-        all_top_genres = await self._get_all_top_items(access_token=tokens.access_token, item_type=ItemType.GENRE)
+        all_top_genres = await self._get_all_top_items(
+            access_token=tokens.access_token,
+            item_type=ItemType.GENRE,
+            user_id=user_id,
+            time_ranges=time_ranges[ItemType.GENRE]
+        )
         logger.debug(f"All top tracks: {all_top_genres}")
 
-        all_top_emotions = await self._get_all_top_items(access_token=tokens.access_token, item_type=ItemType.EMOTION)
+        all_top_emotions = await self._get_all_top_items(
+            access_token=tokens.access_token,
+            item_type=ItemType.EMOTION,
+            user_id=user_id,
+            time_ranges=time_ranges[ItemType.EMOTION]
+        )
         logger.debug(f"All top tracks: {all_top_emotions}")
 
         user_spotify_data = UserSpotifyData(
@@ -139,8 +557,50 @@ class DataService:
             top_artists_data=all_top_artists,
             top_tracks_data=all_top_tracks,
             top_genres_data=all_top_genres,
-            top_emotions_data=all_top_emotions
+            top_emotions_data=all_top_emotions,
+            unchanged_time_ranges={
+                item_type: [time_range for time_range in TimeRange if time_range not in time_ranges[item_type]]
+                for item_type in ItemType
+                if len(time_ranges[item_type]) < len(TimeRange)
+            }
         )
         logger.debug(f"User spotify data: {user_spotify_data}")
 
         return user_spotify_data
+
+    async def get_user_spotify_message(self, refresh_token: str, user_id: str, format_version: int = 1) -> bytes:
+        """
+        Fetches all of the user's top items as raw responses and builds the published message from them.
+
+        With an executor, parsing and serialization run there in a single call per user. Conditional requests against
+        the top items cache are not made, since there is no parsed data to fall back on.
+        """
+        tokens = await self._refresh_tokens(refresh_token)
+        responses = []
+
+        for item_type in ItemType:
+            contents = await self._get_all_top_items(
+                access_token=tokens.access_token,
+                item_type=item_type,
+                time_ranges=list(TimeRange),
+                raw=True
+            )
+            responses.extend((item_type, time_range, content) for time_range, content in zip(TimeRange, contents))
+
+        if self.executor is None:
+            return build_user_message(
+                user_id=user_id,
+                refresh_token=tokens.refresh_token,
+                responses=responses,
+                format_version=format_version
+            )
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor,
+            build_user_message,
+            user_id,
+            tokens.refresh_token,
+            responses,
+            format_version
+        )
@@ -0,0 +1,32 @@
+import asyncio
+from functools import cache
+
+from loguru import logger
+
+PER_INVOCATION_EVENT_LOOP = "run"
+ASYNCIO_EVENT_LOOP = "asyncio"
+UVLOOP_EVENT_LOOP = "uvloop"
+
+
+def create_runner(event_loop: str) -> asyncio.Runner:
+    if event_loop == UVLOOP_EVENT_LOOP:
+        try:
+            import uvloop
+        except ImportError:
+            logger.warning("uvloop is not installed - using the asyncio event loop")
+            return asyncio.Runner()
+
+        return asyncio.Runner(loop_factory=uvloop.new_event_loop)
+
+    return asyncio.Runner()
+
+
+@cache
+def get_runner(event_loop: str) -> asyncio.Runner | None:
+    """Returns None for the "run" event loop, which keeps asyncio.run per invocation."""
+    if event_loop == PER_INVOCATION_EVENT_LOOP:
+        return None
+
+    runner = create_runner(event_loop)
+    logger.info(f"Created persistent {event_loop} event loop runner")
+    return runner
@@ -0,0 +1,145 @@
+import json
+import time
+from abc import ABC, abstractmethod
+from functools import cache
+
+from loguru import logger
+
+from src.claim_check import ObjectStore, ObjectNotFoundException, create_object_store
+from src.models import ItemType, TimeRange, FreshnessSettings
+
+
+def parse_max_ages(value: str) -> dict[tuple[ItemType, TimeRange], float]:
+    """
+    Parses max ages in seconds from JSON keyed by time range (applies to every item type) or item_type:time_range.
+
+    For example {"long_term": 604800, "medium_term": 86400, "genre:long_term": 1209600}.
+    """
+    data = json.loads(value)
+    max_ages = {}
+
+    for key, max_age in data.items():
+        if ":" not in key:
+            time_range = TimeRange(key)
+
+            for item_type in ItemType:
+                max_ages.setdefault((item_type, time_range), float(max_age))
+
+    for key, max_age in data.items():
+        if ":" in key:
+            item_type, _, time_range = key.partition(":")
+            max_ages[(ItemType(item_type), TimeRange(time_range))] = float(max_age)
+
+    return max_ages
+
+
+class LastFetchedStore(ABC):
+    @abstractmethod
+    def get(self, user_id: str) -> dict[tuple[ItemType, TimeRange], float]:
+        pass
+
+    @abstractmethod
+    def set(self, user_id: str, last_fetched: dict[tuple[ItemType, TimeRange], float]):
+        pass
+
+
+class InMemoryLastFetchedStore(LastFetchedStore):
+    def __init__(self):
+        self._last_fetched = {}
+
+    def get(self, user_id: str) -> dict[tuple[ItemType, TimeRange], float]:
+        return dict(self._last_fetched.get(user_id, {}))
+
+    def set(self, user_id: str, last_fetched: dict[tuple[ItemType, TimeRange], float]):
+        self._last_fetched[user_id] = dict(last_fetched)
+
+
+class ObjectStoreLastFetchedStore(LastFetchedStore):
+    def __init__(self, object_store: ObjectStore):
+        self.object_store = object_store
+
+    @staticmethod
+    def _key(user_id: str) -> str:
+        return f"last-fetched/{user_id}.json"
+
+    def get(self, user_id: str) -> dict[tuple[ItemType, TimeRange], float]:
+        try:
+            data = json.loads(self.object_store.get(self._key(user_id)))
+        except ObjectNotFoundException:
+            return {}
+
+        last_fetched = {}
+
+        for key, fetched_at in data.items():
+            item_type, _, time_range = key.partition(":")
+            last_fetched[(ItemType(item_type), TimeRange(time_range))] = fetched_at
+
+        return last_fetched
+
+    def set(self, user_id: str, last_fetched: dict[tuple[ItemType, TimeRange], float]):
+        data = {
+            f"{item_type.value}:{time_range.value}": fetched_at
+            for (item_type, time_range), fetched_at in last_fetched.items()
+        }
+        self.object_store.put(key=self._key(user_id), data=json.dumps(data).encode())
+
+
+class RefreshPlanner:
+    """
+    Decides which (ItemType, TimeRange) slices are stale for a user and records when slices were last fetched.
+
+    Slices without a configured max age are always treated as stale, as are slices never fetched before.
+    """
+
+    def __init__(self, max_ages: dict[tuple[ItemType, TimeRange], float], store: LastFetchedStore):
+        self.max_ages = max_ages
+        self.store = store
+
+    def plan(self, user_id: str, now: float | None = None) -> dict[ItemType, list[TimeRange]]:
+        now = time.time() if now is None else now
+
+        try:
+            last_fetched = self.store.get(user_id)
+        except Exception as e:
+            logger.error(f"Failed to load last fetched times, refreshing all time ranges - {e}")
+            last_fetched = {}
+
+        time_ranges = {}
+
+        for item_type in ItemType:
+            time_ranges[item_type] = [
+                time_range
+                for time_range in TimeRange
+                if now - last_fetched.get((item_type, time_range), float("-inf"))
+                >= self.max_ages.get((item_type, time_range), 0.0)
+            ]
+
+        logger.debug(f"Stale time ranges for user {user_id}: {time_ranges}")
+        return time_ranges
+
+    def record(self, user_id: str, time_ranges: dict[ItemType, list[TimeRange]], now: float | None = None):
+        now = time.time() if now is None else now
+
+        try:
+            last_fetched = self.store.get(user_id)
+
+            for item_type, fetched_time_ranges in time_ranges.items():
+                for time_range in fetched_time_ranges:
+                    last_fetched[(item_type, time_range)] = now
+
+            self.store.set(user_id=user_id, last_fetched=last_fetched)
+        except Exception as e:
+            logger.error(f"Failed to record last fetched times - {e}")
+
+
+@cache
+def get_refresh_planner(settings: FreshnessSettings | None) -> RefreshPlanner | None:
+    if settings is None:
+        return None
+
+    if settings.store_location is None:
+        store = InMemoryLastFetchedStore()
+    else:
+        store = ObjectStoreLastFetchedStore(create_object_store(settings.store_location))
+
+    return RefreshPlanner(max_ages=settings.max_ages, store=store)
@@ -0,0 +1,61 @@
+from collections import deque
+from functools import cache
+
+from src.metrics import LatencyTracker
+from src.models import HedgeSettings
+
+
+class HedgePolicy:
+    """
+    Decides when a duplicate request should be sent for a slow call to an idempotent endpoint.
+
+    A hedge is sent once a call has been outstanding for longer than the configured percentile of recently observed
+    latency for its endpoint, as long as hedges stay within budget_ratio of the last window_size hedgeable requests.
+    """
+
+    def __init__(self, settings: HedgeSettings):
+        self.settings = settings
+        self._latency_trackers = {}
+        self._recent_requests = deque(maxlen=settings.window_size)
+        self._recent_hedges = 0
+        self.requests = 0
+        self.hedges = 0
+
+    def _get_latency_tracker(self, endpoint: str) -> LatencyTracker:
+        if endpoint not in self._latency_trackers:
+            self._latency_trackers[endpoint] = LatencyTracker(self.settings.window_size)
+
+        return self._latency_trackers[endpoint]
+
+    def observe(self, endpoint: str, latency: float):
+        self._get_latency_tracker(endpoint).observe(latency)
+
+    def hedge_delay(self, endpoint: str) -> float | None:
+        if len(self._recent_requests) == self._recent_requests.maxlen:
+            self._recent_hedges -= self._recent_requests[0]
+
+        self._recent_requests.append(0)
+        self.requests += 1
+        latency_tracker = self._get_latency_tracker(endpoint)
+
+        if len(latency_tracker) < self.settings.min_samples:
+            return None
+
+        return latency_tracker.percentile(self.settings.percentile)
+
+    def try_acquire_hedge(self) -> bool:
+        if self._recent_hedges + 1 > self.settings.budget_ratio * len(self._recent_requests):
+            return False
+
+        self._recent_requests[-1] += 1
+        self._recent_hedges += 1
+        self.hedges += 1
+        return True
+
+
+@cache
+def get_hedge_policy(settings: HedgeSettings | None) -> HedgePolicy | None:
+    if settings is None:
+        return None
+
+    return HedgePolicy(settings)
@@ -1,6 +1,7 @@
 import json
+import math
 import os
-from dataclasses import asdict
+from functools import cache
 
 import httpx
 import asyncio
@@ -8,17 +9,148 @@ import boto3
 from botocore.client import BaseClient
 from loguru import logger
 
-from src.data_service import DataService
-from src.models import User, Settings, UserSpotifyData
+from src.circuit_breaker import get_circuit_breaker_registry
+from src.claim_check import ClaimCheck, get_claim_check
+from src.data_service import DataService, CircuitOpenException
+from src.event_loop import ASYNCIO_EVENT_LOOP, get_runner
+from src.freshness import get_refresh_planner, parse_max_ages
+from src.hedging import get_hedge_policy
+from src.message_format import serialize_message
+from src.metrics import TransferMetrics
+from src.profiling import start_profiler
+from src.queue_router import QueueRouter, get_queue_router, parse_queue_urls, is_fifo_queue, get_deduplication_id
+from src.result_cache import get_result_cache
+from src.top_items_cache import get_top_items_cache
+from src.warmup import warm_up
+from src.models import User, Settings, UserSpotifyData, CircuitBreakerSettings, HedgeSettings, \
+    ClaimCheckSettings, FreshnessSettings, ItemType, ProfilingSettings, ResultCacheSettings
+
+
+MAX_VISIBILITY_TIMEOUT = 43200
+DEFAULT_CLAIM_CHECK_THRESHOLD_BYTES = 200_000
+DEADLINE_MARGIN_SECONDS = 5.0
+DEFAULT_PROFILING_INTERVAL = 0.005
+DEFAULT_RESULT_CACHE_WINDOW = 300.0
+
+
+def get_circuit_breaker_settings(request_timeout: float) -> CircuitBreakerSettings | None:
+    if os.environ.get("CIRCUIT_BREAKER_ENABLED", "false").lower() != "true":
+        return None
+
+    circuit_breaker_settings = CircuitBreakerSettings(
+        failure_rate_threshold=float(os.environ.get("CIRCUIT_BREAKER_FAILURE_RATE", "0.5")),
+        slow_call_rate_threshold=float(os.environ.get("CIRCUIT_BREAKER_SLOW_CALL_RATE", "0.5")),
+        slow_call_duration=float(os.environ.get("CIRCUIT_BREAKER_SLOW_CALL_SECONDS", str(request_timeout / 2))),
+        minimum_calls=int(os.environ.get("CIRCUIT_BREAKER_MINIMUM_CALLS", "10")),
+        window_size=int(os.environ.get("CIRCUIT_BREAKER_WINDOW_SIZE", "50")),
+        open_duration=float(os.environ.get("CIRCUIT_BREAKER_OPEN_SECONDS", "30")),
+        half_open_max_calls=int(os.environ.get("CIRCUIT_BREAKER_HALF_OPEN_CALLS", "3"))
+    )
+    return circuit_breaker_settings
+
+
+def get_hedge_settings() -> HedgeSettings | None:
+    if os.environ.get("HEDGING_ENABLED", "false").lower() != "true":
+        return None
+
+    hedge_settings = HedgeSettings(
+        percentile=float(os.environ.get("HEDGING_PERCENTILE", "0.95")),
+        budget_ratio=float(os.environ.get("HEDGING_BUDGET_RATIO", "0.05")),
+        min_samples=int(os.environ.get("HEDGING_MIN_SAMPLES", "20")),
+        window_size=int(os.environ.get("HEDGING_WINDOW_SIZE", "500"))
+    )
+    return hedge_settings
+
+
+def get_claim_check_settings() -> ClaimCheckSettings | None:
+    location = os.environ.get("CLAIM_CHECK_LOCATION")
+
+    if location is None:
+        return None
+
+    threshold_bytes = int(os.environ.get("CLAIM_CHECK_THRESHOLD_BYTES", str(DEFAULT_CLAIM_CHECK_THRESHOLD_BYTES)))
+    claim_check_settings = ClaimCheckSettings(location=location, threshold_bytes=threshold_bytes)
+    return claim_check_settings
+
+
+def get_result_cache_settings() -> ResultCacheSettings | None:
+    max_entries = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", "0"))
+
+    if max_entries < 1:
+        return None
+
+    result_cache_settings = ResultCacheSettings(
+        max_entries=max_entries,
+        freshness_window=float(os.environ.get("RESULT_CACHE_WINDOW", str(DEFAULT_RESULT_CACHE_WINDOW))),
+        store_location=os.environ.get("RESULT_CACHE_LOCATION")
+    )
+    return result_cache_settings
+
+
+def get_profiling_settings() -> ProfilingSettings | None:
+    sample_rate = os.environ.get("PROFILING_SAMPLE_RATE")
+
+    if sample_rate is None:
+        return None
+
+    profiling_settings = ProfilingSettings(
+        sample_rate=float(sample_rate),
+        location=os.environ.get("PROFILING_LOCATION", "/tmp"),
+        interval=float(os.environ.get("PROFILING_INTERVAL", str(DEFAULT_PROFILING_INTERVAL)))
+    )
+    return profiling_settings
+
+
+def get_freshness_settings() -> FreshnessSettings | None:
+    max_ages = os.environ.get("REFRESH_MAX_AGES")
+
+    if max_ages is None:
+        return None
+
+    freshness_settings = FreshnessSettings(
+        max_ages=parse_max_ages(max_ages),
+        store_location=os.environ.get("LAST_FETCHED_LOCATION")
+    )
+    return freshness_settings
+
+
+def get_top_items_limits() -> dict[ItemType, int] | None:
+    limits = os.environ.get("TOP_ITEMS_LIMITS")
+
+    if limits is None:
+        return None
+
+    top_items_limits = {ItemType(item_type): int(limit) for item_type, limit in json.loads(limits).items()}
+    return top_items_limits
 
 
 def get_settings() -> Settings:
     logger.info("Loading environment settings")
     data_api_base_url = os.environ["DATA_API_BASE_URL"]
     request_timeout = float(os.environ["REQUEST_TIMEOUT"])
-    queue_url = os.environ["QUEUE_URL"]
+    queue_url = os.environ.get("QUEUE_URL")
+    output_queue_urls = os.environ.get("OUTPUT_QUEUE_URLS")
+    output_queue_urls = None if output_queue_urls is None else parse_queue_urls(output_queue_urls)
+
+    if queue_url is None and not output_queue_urls:
+        raise KeyError("QUEUE_URL or OUTPUT_QUEUE_URLS must be set")
 
-    settings = Settings(data_api_base_url=data_api_base_url, request_timeout=request_timeout, queue_url=queue_url)
+    settings = Settings(
+        data_api_base_url=data_api_base_url,
+        request_timeout=request_timeout,
+        queue_url=queue_url,
+        circuit_breaker=get_circuit_breaker_settings(request_timeout),
+        hedging=get_hedge_settings(),
+        claim_check=get_claim_check_settings(),
+        top_items_cache_max_entries=int(os.environ.get("TOP_ITEMS_CACHE_MAX_ENTRIES", "0")),
+        freshness=get_freshness_settings(),
+        top_items_field_projection=os.environ.get("TOP_ITEMS_FIELD_PROJECTION", "false").lower() == "true",
+        top_items_limits=get_top_items_limits(),
+        message_format_version=int(os.environ.get("MESSAGE_FORMAT_VERSION", "1")),
+        top_items_retry_attempts=int(os.environ.get("TOP_ITEMS_RETRY_ATTEMPTS", "0")),
+        result_cache=get_result_cache_settings(),
+        output_queue_urls=output_queue_urls
+    )
 
     logger.debug(f"Setting extracted from environment: {settings}")
 
@@ -30,61 +162,257 @@ def get_user_data_from_event(event: dict) -> User:
     logger.debug(f"Event received: {event}")
     records = event["Records"]
     record = records[0]
-    data = json.loads(record["body"])
-    user = User(id=data["user_id"], refresh_token=data["refresh_token"])
+    user = get_user_from_message_body(record["body"])
     logger.debug(f"Extracted user: {user}")
     return user
 
 
+def get_message_id_from_event(event: dict) -> str | None:
+    records = event.get("Records") or [{}]
+    return records[0].get("messageId")
+
+
+def get_user_from_message_body(body: str) -> User:
+    data = json.loads(body)
+    user = User(id=data["user_id"], refresh_token=data["refresh_token"])
+    return user
+
+
+def get_queue_url_from_arn(queue_arn: str) -> str:
+    _, _, _, region, account_id, queue_name = queue_arn.split(":")
+    return f"https://sqs.{region}.amazonaws.com/{account_id}/{queue_name}"
+
+
+def release_message_with_delay(sqs: BaseClient, event: dict, delay: float):
+    record = event["Records"][0]
+    visibility_timeout = min(max(1, math.ceil(delay)), MAX_VISIBILITY_TIMEOUT)
+    logger.info(f"Releasing message back to queue with {visibility_timeout} second delay")
+
+    try:
+        sqs.change_message_visibility(
+            QueueUrl=get_queue_url_from_arn(record["eventSourceARN"]),
+            ReceiptHandle=record["receiptHandle"],
+            VisibilityTimeout=visibility_timeout
+        )
+    except Exception as e:
+        logger.error(f"Failed to release message back to queue - {e}")
+
+
+def send_message_to_queue(sqs: BaseClient, queue_url: str, message: str, user_id: str | None = None):
+    """Sends the message; .fifo queues get MessageGroupId=user_id and a content-hash MessageDeduplicationId."""
+    logger.info("Sending message to SQS")
+    logger.debug(f"Message being sent: {message}")
+    fifo_params = {}
+
+    if is_fifo_queue(queue_url):
+        fifo_params = {"MessageGroupId": user_id, "MessageDeduplicationId": get_deduplication_id(message)}
+
+    res = sqs.send_message(QueueUrl=queue_url, MessageBody=message, **fifo_params)
+    logger.info(f"Message sent. SQS response: {res}")
+
+
+def publish_message(
+        sqs: BaseClient,
+        queue_url: str | None,
+        user_id: str,
+        message: str,
+        claim_check: ClaimCheck | None = None,
+        queue_router: QueueRouter | None = None
+):
+    """Publishes to queue_url, or to the user's queue from queue_router if several output queues are configured."""
+    if claim_check is not None:
+        message = claim_check.prepare_message(user_id=user_id, message=message)
+
+    if queue_router is not None:
+        queue_url = queue_router.get_queue_url(user_id)
+
+    send_message_to_queue(sqs=sqs, queue_url=queue_url, message=message, user_id=user_id)
+
+
 def add_user_spotify_data_to_queue(
         sqs: BaseClient,
-        queue_url: str,
+        queue_url: str | None,
         user_id: str,
-        user_spotify_data: UserSpotifyData
+        user_spotify_data: UserSpotifyData,
+        claim_check: ClaimCheck | None = None,
+        format_version: int = 1,
+        queue_router: QueueRouter | None = None
 ):
-    logger.info("Sending message to SQS")
-    message_data = {
-        "user_id": user_id,
-        "refresh_token": user_spotify_data.refresh_token,
-        "top_artists_data": [asdict(entry) for entry in user_spotify_data.top_artists_data],
-        "top_tracks_data": [asdict(entry) for entry in user_spotify_data.top_tracks_data],
-        "top_genres_data": [asdict(entry) for entry in user_spotify_data.top_genres_data],
-        "top_emotions_data": [asdict(entry) for entry in user_spotify_data.top_emotions_data],
-    }
-    message = json.dumps(message_data)
-    logger.debug(f"Message being sent: {message}")
-    res = sqs.send_message(QueueUrl=queue_url, MessageBody=message)
-    logger.info(f"Message sent. SQS response: {res}")
+    message = serialize_message(user_id=user_id, user_spotify_data=user_spotify_data, format_version=format_version)
+    publish_message(
+        sqs=sqs,
+        queue_url=queue_url,
+        user_id=user_id,
+        message=message,
+        claim_check=claim_check,
+        queue_router=queue_router
+    )
+
+
+def get_timeout_from_context(context) -> float | None:
+    """
+    Leaves DEADLINE_MARGIN_SECONDS of the invocation for publishing and cleanup after fetching user data.
+
+    Only applies if USER_DEADLINE_ENABLED is true, and not at all if the invocation has no more than the margin left.
+    """
+    if context is None or os.environ.get("USER_DEADLINE_ENABLED", "false").lower() != "true":
+        return None
+
+    remaining_seconds = context.get_remaining_time_in_millis() / 1000
+
+    if remaining_seconds <= DEADLINE_MARGIN_SECONDS:
+        logger.warning(f"Only {remaining_seconds:.1f}s of invocation remaining - not setting a user deadline")
+        return None
 
+    timeout = remaining_seconds - DEADLINE_MARGIN_SECONDS
+    logger.info(f"User deadline set to {timeout:.1f}s")
+    return timeout
 
-async def main(event):
+
+@cache
+def get_client() -> httpx.AsyncClient:
+    """Only safe to use from the persistent event loop."""
+    return httpx.AsyncClient()
+
+
+@cache
+def get_sqs_client() -> BaseClient:
+    return boto3.client("sqs")
+
+
+async def main(event, timeout: float | None = None, client: httpx.AsyncClient | None = None):
+    """Processes one event. A client passed in is left open for reuse, otherwise one is created and closed here."""
     settings = get_settings()
     user = get_user_data_from_event(event)
 
-    client = httpx.AsyncClient()
+    owns_client = client is None
+
+    if owns_client:
+        client = httpx.AsyncClient()
+
+    transfer_metrics = TransferMetrics()
+    circuit_breakers = get_circuit_breaker_registry(settings.circuit_breaker)
+    hedge_policy = get_hedge_policy(settings.hedging)
+    claim_check = get_claim_check(settings.claim_check)
+    refresh_planner = get_refresh_planner(settings.freshness)
+    result_cache = get_result_cache(settings.result_cache)
+    queue_router = get_queue_router(settings.output_queue_urls)
 
     try:
+        sqs = get_sqs_client()
         spotify_service = DataService(
             client=client,
             data_api_base_url=settings.data_api_base_url,
-            request_timeout=settings.request_timeout
+            request_timeout=settings.request_timeout,
+            circuit_breakers=circuit_breakers,
+            hedge_policy=hedge_policy,
+            top_items_cache=get_top_items_cache(settings.top_items_cache_max_entries),
+            field_projection=settings.top_items_field_projection,
+            limits=settings.top_items_limits,
+            transfer_metrics=transfer_metrics,
+            retry_attempts=settings.top_items_retry_attempts
         )
 
-        user_spotify_data = await spotify_service.get_user_spotify_data(user.refresh_token)
+        message_id = get_message_id_from_event(event)
+        user_spotify_data = None if result_cache is None else result_cache.get_result(message_id)
+        time_ranges = None
+
+        if user_spotify_data is not None:
+            logger.info(f"Republishing cached result for redelivered message {message_id}")
+        elif result_cache is not None and result_cache.was_recently_published(user.id):
+            logger.info(f"User {user.id} published within the last {result_cache.freshness_window}s - skipping")
+            return
+        else:
+            time_ranges = None if refresh_planner is None else refresh_planner.plan(user.id)
+
+            try:
+                user_spotify_data = await spotify_service.get_user_spotify_data(
+                    refresh_token=user.refresh_token,
+                    user_id=user.id,
+                    time_ranges=time_ranges,
+                    timeout=timeout
+                )
+            except CircuitOpenException as e:
+                release_message_with_delay(sqs=sqs, event=event, delay=e.retry_after)
+                raise
+
+            if result_cache is not None:
+                result_cache.put_result(message_id=message_id, user_id=user.id, user_spotify_data=user_spotify_data)
 
-        sqs = boto3.client("sqs")
         add_user_spotify_data_to_queue(
             sqs=sqs,
             queue_url=settings.queue_url,
             user_id=user.id,
-            user_spotify_data=user_spotify_data
+            user_spotify_data=user_spotify_data,
+            claim_check=claim_check,
+            format_version=settings.message_format_version,
+            queue_router=queue_router
         )
+
+        if result_cache is not None:
+            result_cache.mark_published(user.id)
+
+        if refresh_planner is not None and time_ranges is not None:
+            refresh_planner.record(user_id=user.id, time_ranges=time_ranges)
     except Exception as e:
         logger.error(f"Something went wrong - {e}")
         raise
     finally:
-        await client.aclose()
+        if owns_client:
+            await client.aclose()
+
+        logger.info(f"Data API transfer: {transfer_metrics.summary()}")
+
+        if circuit_breakers is not None:
+            logger.info(f"Data API endpoint health: {circuit_breakers.health()}")
+
+        if hedge_policy is not None:
+            logger.info(f"Hedged requests: {hedge_policy.hedges} of {hedge_policy.requests} hedgeable requests")
 
 
 def lambda_handler(event, context):
-    asyncio.run(main(event))
+    profiler = start_profiler(get_profiling_settings())
+
+    try:
+        timeout = get_timeout_from_context(context)
+        runner = get_runner(os.environ.get("EVENT_LOOP", ASYNCIO_EVENT_LOOP))
+
+        if runner is None:
+            asyncio.run(main(event, timeout=timeout))
+        else:
+            runner.run(main(event, timeout=timeout, client=get_client()))
+    finally:
+        if profiler is not None:
+            profiler.finish(context.aws_request_id if context is not None else "invocation")
+
+
+def warm_up_container():
+    """
+    Runs during the Lambda INIT phase, before the first invocation is billed, if WARMUP_CONNECTIONS is set. Only
+    runs inside Lambda, so the worker and backfill can import this module without opening connections.
+
+    Connections are opened on the persistent event loop with the shared client so the first invocation inherits them.
+    Never raises, as a failed warmup must not stop the handler from loading.
+    """
+    try:
+        connections = int(os.environ.get("WARMUP_CONNECTIONS", "0"))
+
+        if connections < 1:
+            return
+
+        settings = get_settings()
+        runner = get_runner(os.environ.get("EVENT_LOOP", ASYNCIO_EVENT_LOOP))
+        warm_up(
+            data_api_base_url=settings.data_api_base_url,
+            connections=connections,
+            sqs=get_sqs_client(),
+            queue_url=settings.queue_url or settings.output_queue_urls[0],
+            runner=runner,
+            client=None if runner is None else get_client()
+        )
+    except Exception as e:
+        logger.error(f"Warmup failed - {e}")
+
+
+if "AWS_LAMBDA_FUNCTION_NAME" in os.environ:
+    warm_up_container()
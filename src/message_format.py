@@ -0,0 +1,223 @@
+import json
+from dataclasses import asdict
+
+from src.models import UserSpotifyData, TopArtistsData, TopArtist, TopTracksData, TopTrack, TopGenresData, TopGenre, \
+    TopEmotionsData, TopEmotion, TimeRange, ItemType
+
+DICTIONARY_MESSAGE_FORMAT_VERSION = 2
+
+
+class MessageFormatException(Exception):
+    def __init__(self, message: str):
+        super().__init__(message)
+
+
+class _Interner:
+    def __init__(self):
+        self.values = []
+        self._indices = {}
+
+    def index(self, value: str) -> int:
+        if value not in self._indices:
+            self._indices[value] = len(self.values)
+            self.values.append(value)
+
+        return self._indices[value]
+
+
+def encode_user_spotify_data(user_id: str, user_spotify_data: UserSpotifyData) -> dict:
+    """
+    Builds a version 2 message in which every Spotify id and every genre or emotion name appears once.
+
+    Entries reference the "ids" and "names" tables by index, and each time range stores its fields as parallel arrays
+    instead of a list of objects.
+    """
+    ids = _Interner()
+    names = _Interner()
+
+    message_data = {
+        "format_version": DICTIONARY_MESSAGE_FORMAT_VERSION,
+        "user_id": user_id,
+        "refresh_token": user_spotify_data.refresh_token,
+        "top_artists_data": [
+            {
+                "time_range": entry.time_range.value,
+                "ids": [ids.index(top_artist.id) for top_artist in entry.top_artists],
+                "positions": [top_artist.position for top_artist in entry.top_artists]
+            }
+            for entry in user_spotify_data.top_artists_data
+        ],
+        "top_tracks_data": [
+            {
+                "time_range": entry.time_range.value,
+                "ids": [ids.index(top_track.id) for top_track in entry.top_tracks],
+                "positions": [top_track.position for top_track in entry.top_tracks]
+            }
+            for entry in user_spotify_data.top_tracks_data
+        ],
+        "top_genres_data": [
+            {
+                "time_range": entry.time_range.value,
+                "names": [names.index(top_genre.name) for top_genre in entry.top_genres],
+                "counts": [top_genre.count for top_genre in entry.top_genres]
+            }
+            for entry in user_spotify_data.top_genres_data
+        ],
+        "top_emotions_data": [
+            {
+                "time_range": entry.time_range.value,
+                "names": [names.index(top_emotion.name) for top_emotion in entry.top_emotions],
+                "percentages": [top_emotion.percentage for top_emotion in entry.top_emotions],
+                "track_ids": [ids.index(top_emotion.track_id) for top_emotion in entry.top_emotions]
+            }
+            for entry in user_spotify_data.top_emotions_data
+        ]
+    }
+    message_data["ids"] = ids.values
+    message_data["names"] = names.values
+
+    if user_spotify_data.unchanged_time_ranges:
+        message_data["unchanged_time_ranges"] = {
+            item_type.value: [time_range.value for time_range in time_ranges]
+            for item_type, time_ranges in user_spotify_data.unchanged_time_ranges.items()
+        }
+
+    return message_data
+
+
+def create_message_data(user_id: str, user_spotify_data: UserSpotifyData, format_version: int = 1) -> dict:
+    if format_version == DICTIONARY_MESSAGE_FORMAT_VERSION:
+        return encode_user_spotify_data(user_id=user_id, user_spotify_data=user_spotify_data)
+
+    message_data = {
+        "user_id": user_id,
+        "refresh_token": user_spotify_data.refresh_token,
+        "top_artists_data": [asdict(entry) for entry in user_spotify_data.top_artists_data],
+        "top_tracks_data": [asdict(entry) for entry in user_spotify_data.top_tracks_data],
+        "top_genres_data": [asdict(entry) for entry in user_spotify_data.top_genres_data],
+        "top_emotions_data": [asdict(entry) for entry in user_spotify_data.top_emotions_data],
+    }
+
+    if user_spotify_data.unchanged_time_ranges:
+        message_data["unchanged_time_ranges"] = {
+            item_type.value: [time_range.value for time_range in time_ranges]
+            for item_type, time_ranges in user_spotify_data.unchanged_time_ranges.items()
+        }
+
+    return message_data
+
+
+def serialize_message(user_id: str, user_spotify_data: UserSpotifyData, format_version: int = 1) -> str:
+    message_data = create_message_data(
+        user_id=user_id,
+        user_spotify_data=user_spotify_data,
+        format_version=format_version
+    )
+    message = json.dumps(message_data)
+    return message
+
+
+def _decode_dictionary_encoded(message_data: dict) -> UserSpotifyData:
+    ids = message_data["ids"]
+    names = message_data["names"]
+
+    return UserSpotifyData(
+        refresh_token=message_data["refresh_token"],
+        top_artists_data=[
+            TopArtistsData(
+                top_artists=[
+                    TopArtist(id=ids[index], position=position)
+                    for index, position in zip(entry["ids"], entry["positions"], strict=True)
+                ],
+                time_range=TimeRange(entry["time_range"])
+            )
+            for entry in message_data["top_artists_data"]
+        ],
+        top_tracks_data=[
+            TopTracksData(
+                top_tracks=[
+                    TopTrack(id=ids[index], position=position)
+                    for index, position in zip(entry["ids"], entry["positions"], strict=True)
+                ],
+                time_range=TimeRange(entry["time_range"])
+            )
+            for entry in message_data["top_tracks_data"]
+        ],
+        top_genres_data=[
+            TopGenresData(
+                top_genres=[
+                    TopGenre(name=names[index], count=count)
+                    for index, count in zip(entry["names"], entry["counts"], strict=True)
+                ],
+                time_range=TimeRange(entry["time_range"])
+            )
+            for entry in message_data["top_genres_data"]
+        ],
+        top_emotions_data=[
+            TopEmotionsData(
+                top_emotions=[
+                    TopEmotion(name=names[name_index], percentage=percentage, track_id=ids[track_index])
+                    for name_index, percentage, track_index in zip(
+                        entry["names"], entry["percentages"], entry["track_ids"], strict=True
+                    )
+                ],
+                time_range=TimeRange(entry["time_range"])
+            )
+            for entry in message_data["top_emotions_data"]
+        ]
+    )
+
+
+def _decode_plain(message_data: dict) -> UserSpotifyData:
+    return UserSpotifyData(
+        refresh_token=message_data["refresh_token"],
+        top_artists_data=[
+            TopArtistsData(
+                top_artists=[TopArtist(**top_artist) for top_artist in entry["top_artists"]],
+                time_range=TimeRange(entry["time_range"])
+            )
+            for entry in message_data["top_artists_data"]
+        ],
+        top_tracks_data=[
+            TopTracksData(
+                top_tracks=[TopTrack(**top_track) for top_track in entry["top_tracks"]],
+                time_range=TimeRange(entry["time_range"])
+            )
+            for entry in message_data["top_tracks_data"]
+        ],
+        top_genres_data=[
+            TopGenresData(
+                top_genres=[TopGenre(**top_genre) for top_genre in entry["top_genres"]],
+                time_range=TimeRange(entry["time_range"])
+            )
+            for entry in message_data["top_genres_data"]
+        ],
+        top_emotions_data=[
+            TopEmotionsData(
+                top_emotions=[TopEmotion(**top_emotion) for top_emotion in entry["top_emotions"]],
+                time_range=TimeRange(entry["time_range"])
+            )
+            for entry in message_data["top_emotions_data"]
+        ]
+    )
+
+
+def decode_user_spotify_data(message_data: dict) -> UserSpotifyData:
+    """Rebuilds UserSpotifyData from a published message in either the original or the dictionary-encoded format."""
+    format_version = message_data.get("format_version", 1)
+
+    try:
+        if format_version == DICTIONARY_MESSAGE_FORMAT_VERSION:
+            user_spotify_data = _decode_dictionary_encoded(message_data)
+        elif format_version == 1:
+            user_spotify_data = _decode_plain(message_data)
+        else:
+            raise MessageFormatException(f"Unsupported message format version: {format_version}")
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        raise MessageFormatException(f"Invalid message - {e}")
+
+    user_spotify_data.unchanged_time_ranges = {
+        ItemType(item_type): [TimeRange(time_range) for time_range in time_ranges]
+        for item_type, time_ranges in message_data.get("unchanged_time_ranges", {}).items()
+    }
+    return user_spotify_data
@@ -0,0 +1,34 @@
+import math
+from collections import deque
+
+
+class LatencyTracker:
+    def __init__(self, window_size: int):
+        self._latencies = deque(maxlen=window_size)
+
+    def __len__(self) -> int:
+        return len(self._latencies)
+
+    def observe(self, latency: float):
+        self._latencies.append(latency)
+
+    def percentile(self, percentile: float) -> float:
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, math.ceil(percentile * len(ordered)) - 1)
+        return ordered[max(0, index)]
+
+
+class TransferMetrics:
+    """Counts requests and bytes for each data API endpoint, both as received on the wire and after decoding."""
+
+    def __init__(self):
+        self._endpoints = {}
+
+    def record(self, endpoint: str, wire_bytes: int, decoded_bytes: int):
+        stats = self._endpoints.setdefault(endpoint, {"requests": 0, "wire_bytes": 0, "decoded_bytes": 0})
+        stats["requests"] += 1
+        stats["wire_bytes"] += wire_bytes
+        stats["decoded_bytes"] += decoded_bytes
+
+    def summary(self) -> dict[str, dict[str, int]]:
+        return {endpoint: dict(stats) for endpoint, stats in self._endpoints.items()}
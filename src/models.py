@@ -1,5 +1,5 @@
 from enum import Enum
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 
 class ItemType(str, Enum):
@@ -15,11 +15,89 @@ class TimeRange(str, Enum):
     LONG = "long_term"
 
 
+class Priority(str, Enum):
+    HIGH = "high"
+    NORMAL = "normal"
+    LOW = "low"
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+@dataclass(frozen=True)
+class CircuitBreakerSettings:
+    failure_rate_threshold: float
+    slow_call_rate_threshold: float
+    slow_call_duration: float
+    minimum_calls: int
+    window_size: int
+    open_duration: float
+    half_open_max_calls: int
+
+
+@dataclass(frozen=True)
+class HedgeSettings:
+    percentile: float
+    budget_ratio: float
+    min_samples: int
+    window_size: int
+
+
+@dataclass(frozen=True)
+class ClaimCheckSettings:
+    location: str
+    threshold_bytes: int
+
+
+@dataclass(frozen=True)
+class FreshnessSettings:
+    max_ages: dict[tuple[ItemType, TimeRange], float] = field(hash=False)
+    store_location: str | None
+
+
+@dataclass(frozen=True)
+class ResultCacheSettings:
+    max_entries: int
+    freshness_window: float
+    store_location: str | None
+
+
+@dataclass
+class ProfilingSettings:
+    sample_rate: float
+    location: str
+    interval: float
+
+
 @dataclass
 class Settings:
     data_api_base_url: str
     request_timeout: float
-    queue_url: str
+    queue_url: str | None
+    circuit_breaker: CircuitBreakerSettings | None = None
+    hedging: HedgeSettings | None = None
+    claim_check: ClaimCheckSettings | None = None
+    top_items_cache_max_entries: int = 0
+    freshness: FreshnessSettings | None = None
+    top_items_field_projection: bool = False
+    top_items_limits: dict[ItemType, int] | None = None
+    message_format_version: int = 1
+    top_items_retry_attempts: int = 0
+    result_cache: ResultCacheSettings | None = None
+    output_queue_urls: list[str] | None = None
+
+
+@dataclass
+class WorkerSettings:
+    input_queue_url: str
+    pollers: int
+    max_in_flight: int
+    visibility_timeout: int
+    concurrency: int | None = None
+    user_timeout: float | None = None
 
 
 @dataclass
@@ -83,6 +161,13 @@ class TopEmotionsData:
     time_range: TimeRange
 
 
+@dataclass
+class CachedTopItems:
+    etag: str | None
+    last_modified: str | None
+    top_items: TopArtistsData | TopTracksData | TopGenresData | TopEmotionsData
+
+
 @dataclass
 class UserSpotifyData:
     refresh_token: str | None
@@ -90,3 +175,4 @@ class UserSpotifyData:
     top_tracks_data: list[TopTracksData]
     top_genres_data: list[TopGenresData]
     top_emotions_data: list[TopEmotionsData]
+    unchanged_time_ranges: dict[ItemType, list[TimeRange]] = field(default_factory=dict)
@@ -0,0 +1,38 @@
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import cache
+
+from loguru import logger
+
+
+def get_available_cpus() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+
+    return os.cpu_count() or 1
+
+
+def parse_process_pool_workers(value: str) -> int:
+    if value == "auto":
+        return get_available_cpus()
+
+    return int(value)
+
+
+@cache
+def get_process_pool(workers: int) -> Executor | None:
+    """
+    Returns None if offloading is disabled or unsupported. Some environments (including Lambda, which has no /dev/shm)
+    cannot create the semaphores a process pool needs, in which case CPU-bound work stays inline.
+    """
+    if workers < 1:
+        return None
+
+    try:
+        process_pool = ProcessPoolExecutor(max_workers=workers)
+    except (OSError, NotImplementedError) as e:
+        logger.warning(f"Process pool unavailable, running CPU-bound work inline - {e}")
+        return None
+
+    logger.info(f"Started process pool with {workers} workers")
+    return process_pool
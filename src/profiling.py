@@ -0,0 +1,137 @@
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from functools import cache
+from datetime import datetime, timezone
+
+from loguru import logger
+
+from src.claim_check import ObjectStore, create_object_store
+from src.models import ProfilingSettings
+
+AWAIT_STATE = "await"
+CPU_STATE = "cpu"
+
+
+def _is_waiting_for_io(frame) -> bool:
+    """
+    The asyncio event loop waits in its selector. uvloop waits inside its compiled run_until_complete, so no Python
+    frame runs above asyncio.Runner.run while it is idle.
+    """
+    code = frame.f_code
+    filename = os.path.basename(code.co_filename)
+
+    if code.co_name in ("select", "poll", "control") and filename == "selectors.py":
+        return True
+
+    return code.co_name == "run" and filename == "runners.py"
+
+
+def _describe(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of the thread that started it every interval seconds from a background thread.
+
+    Samples taken while the event loop is idle are tagged "await" (waiting on the data API, SQS or timers), and all
+    others "cpu", so the collapsed stacks keep time spent serializing apart from time spent waiting. The summary
+    reports wall time and the profiled thread's CPU time for the whole profiled section alongside the sample counts.
+    """
+
+    def __init__(self, object_store: ObjectStore, interval: float):
+        self.object_store = object_store
+        self.interval = interval
+        self.samples = Counter()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._thread_id = None
+        self._started_at = None
+        self._cpu_started_at = None
+        self._wall_seconds = 0.0
+        self._cpu_seconds = 0.0
+
+    def _sample(self):
+        while not self._stopping.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+
+            if frame is None:
+                continue
+
+            state = AWAIT_STATE if _is_waiting_for_io(frame) else CPU_STATE
+            stack = []
+
+            while frame is not None:
+                stack.append(_describe(frame))
+                frame = frame.f_back
+
+            self.samples[";".join([state, *reversed(stack)])] += 1
+
+    def start(self):
+        self._thread_id = threading.get_ident()
+        self._started_at = time.perf_counter()
+        self._cpu_started_at = time.thread_time()
+        self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._thread.join()
+        self._wall_seconds = time.perf_counter() - self._started_at
+        self._cpu_seconds = time.thread_time() - self._cpu_started_at
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def summary(self) -> dict:
+        state_samples = Counter()
+
+        for stack, count in self.samples.items():
+            state_samples[stack.partition(";")[0]] += count
+
+        return {
+            "wall_seconds": self._wall_seconds,
+            "cpu_seconds": self._cpu_seconds,
+            "await_seconds": max(self._wall_seconds - self._cpu_seconds, 0.0),
+            "interval": self.interval,
+            "samples": {CPU_STATE: state_samples[CPU_STATE], AWAIT_STATE: state_samples[AWAIT_STATE]}
+        }
+
+    def finish(self, name: str = "invocation"):
+        """Stops sampling and saves the artifacts. Never raises, so profiling cannot fail an invocation."""
+        try:
+            self.stop()
+            timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+            key = f"profiles/{timestamp}-{name}-{uuid.uuid4().hex[:8]}"
+            summary = self.summary()
+            self.object_store.put(key=f"{key}.collapsed", data=self.collapsed().encode())
+            self.object_store.put(key=f"{key}.json", data=json.dumps(summary).encode())
+            logger.info(f"Saved profile to {self.object_store.uri(f'{key}.collapsed')} - {summary}")
+        except Exception as e:
+            logger.error(f"Failed to save profile - {e}")
+
+
+@cache
+def get_profile_store(location: str) -> ObjectStore:
+    return create_object_store(location)
+
+
+def start_profiler(settings: ProfilingSettings | None, rng=random.random) -> SamplingProfiler | None:
+    """Starts a profiler for sample_rate of calls."""
+    if settings is None or rng() >= settings.sample_rate:
+        return None
+
+    try:
+        profiler = SamplingProfiler(object_store=get_profile_store(settings.location), interval=settings.interval)
+        profiler.start()
+        return profiler
+    except Exception as e:
+        logger.error(f"Failed to start profiler - {e}")
+        return None
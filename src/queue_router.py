@@ -0,0 +1,59 @@
+import bisect
+import hashlib
+from functools import cache
+
+DEFAULT_VIRTUAL_NODES = 100
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.sha256(value.encode()).digest()[:8], "big")
+
+
+def parse_queue_urls(value: str) -> list[str]:
+    return [queue_url.strip() for queue_url in value.split(",") if queue_url.strip()]
+
+
+def is_fifo_queue(queue_url: str) -> bool:
+    return queue_url.endswith(".fifo")
+
+
+def get_deduplication_id(message: str) -> str:
+    return hashlib.sha256(message.encode()).hexdigest()
+
+
+class QueueRouter:
+    """
+    Assigns each user to one of several output queues with consistent hashing on user_id.
+
+    Every queue owns virtual_nodes points on a hash ring and a user goes to the first point at or after the hash of
+    its id. A user therefore always lands on the same queue, and adding or removing a queue only moves the users
+    whose points it takes over or gives up.
+    """
+
+    def __init__(self, queue_urls: list[str], virtual_nodes: int = DEFAULT_VIRTUAL_NODES):
+        if not queue_urls:
+            raise ValueError("At least one queue url is required")
+
+        self.queue_urls = queue_urls
+        self._ring = sorted(
+            (_hash(f"{queue_url}#{index}"), queue_url)
+            for queue_url in queue_urls
+            for index in range(virtual_nodes)
+        )
+        self._points = [point for point, _ in self._ring]
+
+    def get_queue_url(self, user_id: str) -> str:
+        index = bisect.bisect_left(self._points, _hash(user_id)) % len(self._ring)
+        return self._ring[index][1]
+
+
+@cache
+def _get_queue_router(queue_urls: tuple[str, ...]) -> QueueRouter:
+    return QueueRouter(list(queue_urls))
+
+
+def get_queue_router(queue_urls: list[str] | None) -> QueueRouter | None:
+    if not queue_urls:
+        return None
+
+    return _get_queue_router(tuple(queue_urls))
@@ -0,0 +1,135 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import cache
+
+from loguru import logger
+
+from src.claim_check import ObjectStore, ObjectNotFoundException, create_object_store
+from src.message_format import encode_user_spotify_data, decode_user_spotify_data, MessageFormatException
+from src.models import UserSpotifyData, ResultCacheSettings
+
+
+class ResultCache:
+    """
+    Remembers fetched user data by SQS message id and when each user was last published, for freshness_window seconds.
+
+    A redelivered message can republish its cached result instead of fetching again, and a user published within the
+    window can be skipped entirely. Entries live in an in-memory LRU and, if a store is given, are also written to it
+    so every container shares them. Store failures are logged and treated as cache misses. Safe to call from several
+    threads at once; store I/O runs outside the lock.
+    """
+
+    def __init__(self, max_entries: int, freshness_window: float, store: ObjectStore | None = None, clock=time.time):
+        self.max_entries = max_entries
+        self.freshness_window = freshness_window
+        self.store = store
+        self.clock = clock
+        self._results = OrderedDict()
+        self._published_at = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _recall(self, entries: OrderedDict, key: str):
+        with self._lock:
+            value = entries.get(key)
+
+            if value is not None:
+                entries.move_to_end(key)
+
+            return value
+
+    def _remember(self, entries: OrderedDict, key: str, value):
+        with self._lock:
+            entries[key] = value
+            entries.move_to_end(key)
+
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def _is_fresh(self, stored_at: float) -> bool:
+        return self.clock() - stored_at < self.freshness_window
+
+    def _load(self, key: str) -> dict | None:
+        try:
+            return json.loads(self.store.get(key))
+        except ObjectNotFoundException:
+            return None
+        except Exception as e:
+            logger.error(f"Failed to load {key} from result cache store - {e}")
+            return None
+
+    def _save(self, key: str, data: dict):
+        try:
+            self.store.put(key=key, data=json.dumps(data).encode())
+        except Exception as e:
+            logger.error(f"Failed to save {key} to result cache store - {e}")
+
+    def get_result(self, message_id: str | None) -> UserSpotifyData | None:
+        if message_id is None:
+            return None
+
+        entry = self._recall(self._results, message_id)
+
+        if entry is None and self.store is not None:
+            key = f"results/messages/{message_id}.json"
+            stored = self._load(key)
+
+            if stored is not None:
+                try:
+                    entry = (stored["stored_at"], decode_user_spotify_data(stored["message_data"]))
+                except (KeyError, MessageFormatException) as e:
+                    logger.error(f"Failed to decode {key} from result cache store - {e}")
+                    return None
+
+                self._remember(self._results, message_id, entry)
+
+        if entry is None or not self._is_fresh(entry[0]):
+            return None
+
+        return entry[1]
+
+    def put_result(self, message_id: str | None, user_id: str, user_spotify_data: UserSpotifyData):
+        if message_id is None:
+            return
+
+        stored_at = self.clock()
+        self._remember(self._results, message_id, (stored_at, user_spotify_data))
+
+        if self.store is not None:
+            message_data = encode_user_spotify_data(user_id=user_id, user_spotify_data=user_spotify_data)
+            self._save(f"results/messages/{message_id}.json", {"stored_at": stored_at, "message_data": message_data})
+
+    def was_recently_published(self, user_id: str) -> bool:
+        published_at = self._recall(self._published_at, user_id)
+
+        if published_at is None and self.store is not None:
+            key = f"results/users/{user_id}.json"
+            stored = self._load(key)
+
+            if stored is not None:
+                try:
+                    published_at = stored["published_at"]
+                except KeyError as e:
+                    logger.error(f"Failed to decode {key} from result cache store - {e}")
+                    return False
+
+                self._remember(self._published_at, user_id, published_at)
+
+        return published_at is not None and self._is_fresh(published_at)
+
+    def mark_published(self, user_id: str):
+        published_at = self.clock()
+        self._remember(self._published_at, user_id, published_at)
+
+        if self.store is not None:
+            self._save(f"results/users/{user_id}.json", {"published_at": published_at})
+
+
+@cache
+def get_result_cache(settings: ResultCacheSettings | None) -> ResultCache | None:
+    if settings is None:
+        return None
+
+    store = None if settings.store_location is None else create_object_store(settings.store_location)
+    return ResultCache(max_entries=settings.max_entries, freshness_window=settings.freshness_window, store=store)
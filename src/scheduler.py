@@ -0,0 +1,121 @@
+import asyncio
+import heapq
+import itertools
+import json
+import time
+from contextlib import asynccontextmanager
+
+from loguru import logger
+
+from src.metrics import LatencyTracker
+from src.models import Priority
+
+DEFAULT_PRIORITY_WEIGHTS = {Priority.HIGH: 4.0, Priority.NORMAL: 2.0, Priority.LOW: 1.0}
+LATENCY_WINDOW_SIZE = 1000
+
+
+def get_priority(message: dict) -> Priority:
+    """Reads an optional priority from a message's "priority" attribute, falling back to its body."""
+    attribute = message.get("MessageAttributes", {}).get("priority")
+
+    if attribute is not None:
+        value = attribute.get("StringValue")
+    else:
+        try:
+            value = json.loads(message["Body"]).get("priority")
+        except (KeyError, TypeError, ValueError, AttributeError):
+            value = None
+
+    if value is None:
+        return Priority.NORMAL
+
+    try:
+        return Priority(str(value).lower())
+    except ValueError:
+        logger.warning(f"Unknown priority {value} - using {Priority.NORMAL.value}")
+        return Priority.NORMAL
+
+
+class PriorityScheduler:
+    """
+    Limits how many users are processed at once and decides who goes next using weighted fair queueing.
+
+    Each waiting user is tagged with a virtual finish time of max(virtual time, previous tag of its priority) plus
+    1 / weight, and the smallest tag is served first. Higher priorities therefore get more of the slots while lower
+    priorities still advance, in proportion to their weights, instead of being starved.
+    """
+
+    def __init__(
+            self,
+            concurrency: int,
+            weights: dict[Priority, float] | None = None,
+            clock=time.monotonic
+    ):
+        self.concurrency = concurrency
+        self.weights = weights or DEFAULT_PRIORITY_WEIGHTS
+        self.clock = clock
+        self._active = 0
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._last_finish = {}
+        self._latency_trackers = {priority: LatencyTracker(LATENCY_WINDOW_SIZE) for priority in Priority}
+        self._completed = {priority: 0 for priority in Priority}
+
+    async def _acquire(self, priority: Priority):
+        if self._active < self.concurrency and not self._waiting:
+            self._active += 1
+            return
+
+        finish = max(self._virtual_time, self._last_finish.get(priority, 0.0)) + 1 / self.weights[priority]
+        self._last_finish[priority] = finish
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (finish, next(self._sequence), future))
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release()
+
+            raise
+
+    def _release(self):
+        while self._waiting:
+            finish, _, future = heapq.heappop(self._waiting)
+
+            if future.cancelled():
+                continue
+
+            self._virtual_time = finish
+            future.set_result(None)
+            return
+
+        self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority):
+        started_at = self.clock()
+        await self._acquire(priority)
+
+        try:
+            yield
+        finally:
+            self._release()
+            self._latency_trackers[priority].observe(self.clock() - started_at)
+            self._completed[priority] += 1
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        summary = {}
+
+        for priority, latency_tracker in self._latency_trackers.items():
+            if len(latency_tracker) == 0:
+                continue
+
+            summary[priority.value] = {
+                "completed": self._completed[priority],
+                "p50": latency_tracker.percentile(0.5),
+                "p95": latency_tracker.percentile(0.95)
+            }
+
+        return summary
@@ -0,0 +1,400 @@
+import asyncio
+import math
+import os
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+
+import boto3
+import httpx
+from botocore.client import BaseClient
+from botocore.config import Config
+from loguru import logger
+
+from src.circuit_breaker import get_circuit_breaker_registry
+from src.claim_check import ClaimCheck, get_claim_check
+from src.data_service import DataService, CircuitOpenException
+from src.freshness import RefreshPlanner, get_refresh_planner
+from src.hedging import get_hedge_policy
+from src.metrics import TransferMetrics
+from src.queue_router import QueueRouter, get_queue_router
+from src.result_cache import ResultCache, get_result_cache
+from src.scheduler import PriorityScheduler, get_priority
+from src.top_items_cache import get_top_items_cache
+from src.lambda_function import get_settings, get_user_from_message_body, add_user_spotify_data_to_queue, \
+    MAX_VISIBILITY_TIMEOUT
+from src.models import WorkerSettings, User, UserSpotifyData
+
+MAX_RECEIVE_MESSAGES = 10
+RECEIVE_WAIT_TIME_SECONDS = 20
+DELETE_BATCH_SIZE = 10
+SCHEDULER_SUMMARY_INTERVAL_SECONDS = 60.0
+
+
+def get_worker_settings() -> WorkerSettings:
+    logger.info("Loading worker environment settings")
+    input_queue_url = os.environ["INPUT_QUEUE_URL"]
+    pollers = int(os.environ.get("WORKER_POLLERS", "4"))
+    max_in_flight = int(os.environ.get("WORKER_MAX_IN_FLIGHT", str(pollers * MAX_RECEIVE_MESSAGES)))
+    visibility_timeout = int(os.environ.get("WORKER_VISIBILITY_TIMEOUT", "60"))
+    concurrency = os.environ.get("WORKER_CONCURRENCY")
+    user_timeout = os.environ.get("WORKER_USER_TIMEOUT")
+
+    worker_settings = WorkerSettings(
+        input_queue_url=input_queue_url,
+        pollers=pollers,
+        max_in_flight=max_in_flight,
+        visibility_timeout=visibility_timeout,
+        concurrency=None if concurrency is None else int(concurrency),
+        user_timeout=None if user_timeout is None else float(user_timeout)
+    )
+
+    logger.debug(f"Worker settings extracted from environment: {worker_settings}")
+
+    return worker_settings
+
+
+def get_thread_pool_size(pollers: int, max_in_flight: int) -> int:
+    return pollers + max_in_flight
+
+
+class SQSWorker:
+    """
+    Long-polls the input queue with several concurrent pollers and feeds users into a shared DataService.
+
+    A message is only deleted once its user's data has been published, and its visibility timeout is extended while
+    the user is still being processed. Calling stop() stops polling and lets in-flight messages drain.
+
+    With a scheduler, at most its concurrency users are fetched at once and the rest of the in-flight messages wait
+    in priority order.
+
+    Blocking SQS and store calls run on the worker's own thread pool, sized so that long polls never hold up
+    publishes, deletes or visibility heartbeats.
+    """
+
+    def __init__(
+            self,
+            sqs: BaseClient,
+            data_service: DataService,
+            input_queue_url: str,
+            output_queue_url: str | None,
+            pollers: int,
+            max_in_flight: int,
+            visibility_timeout: int,
+            wait_time_seconds: int = RECEIVE_WAIT_TIME_SECONDS,
+            delete_flush_interval: float = 1.0,
+            claim_check: ClaimCheck | None = None,
+            refresh_planner: RefreshPlanner | None = None,
+            scheduler: PriorityScheduler | None = None,
+            message_format_version: int = 1,
+            user_timeout: float | None = None,
+            result_cache: ResultCache | None = None,
+            queue_router: QueueRouter | None = None,
+            executor: ThreadPoolExecutor | None = None,
+            summary_interval: float = SCHEDULER_SUMMARY_INTERVAL_SECONDS
+    ):
+        self.sqs = sqs
+        self.data_service = data_service
+        self.input_queue_url = input_queue_url
+        self.output_queue_url = output_queue_url
+        self.pollers = pollers
+        self.max_in_flight = max_in_flight
+        self.visibility_timeout = visibility_timeout
+        self.wait_time_seconds = wait_time_seconds
+        self.delete_flush_interval = delete_flush_interval
+        self.claim_check = claim_check
+        self.refresh_planner = refresh_planner
+        self.scheduler = scheduler
+        self.message_format_version = message_format_version
+        self.user_timeout = user_timeout
+        self.result_cache = result_cache
+        self.queue_router = queue_router
+        self.summary_interval = summary_interval
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=get_thread_pool_size(pollers, max_in_flight))
+        self._stopping = asyncio.Event()
+        self._capacity = asyncio.Condition()
+        self._reserved = 0
+        self._in_flight = set()
+        self._pending_deletes = []
+        self._wake_task = None
+
+    def stop(self):
+        logger.info("Stopping worker - draining in-flight messages")
+        self._stopping.set()
+        self._wake_task = asyncio.get_running_loop().create_task(self._wake_pollers())
+
+    async def _wake_pollers(self):
+        async with self._capacity:
+            self._capacity.notify_all()
+
+    async def _run_blocking(self, func, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def _reserve_capacity(self) -> int:
+        async with self._capacity:
+            await self._capacity.wait_for(lambda: self._reserved < self.max_in_flight or self._stopping.is_set())
+
+            if self._stopping.is_set():
+                return 0
+
+            count = min(MAX_RECEIVE_MESSAGES, self.max_in_flight - self._reserved)
+            self._reserved += count
+            return count
+
+    async def _release_capacity(self, count: int):
+        async with self._capacity:
+            self._reserved -= count
+            self._capacity.notify_all()
+
+    async def _receive_messages(self, max_messages: int) -> list[dict]:
+        res = await self._run_blocking(
+            self.sqs.receive_message,
+            QueueUrl=self.input_queue_url,
+            MaxNumberOfMessages=max_messages,
+            WaitTimeSeconds=self.wait_time_seconds,
+            VisibilityTimeout=self.visibility_timeout,
+            MessageAttributeNames=["All"]
+        )
+        return res.get("Messages", [])
+
+    async def _extend_visibility(self, receipt_handle: str):
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 2)
+
+            try:
+                await self._run_blocking(
+                    self.sqs.change_message_visibility,
+                    QueueUrl=self.input_queue_url,
+                    ReceiptHandle=receipt_handle,
+                    VisibilityTimeout=self.visibility_timeout
+                )
+                logger.debug("Extended visibility timeout of slow message")
+            except Exception as e:
+                logger.error(f"Failed to extend visibility timeout - {e}")
+
+    async def _release_with_delay(self, receipt_handle: str, delay: float):
+        visibility_timeout = min(max(1, math.ceil(delay)), MAX_VISIBILITY_TIMEOUT)
+        logger.info(f"Releasing message back to queue with {visibility_timeout} second delay")
+
+        try:
+            await self._run_blocking(
+                self.sqs.change_message_visibility,
+                QueueUrl=self.input_queue_url,
+                ReceiptHandle=receipt_handle,
+                VisibilityTimeout=visibility_timeout
+            )
+        except Exception as e:
+            logger.error(f"Failed to release message back to queue - {e}")
+
+    async def _flush_deletes(self):
+        while self._pending_deletes:
+            entries = self._pending_deletes[:DELETE_BATCH_SIZE]
+            del self._pending_deletes[:DELETE_BATCH_SIZE]
+
+            try:
+                res = await self._run_blocking(
+                    self.sqs.delete_message_batch,
+                    QueueUrl=self.input_queue_url,
+                    Entries=entries
+                )
+
+                for failure in res.get("Failed", []):
+                    logger.error(f"Failed to delete message - {failure}")
+            except Exception as e:
+                logger.error(f"Failed to delete message batch - {e}")
+
+    def _log_summary(self):
+        if self.scheduler is not None:
+            logger.info(f"Latency by priority: {self.scheduler.summary()}")
+
+        if self.data_service.transfer_metrics is not None:
+            logger.info(f"Data API transfer: {self.data_service.transfer_metrics.summary()}")
+
+    async def _delete_flusher(self):
+        loop = asyncio.get_running_loop()
+        last_summary_at = loop.time()
+
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.delete_flush_interval)
+            except asyncio.TimeoutError:
+                pass
+
+            await self._flush_deletes()
+
+            if loop.time() - last_summary_at >= self.summary_interval:
+                self._log_summary()
+                last_summary_at = loop.time()
+
+    def _delete_later(self, message: dict):
+        self._pending_deletes.append({"Id": message["MessageId"], "ReceiptHandle": message["ReceiptHandle"]})
+
+    async def _fetch_user_spotify_data(self, message: dict, user: User) -> tuple[UserSpotifyData, dict | None]:
+        time_ranges = None
+
+        if self.refresh_planner is not None:
+            time_ranges = await self._run_blocking(self.refresh_planner.plan, user.id)
+
+        slot = nullcontext() if self.scheduler is None else self.scheduler.slot(get_priority(message))
+
+        async with slot:
+            user_spotify_data = await self.data_service.get_user_spotify_data(
+                refresh_token=user.refresh_token,
+                user_id=user.id,
+                time_ranges=time_ranges,
+                timeout=self.user_timeout
+            )
+
+        if self.result_cache is not None:
+            await self._run_blocking(
+                self.result_cache.put_result,
+                message_id=message["MessageId"],
+                user_id=user.id,
+                user_spotify_data=user_spotify_data
+            )
+
+        return user_spotify_data, time_ranges
+
+    async def _handle_message(self, message: dict):
+        heartbeat = asyncio.create_task(self._extend_visibility(message["ReceiptHandle"]))
+
+        try:
+            user = get_user_from_message_body(message["Body"])
+            user_spotify_data = None
+            time_ranges = None
+
+            if self.result_cache is not None:
+                user_spotify_data = await self._run_blocking(self.result_cache.get_result, message["MessageId"])
+
+            if user_spotify_data is None and self.result_cache is not None:
+                recently_published = await self._run_blocking(self.result_cache.was_recently_published, user.id)
+
+                if recently_published:
+                    logger.info(f"User {user.id} published within the last {self.result_cache.freshness_window}s")
+                    self._delete_later(message)
+                    return
+
+            if user_spotify_data is None:
+                user_spotify_data, time_ranges = await self._fetch_user_spotify_data(message=message, user=user)
+
+            await self._run_blocking(
+                add_user_spotify_data_to_queue,
+                sqs=self.sqs,
+                queue_url=self.output_queue_url,
+                user_id=user.id,
+                user_spotify_data=user_spotify_data,
+                claim_check=self.claim_check,
+                format_version=self.message_format_version,
+                queue_router=self.queue_router
+            )
+
+            if self.result_cache is not None:
+                await self._run_blocking(self.result_cache.mark_published, user.id)
+
+            if self.refresh_planner is not None and time_ranges is not None:
+                await self._run_blocking(self.refresh_planner.record, user_id=user.id, time_ranges=time_ranges)
+
+            self._delete_later(message)
+
+            if len(self._pending_deletes) >= DELETE_BATCH_SIZE:
+                await self._flush_deletes()
+        except CircuitOpenException as e:
+            heartbeat.cancel()
+            await self._release_with_delay(receipt_handle=message["ReceiptHandle"], delay=e.retry_after)
+        except Exception as e:
+            logger.error(f"Failed to process message {message.get('MessageId')} - {e}")
+        finally:
+            heartbeat.cancel()
+            await self._release_capacity(1)
+
+    async def _poll(self):
+        while not self._stopping.is_set():
+            count = await self._reserve_capacity()
+
+            if count == 0:
+                break
+
+            try:
+                messages = await self._receive_messages(count)
+            except Exception as e:
+                logger.error(f"Failed to receive messages - {e}")
+                messages = []
+
+            if len(messages) < count:
+                await self._release_capacity(count - len(messages))
+
+            for message in messages:
+                task = asyncio.create_task(self._handle_message(message))
+                self._in_flight.add(task)
+                task.add_done_callback(self._in_flight.discard)
+
+    async def run(self):
+        flusher = asyncio.create_task(self._delete_flusher())
+        await asyncio.gather(*[self._poll() for _ in range(self.pollers)])
+
+        if self._in_flight:
+            logger.info(f"Draining {len(self._in_flight)} in-flight messages")
+            await asyncio.gather(*self._in_flight)
+
+        await flusher
+        await self._flush_deletes()
+
+        self._log_summary()
+
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
+
+        logger.info("Worker stopped")
+
+
+async def main():
+    settings = get_settings()
+    worker_settings = get_worker_settings()
+
+    client = httpx.AsyncClient()
+
+    try:
+        data_service = DataService(
+            client=client,
+            data_api_base_url=settings.data_api_base_url,
+            request_timeout=settings.request_timeout,
+            circuit_breakers=get_circuit_breaker_registry(settings.circuit_breaker),
+            hedge_policy=get_hedge_policy(settings.hedging),
+            top_items_cache=get_top_items_cache(settings.top_items_cache_max_entries),
+            field_projection=settings.top_items_field_projection,
+            limits=settings.top_items_limits,
+            transfer_metrics=TransferMetrics(),
+            retry_attempts=settings.top_items_retry_attempts
+        )
+        thread_pool_size = get_thread_pool_size(worker_settings.pollers, worker_settings.max_in_flight)
+        worker = SQSWorker(
+            sqs=boto3.client("sqs", config=Config(max_pool_connections=thread_pool_size)),
+            data_service=data_service,
+            input_queue_url=worker_settings.input_queue_url,
+            output_queue_url=settings.queue_url,
+            pollers=worker_settings.pollers,
+            max_in_flight=worker_settings.max_in_flight,
+            visibility_timeout=worker_settings.visibility_timeout,
+            claim_check=get_claim_check(settings.claim_check),
+            refresh_planner=get_refresh_planner(settings.freshness),
+            scheduler=None if worker_settings.concurrency is None else PriorityScheduler(worker_settings.concurrency),
+            message_format_version=settings.message_format_version,
+            user_timeout=worker_settings.user_timeout,
+            result_cache=get_result_cache(settings.result_cache),
+            queue_router=get_queue_router(settings.output_queue_urls)
+        )
+
+        loop = asyncio.get_running_loop()
+
+        for signal_number in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signal_number, worker.stop)
+
+        await worker.run()
+    finally:
+        await client.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
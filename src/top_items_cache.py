@@ -0,0 +1,44 @@
+from collections import OrderedDict
+from functools import cache
+
+from src.models import ItemType, TimeRange, CachedTopItems
+
+
+class TopItemsCache:
+    """
+    Least recently used cache of validators and parsed top items for each user, item type and time range.
+
+    Used to send conditional requests so unchanged top items are not downloaded and parsed again.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: str, item_type: ItemType, time_range: TimeRange) -> CachedTopItems | None:
+        key = (user_id, item_type, time_range)
+        cached_top_items = self._entries.get(key)
+
+        if cached_top_items is not None:
+            self._entries.move_to_end(key)
+
+        return cached_top_items
+
+    def put(self, user_id: str, item_type: ItemType, time_range: TimeRange, cached_top_items: CachedTopItems):
+        key = (user_id, item_type, time_range)
+        self._entries[key] = cached_top_items
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+@cache
+def get_top_items_cache(max_entries: int) -> TopItemsCache | None:
+    if max_entries < 1:
+        return None
+
+    return TopItemsCache(max_entries)
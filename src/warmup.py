@@ -0,0 +1,55 @@
+import asyncio
+import time
+
+import httpx
+from botocore.client import BaseClient
+from loguru import logger
+
+
+async def open_connections(client: httpx.AsyncClient, url: str, connections: int) -> int:
+    """
+    Sends concurrent HEAD requests so the client pool holds up to connections keep-alive connections to the host.
+
+    Any response, including an error status, leaves its connection in the pool, so only transport errors count as
+    failures.
+    """
+    results = await asyncio.gather(*[client.head(url) for _ in range(connections)], return_exceptions=True)
+    return sum(1 for result in results if isinstance(result, httpx.Response))
+
+
+def warm_up_sqs(sqs: BaseClient, queue_url: str):
+    """Resolves credentials and opens a connection to SQS with a cheap call against the output queue."""
+    sqs.get_queue_attributes(QueueUrl=queue_url, AttributeNames=["QueueArn"])
+
+
+def warm_up(
+        data_api_base_url: str,
+        connections: int,
+        sqs: BaseClient | None = None,
+        queue_url: str | None = None,
+        runner: asyncio.Runner | None = None,
+        client: httpx.AsyncClient | None = None
+) -> dict:
+    """
+    Prepares a cold container before its first invocation: keep-alive connections to the data API on the runner's
+    event loop and the SQS client. Each step is independent and failures are logged, never raised.
+    """
+    start = time.perf_counter()
+    summary = {"connections": 0, "sqs": False}
+
+    if runner is not None and client is not None:
+        try:
+            summary["connections"] = runner.run(open_connections(client, data_api_base_url, connections))
+        except Exception as e:
+            logger.warning(f"Warmup failed to open data API connections - {e}")
+
+    if sqs is not None and queue_url is not None:
+        try:
+            warm_up_sqs(sqs=sqs, queue_url=queue_url)
+            summary["sqs"] = True
+        except Exception as e:
+            logger.warning(f"Warmup failed to reach SQS - {e}")
+
+    summary["seconds"] = time.perf_counter() - start
+    logger.info(f"Warmup finished: {summary}")
+    return summary
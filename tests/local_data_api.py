@@ -0,0 +1,90 @@
+import gzip
+import hashlib
+import json
+from email.utils import format_datetime, parsedate_to_datetime
+from datetime import datetime, timezone
+
+import httpx
+
+
+class LocalDataAPI:
+    """
+    In-process stand-in for the data API, served through httpx.MockTransport.
+
+    Top items responses carry ETag and Last-Modified validators and honour If-None-Match and If-Modified-Since on
+    both GET and POST, answering 304 Not Modified when the requested data has not changed. The fields and limit
+    query parameters project and truncate items, and bodies are gzip-encoded when the request accepts gzip.
+    """
+
+    def __init__(self, base_url: str = "http://data-api.test"):
+        self.base_url = base_url
+        self.top_items = {}
+        self.last_modified = {}
+        self.requests = []
+        self.not_modified_responses = 0
+
+    def set_top_items(self, item_type: str, time_range: str, items: list[dict], last_modified: datetime | None = None):
+        self.top_items[(item_type, time_range)] = items
+        self.last_modified[(item_type, time_range)] = last_modified or datetime.now(timezone.utc).replace(microsecond=0)
+
+    def client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(self.handle))
+
+    @staticmethod
+    def _etag(body: bytes) -> str:
+        return f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+
+    def _is_not_modified(self, request: httpx.Request, etag: str, last_modified: datetime) -> bool:
+        if_none_match = request.headers.get("If-None-Match")
+
+        if if_none_match is not None:
+            return etag in [value.strip() for value in if_none_match.split(",")] or if_none_match.strip() == "*"
+
+        if_modified_since = request.headers.get("If-Modified-Since")
+
+        if if_modified_since is not None:
+            return last_modified <= parsedate_to_datetime(if_modified_since)
+
+        return False
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        path = request.url.path
+
+        if path == "/auth/tokens/refresh":
+            refresh_token = json.loads(request.content)["refresh_token"]
+            return httpx.Response(200, json={"access_token": f"access-{refresh_token}"})
+
+        if path.startswith("/data/me/top/") and request.method in ("GET", "POST"):
+            item_type = path.removeprefix("/data/me/top/").removesuffix("s")
+            key = (item_type, request.url.params["time_range"])
+
+            if key not in self.top_items:
+                return httpx.Response(404)
+
+            items = self.top_items[key]
+
+            if "limit" in request.url.params:
+                items = items[:int(request.url.params["limit"])]
+
+            if "fields" in request.url.params:
+                fields = request.url.params["fields"].split(",")
+                items = [{field: item[field] for field in fields if field in item} for item in items]
+
+            body = json.dumps(items).encode()
+            etag = self._etag(body)
+            last_modified = self.last_modified[key]
+            headers = {"ETag": etag, "Last-Modified": format_datetime(last_modified, usegmt=True)}
+
+            if self._is_not_modified(request=request, etag=etag, last_modified=last_modified):
+                self.not_modified_responses += 1
+                return httpx.Response(304, headers=headers)
+
+            headers["Content-Type"] = "application/json"
+
+            if "gzip" in request.headers.get("Accept-Encoding", ""):
+                return httpx.Response(200, content=gzip.compress(body), headers={**headers, "Content-Encoding": "gzip"})
+
+            return httpx.Response(200, content=body, headers=headers)
+
+        return httpx.Response(404)
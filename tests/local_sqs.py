@@ -0,0 +1,123 @@
+import threading
+import time
+import uuid
+
+
+class LocalSQS:
+    """
+    In-memory stand-in for the subset of the boto3 SQS client used by this project.
+
+    Long-poll wait times are multiplied by time_scale so receive_message behaviour can be exercised quickly, while
+    visibility timeouts are honoured in real seconds. Queues whose url ends in .fifo drop messages with a
+    MessageDeduplicationId they have already accepted.
+    """
+
+    def __init__(self, time_scale: float = 0.01):
+        self.time_scale = time_scale
+        self.queues = {}
+        self.deleted = {}
+        self.visibility_changes = []
+        self._deduplication_ids = {}
+        self._condition = threading.Condition()
+
+    def _queue(self, queue_url: str) -> list[dict]:
+        return self.queues.setdefault(queue_url, [])
+
+    def send_message(self, QueueUrl: str, MessageBody: str, **kwargs) -> dict:
+        message_id = str(uuid.uuid4())
+
+        with self._condition:
+            if QueueUrl.endswith(".fifo"):
+                deduplication_ids = self._deduplication_ids.setdefault(QueueUrl, {})
+                deduplication_id = kwargs["MessageDeduplicationId"]
+
+                if deduplication_id in deduplication_ids:
+                    return {"MessageId": deduplication_ids[deduplication_id]}
+
+                deduplication_ids[deduplication_id] = message_id
+
+            self._queue(QueueUrl).append(
+                {
+                    "MessageId": message_id,
+                    "Body": MessageBody,
+                    "MessageAttributes": kwargs.get("MessageAttributes", {}),
+                    "Attributes": {
+                        key: kwargs[key] for key in ("MessageGroupId", "MessageDeduplicationId") if key in kwargs
+                    },
+                    "ReceiptHandle": None,
+                    "VisibleAt": 0.0
+                }
+            )
+            self._condition.notify_all()
+
+        return {"MessageId": message_id}
+
+    def messages(self, queue_url: str) -> list[dict]:
+        with self._condition:
+            return list(self._queue(queue_url))
+
+    def _take_visible(self, queue_url: str, max_messages: int, visibility_timeout: float) -> list[dict]:
+        now = time.monotonic()
+        received = []
+
+        for message in self._queue(queue_url):
+            if len(received) == max_messages:
+                break
+
+            if message["VisibleAt"] <= now:
+                message["ReceiptHandle"] = str(uuid.uuid4())
+                message["VisibleAt"] = now + visibility_timeout
+                received.append(
+                    {key: message[key] for key in ("MessageId", "Body", "MessageAttributes", "ReceiptHandle")}
+                )
+
+        return received
+
+    def receive_message(
+            self,
+            QueueUrl: str,
+            MaxNumberOfMessages: int = 1,
+            WaitTimeSeconds: int = 0,
+            VisibilityTimeout: int = 30,
+            **kwargs
+    ) -> dict:
+        deadline = time.monotonic() + WaitTimeSeconds * self.time_scale
+
+        with self._condition:
+            while True:
+                received = self._take_visible(QueueUrl, MaxNumberOfMessages, VisibilityTimeout)
+                remaining = deadline - time.monotonic()
+
+                if received or remaining <= 0:
+                    break
+
+                self._condition.wait(timeout=min(remaining, self.time_scale))
+
+        return {"Messages": received} if received else {}
+
+    def change_message_visibility(self, QueueUrl: str, ReceiptHandle: str, VisibilityTimeout: int):
+        with self._condition:
+            for message in self._queue(QueueUrl):
+                if message["ReceiptHandle"] == ReceiptHandle:
+                    message["VisibleAt"] = time.monotonic() + VisibilityTimeout
+                    self.visibility_changes.append((message["MessageId"], VisibilityTimeout))
+                    self._condition.notify_all()
+
+    def delete_message_batch(self, QueueUrl: str, Entries: list[dict]) -> dict:
+        successful = []
+        failed = []
+
+        with self._condition:
+            queue = self._queue(QueueUrl)
+
+            for entry in Entries:
+                matches = [message for message in queue if message["ReceiptHandle"] == entry["ReceiptHandle"]]
+
+                if matches:
+                    queue.remove(matches[0])
+                    self.deleted.setdefault(QueueUrl, []).append(matches[0]["MessageId"])
+                    successful.append({"Id": entry["Id"]})
+                else:
+                    failed.append({"Id": entry["Id"], "Code": "ReceiptHandleIsInvalid", "SenderFault": True})
+
+        return {"Successful": successful, "Failed": failed}
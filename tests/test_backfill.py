@@ -0,0 +1,184 @@
+import asyncio
+import io
+import json
+from unittest.mock import Mock, AsyncMock
+
+import pytest
+
+from src.backfill import Checkpoint, read_users, process_users, run_backfill, JsonlSink, SQSSink
+from src.message_format import serialize_message
+from src.models import User, UserSpotifyData
+from src.queue_router import QueueRouter
+from tests.local_sqs import LocalSQS
+
+# 1. Test Checkpoint.mark_done only advances watermark over contiguous completed records.
+# 2. Test Checkpoint persists watermark and load resumes from it.
+
+# 3. Test read_users skips blank lines, skips checkpointed records and yields None for invalid records.
+
+# 4. Test process_users never runs more than concurrency users at once.
+
+# 5. Test run_backfill writes successful users to sink and resumes from checkpoint.
+# 6. Test run_backfill appends users that failed to fetch or write to rejects for replay.
+
+# 7. Test SQSSink publishes each message to the user's queue from the queue router.
+
+
+async def collect(async_iterator) -> list:
+    return [item async for item in async_iterator]
+
+
+def create_message(user_id: str, refresh_token: str) -> bytes:
+    user_spotify_data = UserSpotifyData(
+        refresh_token=refresh_token,
+        top_artists_data=[],
+        top_tracks_data=[],
+        top_genres_data=[],
+        top_emotions_data=[]
+    )
+    return serialize_message(user_id=user_id, user_spotify_data=user_spotify_data).encode()
+
+
+# 1. Test Checkpoint.mark_done only advances watermark over contiguous completed records.
+def test_checkpoint_mark_done_only_advances_watermark_over_contiguous_completed_records():
+    checkpoint = Checkpoint(path=None)
+
+    checkpoint.mark_done(1)
+    checkpoint.mark_done(2)
+    assert checkpoint.watermark == 0
+
+    checkpoint.mark_done(0)
+    assert checkpoint.watermark == 3
+
+
+# 2. Test Checkpoint persists watermark and load resumes from it.
+def test_checkpoint_persists_watermark_and_load_resumes_from_it(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    checkpoint = Checkpoint(path=path)
+    checkpoint.mark_done(0)
+    checkpoint.mark_done(1)
+
+    resumed_checkpoint = Checkpoint(path=path)
+
+    assert resumed_checkpoint.load() == 2
+
+
+# 3. Test read_users skips blank lines, skips checkpointed records and yields None for invalid records.
+@pytest.mark.asyncio
+async def test_read_users_skips_blank_lines_skips_checkpointed_records_and_yields_none_for_invalid_records():
+    input_file = io.StringIO(
+        '{"user_id": "1", "refresh_token": "a"}\n'
+        "\n"
+        '{"user_id": "2", "refresh_token": "b"}\n'
+        "not json\n"
+        '{"user_id": "3"}\n'
+    )
+
+    users = await collect(read_users(file=input_file, skip=1))
+
+    assert users == [(1, User(id="2", refresh_token="b")), (2, None), (3, None)]
+
+
+# 4. Test process_users never runs more than concurrency users at once.
+@pytest.mark.asyncio
+async def test_process_users_never_runs_more_than_concurrency_users_at_once():
+    in_flight = 0
+    max_in_flight = 0
+
+    async def get_user_spotify_message(refresh_token: str, user_id: str, format_version: int) -> bytes:
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return create_message(user_id, refresh_token)
+
+    async def users():
+        for index in range(10):
+            yield index, User(id=str(index), refresh_token=str(index))
+
+    mock_data_service = Mock()
+    mock_data_service.get_user_spotify_message = get_user_spotify_message
+
+    results = await collect(process_users(users=users(), data_service=mock_data_service, concurrency=3))
+
+    assert max_in_flight == 3
+    assert sorted(index for index, _, _ in results) == list(range(10))
+
+
+# 5. Test run_backfill writes successful users to sink and resumes from checkpoint.
+@pytest.mark.asyncio
+async def test_run_backfill_writes_successful_users_to_sink_and_resumes_from_checkpoint(tmp_path):
+    checkpoint_path = tmp_path / "checkpoint.json"
+    checkpoint_path.write_text(json.dumps({"processed": 1}))
+    input_file = io.StringIO(
+        '{"user_id": "1", "refresh_token": "a"}\n'
+        '{"user_id": "2", "refresh_token": "b"}\n'
+        '{"user_id": "3", "refresh_token": "c"}\n'
+    )
+    output_file = io.StringIO()
+    mock_data_service = Mock()
+    mock_data_service.get_user_spotify_message = AsyncMock(
+        side_effect=[create_message("2", "new_b"), Exception("test")]
+    )
+
+    summary = await run_backfill(
+        input_file=input_file,
+        data_service=mock_data_service,
+        sink=JsonlSink(output_file),
+        checkpoint=Checkpoint(path=str(checkpoint_path)),
+        concurrency=1
+    )
+
+    assert summary == {"succeeded": 1, "failed": 1}
+    output = [json.loads(line) for line in output_file.getvalue().splitlines()]
+    assert [entry["user_id"] for entry in output] == ["2"]
+    assert output[0]["refresh_token"] == "new_b"
+    assert json.loads(checkpoint_path.read_text()) == {"processed": 3}
+
+
+
+# 6. Test run_backfill appends users that failed to fetch or write to rejects for replay.
+@pytest.mark.asyncio
+async def test_run_backfill_appends_users_that_failed_to_fetch_or_write_to_rejects_for_replay():
+    input_file = io.StringIO(
+        '{"user_id": "1", "refresh_token": "a"}\n'
+        '{"user_id": "2", "refresh_token": "b"}\n'
+        '{"user_id": "3", "refresh_token": "c"}\n'
+    )
+    rejects = io.StringIO()
+    mock_data_service = Mock()
+    mock_data_service.get_user_spotify_message = AsyncMock(
+        side_effect=[Exception("test"), create_message("2", "new_b"), create_message("3", "new_c")]
+    )
+    mock_sink = Mock()
+    mock_sink.write = AsyncMock(side_effect=[Exception("test"), None])
+
+    summary = await run_backfill(
+        input_file=input_file,
+        data_service=mock_data_service,
+        sink=mock_sink,
+        checkpoint=Checkpoint(path=None),
+        concurrency=1,
+        rejects=rejects
+    )
+
+    assert summary == {"succeeded": 1, "failed": 2}
+    replayed_users = await collect(read_users(file=io.StringIO(rejects.getvalue())))
+    assert replayed_users == [(0, User(id="1", refresh_token="a")), (1, User(id="2", refresh_token="b"))]
+
+# 7. Test SQSSink publishes each message to the user's queue from the queue router.
+@pytest.mark.asyncio
+async def test_sqs_sink_publishes_each_message_to_the_users_queue_from_the_queue_router():
+    local_sqs = LocalSQS()
+    queue_router = QueueRouter(["queue_a", "queue_b"])
+    sink = SQSSink(sqs=local_sqs, queue_url="default_queue", queue_router=queue_router)
+
+    for index in range(10):
+        await sink.write(user_id=str(index), message=create_message(str(index), "refresh"))
+
+    assert local_sqs.messages("default_queue") == []
+
+    for index in range(10):
+        queue_url = queue_router.get_queue_url(str(index))
+        assert str(index) in [json.loads(message["Body"])["user_id"] for message in local_sqs.messages(queue_url)]
@@ -0,0 +1,148 @@
+import pytest
+
+from src.circuit_breaker import CircuitBreaker, CircuitBreakerRegistry
+from src.models import CircuitState, CircuitBreakerSettings
+
+# 1. Test CircuitBreaker stays closed until minimum calls recorded.
+# 2. Test CircuitBreaker opens if failure rate reaches threshold.
+# 3. Test CircuitBreaker opens if slow call rate reaches threshold.
+# 4. Test CircuitBreaker rejects requests while open and reports retry after.
+# 5. Test CircuitBreaker closes after successful half-open probes.
+# 6. Test CircuitBreaker re-opens if half-open probe fails.
+# 7. Test CircuitBreaker.release frees half-open probe slot.
+
+# 8. Test CircuitBreakerRegistry reuses circuit breaker per endpoint and reports health.
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def circuit_breaker_settings() -> CircuitBreakerSettings:
+    return CircuitBreakerSettings(
+        failure_rate_threshold=0.5,
+        slow_call_rate_threshold=0.5,
+        slow_call_duration=1.0,
+        minimum_calls=4,
+        window_size=10,
+        open_duration=30.0,
+        half_open_max_calls=2
+    )
+
+
+@pytest.fixture
+def circuit_breaker(circuit_breaker_settings, clock) -> CircuitBreaker:
+    return CircuitBreaker(name="test", settings=circuit_breaker_settings, clock=clock)
+
+
+def open_circuit(circuit_breaker: CircuitBreaker):
+    for _ in range(4):
+        circuit_breaker.record(failed=True, latency=0.1)
+
+
+# 1. Test CircuitBreaker stays closed until minimum calls recorded.
+def test_circuit_breaker_stays_closed_until_minimum_calls_recorded(circuit_breaker):
+    for _ in range(3):
+        circuit_breaker.record(failed=True, latency=0.1)
+
+    assert circuit_breaker.state == CircuitState.CLOSED
+    assert circuit_breaker.allow_request()
+
+
+# 2. Test CircuitBreaker opens if failure rate reaches threshold.
+def test_circuit_breaker_opens_if_failure_rate_reaches_threshold(circuit_breaker):
+    circuit_breaker.record(failed=False, latency=0.1)
+    circuit_breaker.record(failed=False, latency=0.1)
+    circuit_breaker.record(failed=True, latency=0.1)
+    assert circuit_breaker.state == CircuitState.CLOSED
+
+    circuit_breaker.record(failed=True, latency=0.1)
+
+    assert circuit_breaker.state == CircuitState.OPEN
+
+
+# 3. Test CircuitBreaker opens if slow call rate reaches threshold.
+def test_circuit_breaker_opens_if_slow_call_rate_reaches_threshold(circuit_breaker):
+    for latency in [0.1, 0.1, 2.0, 2.0]:
+        circuit_breaker.record(failed=False, latency=latency)
+
+    assert circuit_breaker.state == CircuitState.OPEN
+
+
+# 4. Test CircuitBreaker rejects requests while open and reports retry after.
+def test_circuit_breaker_rejects_requests_while_open_and_reports_retry_after(circuit_breaker, clock):
+    open_circuit(circuit_breaker)
+    clock.now = 10.0
+
+    assert not circuit_breaker.allow_request()
+    assert circuit_breaker.retry_after == 20.0
+
+
+# 5. Test CircuitBreaker closes after successful half-open probes.
+def test_circuit_breaker_closes_after_successful_half_open_probes(circuit_breaker, clock):
+    open_circuit(circuit_breaker)
+    clock.now = 30.0
+
+    assert circuit_breaker.allow_request()
+    assert circuit_breaker.allow_request()
+    assert not circuit_breaker.allow_request()
+    assert circuit_breaker.state == CircuitState.HALF_OPEN
+
+    circuit_breaker.record(failed=False, latency=0.1)
+    circuit_breaker.record(failed=False, latency=0.1)
+
+    assert circuit_breaker.state == CircuitState.CLOSED
+
+
+# 6. Test CircuitBreaker re-opens if half-open probe fails.
+def test_circuit_breaker_re_opens_if_half_open_probe_fails(circuit_breaker, clock):
+    open_circuit(circuit_breaker)
+    clock.now = 30.0
+    circuit_breaker.allow_request()
+
+    circuit_breaker.record(failed=True, latency=0.1)
+
+    assert circuit_breaker.state == CircuitState.OPEN
+    assert circuit_breaker.retry_after == 30.0
+
+
+# 7. Test CircuitBreaker.release frees half-open probe slot.
+def test_circuit_breaker_release_frees_half_open_probe_slot(circuit_breaker, clock):
+    open_circuit(circuit_breaker)
+    clock.now = 30.0
+    circuit_breaker.allow_request()
+    circuit_breaker.allow_request()
+
+    circuit_breaker.release()
+
+    assert circuit_breaker.allow_request()
+
+
+# 8. Test CircuitBreakerRegistry reuses circuit breaker per endpoint and reports health.
+def test_circuit_breaker_registry_reuses_circuit_breaker_per_endpoint_and_reports_health(
+        circuit_breaker_settings,
+        clock
+):
+    registry = CircuitBreakerRegistry(settings=circuit_breaker_settings, clock=clock)
+    open_circuit(registry.get("/data/me/top/artists"))
+
+    assert registry.get("/data/me/top/artists") is registry.get("/data/me/top/artists")
+    assert registry.health() == {
+        "/data/me/top/artists": {
+            "state": "open",
+            "calls": 4,
+            "failure_rate": 1.0,
+            "slow_call_rate": 0.0,
+            "retry_after": 30.0
+        }
+    }
@@ -0,0 +1,84 @@
+import gzip
+import json
+from unittest.mock import Mock
+
+import pytest
+
+from src.claim_check import LocalObjectStore, S3ObjectStore, ClaimCheck, ObjectStoreException, create_object_store, \
+    read_message
+
+# 1. Test LocalObjectStore stores and returns data.
+# 2. Test LocalObjectStore raises ObjectStoreException if key escapes root.
+
+# 3. Test create_object_store returns S3ObjectStore for s3 uri and LocalObjectStore otherwise.
+
+# 4. Test ClaimCheck.prepare_message returns message unchanged if below threshold.
+# 5. Test ClaimCheck.prepare_message stores compressed message and returns pointer if above threshold.
+
+# 6. Test read_message returns inline and claim checked messages.
+
+
+@pytest.fixture
+def object_store(tmp_path) -> LocalObjectStore:
+    return LocalObjectStore(root=str(tmp_path))
+
+
+# 1. Test LocalObjectStore stores and returns data.
+def test_local_object_store_stores_and_returns_data(object_store):
+    object_store.put(key="user/message.json.gz", data=b"data")
+
+    assert object_store.get("user/message.json.gz") == b"data"
+
+
+# 2. Test LocalObjectStore raises ObjectStoreException if key escapes root.
+def test_local_object_store_raises_object_store_exception_if_key_escapes_root(object_store):
+    with pytest.raises(ObjectStoreException, match="Invalid object key"):
+        object_store.put(key="../outside", data=b"data")
+
+
+# 3. Test create_object_store returns S3ObjectStore for s3 uri and LocalObjectStore otherwise.
+def test_create_object_store_returns_expected_object_store(mocker, tmp_path):
+    mock_s3 = Mock()
+    mock_boto3_client = mocker.patch("src.claim_check.boto3.client", return_value=mock_s3)
+
+    s3_object_store = create_object_store("s3://bucket/claim-check/")
+    local_object_store = create_object_store(str(tmp_path))
+
+    mock_boto3_client.assert_called_once_with("s3")
+    assert isinstance(s3_object_store, S3ObjectStore)
+    assert s3_object_store.uri("key") == "s3://bucket/claim-check/key"
+    assert isinstance(local_object_store, LocalObjectStore)
+
+
+# 4. Test ClaimCheck.prepare_message returns message unchanged if below threshold.
+def test_claim_check_prepare_message_returns_message_unchanged_if_below_threshold(object_store, tmp_path):
+    claim_check = ClaimCheck(object_store=object_store, threshold_bytes=100)
+
+    message = claim_check.prepare_message(user_id="1", message='{"user_id": "1"}')
+
+    assert message == '{"user_id": "1"}'
+    assert list(tmp_path.iterdir()) == []
+
+
+# 5. Test ClaimCheck.prepare_message stores compressed message and returns pointer if above threshold.
+def test_claim_check_prepare_message_stores_compressed_message_and_returns_pointer_if_above_threshold(object_store):
+    claim_check = ClaimCheck(object_store=object_store, threshold_bytes=100)
+    original_message = json.dumps({"user_id": "1", "top_artists_data": ["x" * 200]})
+
+    message = claim_check.prepare_message(user_id="1", message=original_message)
+
+    pointer = json.loads(message)
+    assert pointer["user_id"] == "1"
+    assert pointer["claim_check"]["key"].startswith("1/")
+    assert pointer["claim_check"]["content_encoding"] == "gzip"
+    assert gzip.decompress(object_store.get(pointer["claim_check"]["key"])).decode() == original_message
+
+
+# 6. Test read_message returns inline and claim checked messages.
+def test_read_message_returns_inline_and_claim_checked_messages(object_store):
+    claim_check = ClaimCheck(object_store=object_store, threshold_bytes=100)
+    message_data = {"user_id": "1", "top_artists_data": ["x" * 200]}
+    pointer_message = claim_check.prepare_message(user_id="1", message=json.dumps(message_data))
+
+    assert read_message(body=pointer_message, object_store=object_store) == message_data
+    assert read_message(body='{"user_id": "2"}', object_store=object_store) == {"user_id": "2"}
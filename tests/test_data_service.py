@@ -1,11 +1,21 @@
+import asyncio
+import json
+from concurrent.futures import ProcessPoolExecutor
 from unittest.mock import Mock, AsyncMock, call
 
 import httpx
 import pytest
 
 from src.models import Tokens, ItemType, TimeRange, UserSpotifyData, TopArtistsData, TopTracksData, TopGenresData, \
-    TopEmotionsData, TopArtist, TopTrack, TopGenre, TopEmotion
-from src.data_service import DataService, DataServiceException
+    TopEmotionsData, TopArtist, TopTrack, TopGenre, TopEmotion, CircuitBreakerSettings, CircuitState, HedgeSettings
+from src.circuit_breaker import CircuitBreakerRegistry
+from src.hedging import HedgePolicy
+from src.message_format import serialize_message
+from src.metrics import TransferMetrics
+from src.top_items_cache import TopItemsCache
+from tests.local_data_api import LocalDataAPI
+from src.data_service import DataService, DataServiceException, build_user_message, CircuitOpenException, \
+    RetryableDataServiceException, DeadlineExceededException
 
 # 1. Test _get_data_from_api raises DataServiceException if httpx.HTTPStatusError occurs.
 # 2. Test _get_data_from_api raises DataServiceException if httpx.RequestError occurs.
@@ -24,6 +34,29 @@ from src.data_service import DataService, DataServiceException
 
 # 11. Test get_user_spotify_data returns expected user spotify data.
 
+# 12. Test build_user_message parses raw responses and returns serialized message.
+# 13. Test get_user_spotify_message builds message in a single executor call per user if executor set.
+
+# 14. Test _get_data_from_api raises CircuitOpenException without sending request if circuit open.
+# 15. Test _get_data_from_api only counts server errors and request errors as circuit breaker failures.
+
+# 16. Test _get_data_from_api sends hedged top items request and cancels the slower one.
+# 17. Test _get_data_from_api does not hedge if budget exhausted or endpoint not top items.
+
+# 18. Test _get_top_items_data reuses cached top items if data API responds not modified.
+# 19. Test _get_top_items_data sends If-Modified-Since if only Last-Modified cached.
+# 20. Test _get_top_items_data does not share cached top items between users.
+
+# 21. Test get_user_spotify_data only fetches requested time ranges and reports the rest as unchanged.
+
+# 22. Test _get_top_items_data requests projected fields and limit and records compressed transfer.
+
+# 23. Test _get_all_top_items cancels sibling requests if one fails with non-retryable error.
+# 24. Test _get_all_top_items retries retryable error without cancelling sibling requests.
+# 25. Test get_user_spotify_data raises DeadlineExceededException and cancels requests if timeout elapses.
+
+# 26. Test _get_top_items_data raises DataServiceException if data API responds not modified to unconditional request.
+
 
 @pytest.fixture
 def mock_post_request() -> Mock:
@@ -105,7 +138,13 @@ async def test__get_data_from_api_calls_client_post_with_expected_params(
 
     await data_service._get_data_from_api(url="url", json_data={"key": "value"})
 
-    mock_post_request.assert_called_once_with(url="url", params=None, json={"key": "value"}, timeout=10.0)
+    mock_post_request.assert_called_once_with(
+        url="url",
+        params=None,
+        json={"key": "value"},
+        headers=None,
+        timeout=10.0
+    )
 
 
 @pytest.fixture
@@ -279,9 +318,9 @@ async def test__get_all_top_items_calls_expected_methods_with_expected_params(da
     await data_service._get_all_top_items(access_token="access", item_type=ItemType.TRACK)
 
     expected_calls = [
-        call(access_token="access", item_type=ItemType.TRACK, time_range=TimeRange.SHORT),
-        call(access_token="access", item_type=ItemType.TRACK, time_range=TimeRange.MEDIUM),
-        call(access_token="access", item_type=ItemType.TRACK, time_range=TimeRange.LONG)
+        call(access_token="access", item_type=ItemType.TRACK, time_range=TimeRange.SHORT, user_id=None),
+        call(access_token="access", item_type=ItemType.TRACK, time_range=TimeRange.MEDIUM, user_id=None),
+        call(access_token="access", item_type=ItemType.TRACK, time_range=TimeRange.LONG, user_id=None)
     ]
     mock__get_top_items_data.assert_has_calls(expected_calls, any_order=False)
     assert mock__get_top_items_data.call_count == 3
@@ -309,10 +348,461 @@ async def test_get_user_spotify_data_returns_expected_user_spotify_data(data_ser
     assert user_spotify_data == expected_user_spotify_data
     mock__refresh_tokens.assert_called_once_with("ghi")
     expected__get_all_top_items_calls = [
-        call(access_token="abc", item_type=ItemType.ARTIST),
-        call(access_token="abc", item_type=ItemType.TRACK),
-        call(access_token="abc", item_type=ItemType.GENRE),
-        call(access_token="abc", item_type=ItemType.EMOTION)
+        call(access_token="abc", item_type=ItemType.ARTIST, user_id=None, time_ranges=list(TimeRange)),
+        call(access_token="abc", item_type=ItemType.TRACK, user_id=None, time_ranges=list(TimeRange)),
+        call(access_token="abc", item_type=ItemType.GENRE, user_id=None, time_ranges=list(TimeRange)),
+        call(access_token="abc", item_type=ItemType.EMOTION, user_id=None, time_ranges=list(TimeRange))
     ]
     mock__get_all_top_items.assert_has_calls(expected__get_all_top_items_calls, any_order=False)
     assert mock__get_all_top_items.call_count == 4
+
+
+# 12. Test build_user_message parses raw responses and returns serialized message.
+def test_build_user_message_parses_raw_responses_and_returns_serialized_message():
+    responses = [
+        (ItemType.ARTIST, TimeRange.LONG, json.dumps([{"id": "1"}, {"id": "2"}]).encode()),
+        (ItemType.GENRE, TimeRange.SHORT, json.dumps([{"name": "genre1", "count": 3}]).encode())
+    ]
+
+    message = build_user_message(user_id="1", refresh_token="refresh", responses=responses)
+
+    assert json.loads(message) == {
+        "user_id": "1",
+        "refresh_token": "refresh",
+        "top_artists_data": [
+            {"top_artists": [{"id": "1", "position": 1}, {"id": "2", "position": 2}], "time_range": "long_term"}
+        ],
+        "top_tracks_data": [],
+        "top_genres_data": [{"top_genres": [{"name": "genre1", "count": 3}], "time_range": "short_term"}],
+        "top_emotions_data": []
+    }
+
+    with pytest.raises(DataServiceException):
+        build_user_message(user_id="1", refresh_token="refresh", responses=[(ItemType.ARTIST, TimeRange.LONG, b"{")])
+
+
+# 13. Test get_user_spotify_message builds message in a single executor call per user if executor set.
+@pytest.mark.asyncio
+async def test_get_user_spotify_message_builds_message_in_a_single_executor_call_per_user_if_executor_set(mocker):
+    local_data_api = LocalDataAPI()
+
+    for item_type in ItemType:
+        for time_range in TimeRange:
+            item = {"name": "name", "count": 1, "percentage": 0.5, "track_id": "1", "id": f"{item_type.value}1"}
+            local_data_api.set_top_items(item_type=item_type.value, time_range=time_range.value, items=[item])
+
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        mock_submit = mocker.spy(executor, "submit")
+        data_service = DataService(
+            client=local_data_api.client(),
+            data_api_base_url=local_data_api.base_url,
+            request_timeout=10.0,
+            executor=executor
+        )
+
+        message = await data_service.get_user_spotify_message(refresh_token="refresh", user_id="1", format_version=2)
+
+        assert mock_submit.call_count == 1
+
+    user_spotify_data = await data_service.get_user_spotify_data(refresh_token="refresh", user_id="1")
+    assert message == serialize_message(user_id="1", user_spotify_data=user_spotify_data, format_version=2).encode()
+
+
+@pytest.fixture
+def circuit_breakers() -> CircuitBreakerRegistry:
+    return CircuitBreakerRegistry(
+        settings=CircuitBreakerSettings(
+            failure_rate_threshold=0.5,
+            slow_call_rate_threshold=1.0,
+            slow_call_duration=10.0,
+            minimum_calls=2,
+            window_size=10,
+            open_duration=30.0,
+            half_open_max_calls=1
+        )
+    )
+
+
+# 14. Test _get_data_from_api raises CircuitOpenException without sending request if circuit open.
+@pytest.mark.asyncio
+async def test__get_data_from_api_raises_circuit_open_exception_without_sending_request_if_circuit_open(
+        mock_client,
+        mock_post_request,
+        circuit_breakers
+):
+    mock_client.post = mock_post_request
+    data_service = DataService(
+        client=mock_client,
+        data_api_base_url="http://test-url.com",
+        request_timeout=10.0,
+        circuit_breakers=circuit_breakers
+    )
+    circuit_breaker = circuit_breakers.get("/auth/tokens/refresh")
+    circuit_breaker.record(failed=True, latency=0.1)
+    circuit_breaker.record(failed=True, latency=0.1)
+
+    with pytest.raises(CircuitOpenException) as e:
+        await data_service._get_data_from_api(url="http://test-url.com/auth/tokens/refresh", json_data={})
+
+    assert isinstance(e.value, DataServiceException)
+    assert e.value.retry_after > 0
+    mock_post_request.assert_not_called()
+
+
+# 15. Test _get_data_from_api only counts server errors and request errors as circuit breaker failures.
+@pytest.mark.asyncio
+@pytest.mark.parametrize("status_code, expected_state", [(401, CircuitState.CLOSED), (503, CircuitState.OPEN)])
+async def test__get_data_from_api_only_counts_server_errors_as_circuit_breaker_failures(
+        mock_client,
+        mock_post_request,
+        mock_response,
+        circuit_breakers,
+        status_code,
+        expected_state
+):
+    mock_response.status_code = status_code
+    mock_post_request.return_value = mock_response
+    mock_client.post = mock_post_request
+    data_service = DataService(
+        client=mock_client,
+        data_api_base_url="http://test-url.com",
+        request_timeout=10.0,
+        circuit_breakers=circuit_breakers
+    )
+
+    for _ in range(2):
+        with pytest.raises(DataServiceException):
+            await data_service._get_data_from_api(url="http://test-url.com/data/me/top/artists", json_data={})
+
+    assert circuit_breakers.get("/data/me/top/artists").state == expected_state
+
+
+@pytest.fixture
+def hedging_data_service_factory():
+    def _create(delays: list[float], budget_ratio: float = 1.0) -> tuple[DataService, list]:
+        cancelled = []
+        delays_iterator = iter(delays)
+
+        async def post(url: str, params: dict | None, json: dict, headers: dict | None, timeout: float):
+            delay = next(delays_iterator)
+
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                cancelled.append(delay)
+                raise
+
+            mock_res = Mock()
+            mock_res.json.return_value = {"delay": delay}
+            return mock_res
+
+        mock_client = Mock()
+        mock_client.post = post
+        hedge_policy = HedgePolicy(
+            HedgeSettings(percentile=0.5, budget_ratio=budget_ratio, min_samples=1, window_size=10)
+        )
+        hedge_policy.observe(endpoint="/data/me/top/artists", latency=0.01)
+        hedge_policy.observe(endpoint="/auth/tokens/refresh", latency=0.01)
+        data_service = DataService(
+            client=mock_client,
+            data_api_base_url="http://test-url.com",
+            request_timeout=10.0,
+            hedge_policy=hedge_policy
+        )
+        return data_service, cancelled
+
+    return _create
+
+
+# 16. Test _get_data_from_api sends hedged top items request and cancels the slower one.
+@pytest.mark.asyncio
+async def test__get_data_from_api_sends_hedged_top_items_request_and_cancels_the_slower_one(
+        hedging_data_service_factory
+):
+    data_service, cancelled = hedging_data_service_factory(delays=[1.0, 0.02])
+
+    data = await data_service._get_data_from_api(url="http://test-url.com/data/me/top/artists", json_data={})
+    await asyncio.sleep(0)
+
+    assert data == {"delay": 0.02}
+    assert cancelled == [1.0]
+    assert data_service.hedge_policy.hedges == 1
+
+
+# 17. Test _get_data_from_api does not hedge if budget exhausted or endpoint not top items.
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "url, budget_ratio",
+    [("http://test-url.com/data/me/top/artists", 0.0), ("http://test-url.com/auth/tokens/refresh", 1.0)]
+)
+async def test__get_data_from_api_does_not_hedge_if_budget_exhausted_or_endpoint_not_top_items(
+        hedging_data_service_factory,
+        url,
+        budget_ratio
+):
+    data_service, cancelled = hedging_data_service_factory(delays=[0.1, 0.02], budget_ratio=budget_ratio)
+
+    data = await data_service._get_data_from_api(url=url, json_data={})
+
+    assert data == {"delay": 0.1}
+    assert cancelled == []
+    assert data_service.hedge_policy.hedges == 0
+
+
+@pytest.fixture
+def local_data_api() -> LocalDataAPI:
+    api = LocalDataAPI()
+    api.set_top_items(item_type="artist", time_range="short_term", items=[{"id": "1"}, {"id": "2"}])
+    return api
+
+
+@pytest.fixture
+def caching_data_service_factory(local_data_api):
+    def _create(top_items_cache: TopItemsCache) -> DataService:
+        return DataService(
+            client=local_data_api.client(),
+            data_api_base_url=local_data_api.base_url,
+            request_timeout=10.0,
+            top_items_cache=top_items_cache
+        )
+
+    return _create
+
+
+# 18. Test _get_top_items_data reuses cached top items if data API responds not modified.
+@pytest.mark.asyncio
+async def test__get_top_items_data_reuses_cached_top_items_if_data_api_responds_not_modified(
+        local_data_api,
+        caching_data_service_factory
+):
+    data_service = caching_data_service_factory(TopItemsCache(max_entries=10))
+
+    first_top_items = await data_service._get_top_items_data(
+        access_token="access",
+        item_type=ItemType.ARTIST,
+        time_range=TimeRange.SHORT,
+        user_id="1"
+    )
+    second_top_items = await data_service._get_top_items_data(
+        access_token="access",
+        item_type=ItemType.ARTIST,
+        time_range=TimeRange.SHORT,
+        user_id="1"
+    )
+
+    assert second_top_items is first_top_items
+    assert first_top_items == TopArtistsData(
+        top_artists=[TopArtist(id="1", position=1), TopArtist(id="2", position=2)],
+        time_range=TimeRange.SHORT
+    )
+    assert local_data_api.not_modified_responses == 1
+    assert "If-None-Match" in local_data_api.requests[1].headers
+
+
+# 19. Test _get_top_items_data sends If-Modified-Since if only Last-Modified cached.
+@pytest.mark.asyncio
+async def test__get_top_items_data_sends_if_modified_since_if_only_last_modified_cached(
+        local_data_api,
+        caching_data_service_factory
+):
+    top_items_cache = TopItemsCache(max_entries=10)
+    data_service = caching_data_service_factory(top_items_cache)
+    await data_service._get_top_items_data(
+        access_token="access",
+        item_type=ItemType.ARTIST,
+        time_range=TimeRange.SHORT,
+        user_id="1"
+    )
+    top_items_cache.get(user_id="1", item_type=ItemType.ARTIST, time_range=TimeRange.SHORT).etag = None
+
+    top_items = await data_service._get_top_items_data(
+        access_token="access",
+        item_type=ItemType.ARTIST,
+        time_range=TimeRange.SHORT,
+        user_id="1"
+    )
+
+    assert "If-Modified-Since" in local_data_api.requests[1].headers
+    assert "If-None-Match" not in local_data_api.requests[1].headers
+    assert local_data_api.not_modified_responses == 1
+    assert top_items.top_artists == [TopArtist(id="1", position=1), TopArtist(id="2", position=2)]
+
+
+# 20. Test _get_top_items_data does not share cached top items between users.
+@pytest.mark.asyncio
+async def test__get_top_items_data_does_not_share_cached_top_items_between_users(
+        local_data_api,
+        caching_data_service_factory
+):
+    data_service = caching_data_service_factory(TopItemsCache(max_entries=10))
+
+    for user_id in ["1", "2"]:
+        await data_service._get_top_items_data(
+            access_token="access",
+            item_type=ItemType.ARTIST,
+            time_range=TimeRange.SHORT,
+            user_id=user_id
+        )
+
+    assert local_data_api.not_modified_responses == 0
+    assert "If-None-Match" not in local_data_api.requests[1].headers
+
+
+# 21. Test get_user_spotify_data only fetches requested time ranges and reports the rest as unchanged.
+@pytest.mark.asyncio
+async def test_get_user_spotify_data_only_fetches_requested_time_ranges_and_reports_the_rest_as_unchanged(
+        data_service
+):
+    data_service._refresh_tokens = AsyncMock(return_value=Tokens(access_token="abc", refresh_token="def"))
+    data_service._get_top_items_data = AsyncMock(return_value=TopGenresData(top_genres=[], time_range=TimeRange.SHORT))
+    time_ranges = {
+        ItemType.ARTIST: [TimeRange.SHORT],
+        ItemType.TRACK: [TimeRange.SHORT, TimeRange.MEDIUM],
+        ItemType.GENRE: list(TimeRange),
+        ItemType.EMOTION: []
+    }
+
+    user_spotify_data = await data_service.get_user_spotify_data(
+        refresh_token="ghi",
+        user_id="1",
+        time_ranges=time_ranges
+    )
+
+    assert data_service._get_top_items_data.call_count == 6
+    assert len(user_spotify_data.top_artists_data) == 1
+    assert user_spotify_data.top_emotions_data == []
+    assert user_spotify_data.unchanged_time_ranges == {
+        ItemType.ARTIST: [TimeRange.MEDIUM, TimeRange.LONG],
+        ItemType.TRACK: [TimeRange.LONG],
+        ItemType.EMOTION: list(TimeRange)
+    }
+
+
+# 22. Test _get_top_items_data requests projected fields and limit and records compressed transfer.
+@pytest.mark.asyncio
+async def test__get_top_items_data_requests_projected_fields_and_limit_and_records_compressed_transfer():
+    local_data_api = LocalDataAPI()
+    items = [{"id": str(index), "name": f"artist{index}", "images": ["image"] * 10} for index in range(50)]
+    local_data_api.set_top_items(item_type="artist", time_range="short_term", items=items)
+    transfer_metrics = TransferMetrics()
+    data_service = DataService(
+        client=local_data_api.client(),
+        data_api_base_url=local_data_api.base_url,
+        request_timeout=10.0,
+        field_projection=True,
+        limits={ItemType.ARTIST: 20},
+        transfer_metrics=transfer_metrics
+    )
+
+    top_items_data = await data_service._get_top_items_data(
+        access_token="access",
+        item_type=ItemType.ARTIST,
+        time_range=TimeRange.SHORT
+    )
+
+    assert top_items_data == TopArtistsData(
+        top_artists=[TopArtist(id=str(index), position=index + 1) for index in range(20)],
+        time_range=TimeRange.SHORT
+    )
+    assert local_data_api.requests[0].url.params["fields"] == "id"
+    assert local_data_api.requests[0].url.params["limit"] == "20"
+    stats = transfer_metrics.summary()["/data/me/top/artists"]
+    assert stats["requests"] == 1
+    assert stats["decoded_bytes"] == len(json.dumps([{"id": item["id"]} for item in items[:20]]).encode())
+    assert stats["wire_bytes"] < stats["decoded_bytes"]
+
+
+def create_top_items_data_fake(failures: dict[TimeRange, list[Exception]], cancelled: list[TimeRange]):
+    async def fake_get_top_items_data(access_token: str, item_type: ItemType, time_range: TimeRange, user_id: str):
+        if failures.get(time_range):
+            raise failures[time_range].pop(0)
+
+        try:
+            await asyncio.sleep(0.05 if time_range == TimeRange.SHORT else 10)
+        except asyncio.CancelledError:
+            cancelled.append(time_range)
+            raise
+
+        return TopGenresData(top_genres=[], time_range=time_range)
+
+    return fake_get_top_items_data
+
+
+# 23. Test _get_all_top_items cancels sibling requests if one fails with non-retryable error.
+@pytest.mark.asyncio
+async def test__get_all_top_items_cancels_sibling_requests_if_one_fails_with_non_retryable_error(data_service):
+    cancelled = []
+    data_service._get_top_items_data = create_top_items_data_fake(
+        failures={TimeRange.MEDIUM: [DataServiceException("Unauthorised API request")]},
+        cancelled=cancelled
+    )
+
+    with pytest.raises(DataServiceException, match="Unauthorised API request"):
+        await asyncio.wait_for(
+            data_service._get_all_top_items(access_token="abc", item_type=ItemType.GENRE),
+            timeout=1
+        )
+
+    assert sorted(cancelled) == sorted([TimeRange.SHORT, TimeRange.LONG])
+
+
+# 24. Test _get_all_top_items retries retryable error without cancelling sibling requests.
+@pytest.mark.asyncio
+async def test__get_all_top_items_retries_retryable_error_without_cancelling_sibling_requests(mock_client):
+    data_service = DataService(
+        client=mock_client,
+        data_api_base_url="http://test-url.com",
+        request_timeout=10.0,
+        retry_attempts=1
+    )
+    cancelled = []
+    data_service._get_top_items_data = create_top_items_data_fake(
+        failures={TimeRange.SHORT: [RetryableDataServiceException("Unsuccessful API request")]},
+        cancelled=cancelled
+    )
+
+    all_top_items = await data_service._get_all_top_items(
+        access_token="abc",
+        item_type=ItemType.GENRE,
+        time_ranges=[TimeRange.SHORT]
+    )
+
+    assert all_top_items == [TopGenresData(top_genres=[], time_range=TimeRange.SHORT)]
+    assert cancelled == []
+
+
+# 25. Test get_user_spotify_data raises DeadlineExceededException and cancels requests if timeout elapses.
+@pytest.mark.asyncio
+async def test_get_user_spotify_data_raises_deadline_exceeded_exception_and_cancels_requests_if_timeout_elapses(
+        data_service
+):
+    cancelled = []
+    data_service._refresh_tokens = AsyncMock(return_value=Tokens(access_token="abc", refresh_token="def"))
+    data_service._get_top_items_data = create_top_items_data_fake(failures={}, cancelled=cancelled)
+
+    with pytest.raises(DeadlineExceededException):
+        await data_service.get_user_spotify_data(refresh_token="ghi", timeout=0.2)
+
+    assert sorted(cancelled) == sorted([TimeRange.MEDIUM, TimeRange.LONG])
+
+
+# 26. Test _get_top_items_data raises DataServiceException if data API responds not modified to unconditional request.
+@pytest.mark.asyncio
+@pytest.mark.parametrize("top_items_cache", [None, TopItemsCache(max_entries=10)])
+async def test__get_top_items_data_raises_data_service_exception_if_not_modified_to_unconditional_request(
+        top_items_cache
+):
+    data_service = DataService(
+        client=httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(304))),
+        data_api_base_url="http://test-url.com",
+        request_timeout=10.0,
+        top_items_cache=top_items_cache
+    )
+
+    with pytest.raises(DataServiceException):
+        await data_service._get_top_items_data(
+            access_token="access",
+            item_type=ItemType.ARTIST,
+            time_range=TimeRange.SHORT,
+            user_id="1"
+        )
@@ -0,0 +1,46 @@
+import asyncio
+import sys
+
+import pytest
+
+from src.event_loop import create_runner, get_runner
+
+# 1. Test get_runner returns None for per invocation event loop and shared runner otherwise.
+# 2. Test create_runner uses uvloop if requested and installed.
+# 3. Test create_runner falls back to asyncio if uvloop not installed.
+
+
+async def get_loop() -> asyncio.AbstractEventLoop:
+    return asyncio.get_running_loop()
+
+
+# 1. Test get_runner returns None for per invocation event loop and shared runner otherwise.
+def test_get_runner_returns_none_for_per_invocation_event_loop_and_shared_runner_otherwise():
+    get_runner.cache_clear()
+
+    assert get_runner("run") is None
+
+    runner = get_runner("asyncio")
+
+    try:
+        assert get_runner("asyncio") is runner
+        assert runner.run(get_loop()) is runner.run(get_loop())
+    finally:
+        runner.close()
+        get_runner.cache_clear()
+
+
+# 2. Test create_runner uses uvloop if requested and installed.
+def test_create_runner_uses_uvloop_if_requested_and_installed():
+    uvloop = pytest.importorskip("uvloop")
+
+    with create_runner("uvloop") as runner:
+        assert isinstance(runner.run(get_loop()), uvloop.Loop)
+
+
+# 3. Test create_runner falls back to asyncio if uvloop not installed.
+def test_create_runner_falls_back_to_asyncio_if_uvloop_not_installed(monkeypatch):
+    monkeypatch.setitem(sys.modules, "uvloop", None)
+
+    with create_runner("uvloop") as runner:
+        assert type(runner.run(get_loop())).__module__.startswith("asyncio")
@@ -0,0 +1,93 @@
+from unittest.mock import Mock
+
+import pytest
+
+from src.claim_check import LocalObjectStore
+from src.freshness import parse_max_ages, RefreshPlanner, InMemoryLastFetchedStore, ObjectStoreLastFetchedStore
+from src.models import ItemType, TimeRange
+
+# 1. Test parse_max_ages applies time range max ages to every item type and item type overrides on top.
+
+# 2. Test RefreshPlanner.plan returns every time range if never fetched.
+# 3. Test RefreshPlanner.plan only returns stale time ranges.
+# 4. Test RefreshPlanner.plan returns every time range if store fails.
+# 5. Test RefreshPlanner.record merges fetched time ranges into store.
+
+# 6. Test ObjectStoreLastFetchedStore returns empty dict if missing and stored last fetched times otherwise.
+
+DAY = 86400.0
+WEEK = 7 * DAY
+
+
+@pytest.fixture
+def refresh_planner() -> RefreshPlanner:
+    return RefreshPlanner(
+        max_ages=parse_max_ages('{"long_term": 604800, "medium_term": 86400}'),
+        store=InMemoryLastFetchedStore()
+    )
+
+
+def fetch_all_time_ranges() -> dict[ItemType, list[TimeRange]]:
+    return {item_type: list(TimeRange) for item_type in ItemType}
+
+
+# 1. Test parse_max_ages applies time range max ages to every item type and item type overrides on top.
+def test_parse_max_ages_applies_time_range_max_ages_to_every_item_type_and_item_type_overrides_on_top():
+    max_ages = parse_max_ages('{"genre:long_term": 1209600, "long_term": 604800}')
+
+    assert max_ages[(ItemType.GENRE, TimeRange.LONG)] == 1209600
+    assert max_ages[(ItemType.ARTIST, TimeRange.LONG)] == 604800
+    assert (ItemType.ARTIST, TimeRange.SHORT) not in max_ages
+
+
+# 2. Test RefreshPlanner.plan returns every time range if never fetched.
+def test_refresh_planner_plan_returns_every_time_range_if_never_fetched(refresh_planner):
+    assert refresh_planner.plan(user_id="1", now=0.0) == fetch_all_time_ranges()
+
+
+# 3. Test RefreshPlanner.plan only returns stale time ranges.
+@pytest.mark.parametrize(
+    "elapsed, expected_time_ranges",
+    [
+        (DAY / 2, [TimeRange.SHORT]),
+        (DAY, [TimeRange.SHORT, TimeRange.MEDIUM]),
+        (WEEK, [TimeRange.SHORT, TimeRange.MEDIUM, TimeRange.LONG])
+    ]
+)
+def test_refresh_planner_plan_only_returns_stale_time_ranges(refresh_planner, elapsed, expected_time_ranges):
+    refresh_planner.record(user_id="1", time_ranges=fetch_all_time_ranges(), now=0.0)
+
+    time_ranges = refresh_planner.plan(user_id="1", now=elapsed)
+
+    assert time_ranges == {item_type: expected_time_ranges for item_type in ItemType}
+
+
+# 4. Test RefreshPlanner.plan returns every time range if store fails.
+def test_refresh_planner_plan_returns_every_time_range_if_store_fails():
+    mock_store = Mock()
+    mock_store.get.side_effect = Exception("test")
+    refresh_planner = RefreshPlanner(max_ages=parse_max_ages('{"long_term": 604800}'), store=mock_store)
+
+    assert refresh_planner.plan(user_id="1", now=0.0) == fetch_all_time_ranges()
+
+
+# 5. Test RefreshPlanner.record merges fetched time ranges into store.
+def test_refresh_planner_record_merges_fetched_time_ranges_into_store(refresh_planner):
+    refresh_planner.record(user_id="1", time_ranges=fetch_all_time_ranges(), now=0.0)
+
+    refresh_planner.record(user_id="1", time_ranges={ItemType.ARTIST: [TimeRange.SHORT]}, now=10.0)
+
+    last_fetched = refresh_planner.store.get("1")
+    assert last_fetched[(ItemType.ARTIST, TimeRange.SHORT)] == 10.0
+    assert last_fetched[(ItemType.ARTIST, TimeRange.LONG)] == 0.0
+
+
+# 6. Test ObjectStoreLastFetchedStore returns empty dict if missing and stored last fetched times otherwise.
+def test_object_store_last_fetched_store_returns_empty_dict_if_missing_and_stored_times_otherwise(tmp_path):
+    store = ObjectStoreLastFetchedStore(LocalObjectStore(root=str(tmp_path)))
+
+    assert store.get("1") == {}
+
+    store.set(user_id="1", last_fetched={(ItemType.TRACK, TimeRange.MEDIUM): 5.0})
+
+    assert store.get("1") == {(ItemType.TRACK, TimeRange.MEDIUM): 5.0}
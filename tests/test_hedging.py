@@ -0,0 +1,57 @@
+import pytest
+
+from src.hedging import HedgePolicy
+from src.models import HedgeSettings
+
+# 1. Test HedgePolicy.hedge_delay returns None until minimum samples observed.
+# 2. Test HedgePolicy.hedge_delay returns configured percentile of endpoint latency.
+# 3. Test HedgePolicy.try_acquire_hedge keeps hedges within budget.
+# 4. Test HedgePolicy.try_acquire_hedge budget does not build up beyond the window.
+
+
+@pytest.fixture
+def hedge_policy() -> HedgePolicy:
+    return HedgePolicy(HedgeSettings(percentile=0.9, budget_ratio=0.1, min_samples=10, window_size=100))
+
+
+# 1. Test HedgePolicy.hedge_delay returns None until minimum samples observed.
+def test_hedge_policy_hedge_delay_returns_none_until_minimum_samples_observed(hedge_policy):
+    for _ in range(9):
+        hedge_policy.observe(endpoint="/data/me/top/artists", latency=0.1)
+
+    assert hedge_policy.hedge_delay("/data/me/top/artists") is None
+
+
+# 2. Test HedgePolicy.hedge_delay returns configured percentile of endpoint latency.
+def test_hedge_policy_hedge_delay_returns_configured_percentile_of_endpoint_latency(hedge_policy):
+    for index in range(1, 11):
+        hedge_policy.observe(endpoint="/data/me/top/artists", latency=index / 10)
+        hedge_policy.observe(endpoint="/data/me/top/tracks", latency=index)
+
+    assert hedge_policy.hedge_delay("/data/me/top/artists") == 0.9
+    assert hedge_policy.hedge_delay("/data/me/top/tracks") == 9
+
+
+# 3. Test HedgePolicy.try_acquire_hedge keeps hedges within budget.
+def test_hedge_policy_try_acquire_hedge_keeps_hedges_within_budget(hedge_policy):
+    for _ in range(19):
+        hedge_policy.hedge_delay("/data/me/top/artists")
+
+    assert hedge_policy.try_acquire_hedge()
+    assert not hedge_policy.try_acquire_hedge()
+
+    hedge_policy.hedge_delay("/data/me/top/artists")
+
+    assert hedge_policy.try_acquire_hedge()
+    assert hedge_policy.hedges == 2
+
+
+# 4. Test HedgePolicy.try_acquire_hedge budget does not build up beyond the window.
+def test_hedge_policy_try_acquire_hedge_budget_does_not_build_up_beyond_the_window(hedge_policy):
+    for _ in range(10000):
+        hedge_policy.hedge_delay("/data/me/top/artists")
+
+    acquired = [hedge_policy.try_acquire_hedge() for _ in range(20)]
+
+    assert acquired.count(True) == 10
+    assert hedge_policy.hedges == 10
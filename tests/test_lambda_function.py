@@ -6,11 +6,18 @@ from copy import deepcopy
 from unittest import mock
 from unittest.mock import Mock, AsyncMock
 
+import httpx
 import pytest
 
-from src.lambda_function import get_user_data_from_event, get_settings, add_user_spotify_data_to_queue, main
-from src.models import User, Settings, UserSpotifyData, TimeRange, TopArtist, TopArtistsData, TopTrack, TopTracksData, \
-    TopGenre, TopGenresData, TopEmotion, TopEmotionsData
+from src.claim_check import ClaimCheck, LocalObjectStore, read_message
+from src.result_cache import ResultCache
+from src.data_service import CircuitOpenException
+from src.event_loop import get_runner
+from src.lambda_function import get_user_data_from_event, get_settings, add_user_spotify_data_to_queue, main, \
+    get_queue_url_from_arn, get_timeout_from_context, lambda_handler, warm_up_container, get_client, get_sqs_client
+from src.message_format import create_message_data
+from src.models import User, Settings, UserSpotifyData, ItemType, TimeRange, TopArtist, TopArtistsData, TopTrack, \
+    TopTracksData, TopGenre, TopGenresData, TopEmotion, TopEmotionsData
 
 
 # 1. Test get_settings raises KeyError if any settings missing from environment.
@@ -25,6 +32,34 @@ from src.models import User, Settings, UserSpotifyData, TimeRange, TopArtist, To
 
 # 8. Test main calls expected methods with expected params.
 # 9. Test main closes async client if exception occurs.
+# 10. Test main releases message back to queue with delay if circuit open.
+
+# 11. Test get_queue_url_from_arn returns expected queue url.
+
+# 12. Test add_user_spotify_data_to_queue sends claim check pointer if message above threshold.
+
+# 13. Test create_message_data includes unchanged time ranges only if present.
+
+# 14. Test get_settings reads top items field projection and limits.
+
+# 15. Test get_timeout_from_context leaves margin before Lambda deadline only if enabled and time allows.
+
+# 16. Test lambda_handler reuses event loop and client across invocations.
+
+# 17. Test warm_up_container opens connections on the shared client and never raises.
+
+# 18. Test main republishes cached result for redelivered message and skips recently published user.
+
+# 19. Test get_settings accepts output queue urls in place of queue url.
+
+
+@pytest.fixture(autouse=True)
+def reset_clients():
+    get_client.cache_clear()
+    get_sqs_client.cache_clear()
+    yield
+    get_client.cache_clear()
+    get_sqs_client.cache_clear()
 
 
 # 1. Test get_settings raises KeyError if any settings missing from environment.
@@ -351,6 +386,8 @@ def test_main_calls_expected_methods_with_expected_params(mocker):
     mock_add_user_spotify_data_to_queue = mocker.patch("src.lambda_function.add_user_spotify_data_to_queue")
     mock_sqs = Mock()
     mocker.patch("src.lambda_function.boto3.client", return_value=mock_sqs)
+    mock_transfer_metrics = Mock()
+    mocker.patch("src.lambda_function.TransferMetrics", return_value=mock_transfer_metrics)
 
     asyncio.run(main({}))
 
@@ -360,9 +397,21 @@ def test_main_calls_expected_methods_with_expected_params(mocker):
     mock_data_service_class.assert_called_once_with(
         client=mock_client,
         data_api_base_url="data_url",
-        request_timeout=10.0
+        request_timeout=10.0,
+        circuit_breakers=None,
+        hedge_policy=None,
+        top_items_cache=None,
+        field_projection=False,
+        limits=None,
+        transfer_metrics=mock_transfer_metrics,
+        retry_attempts=0
+    )
+    mock_data_service.get_user_spotify_data.assert_called_once_with(
+        refresh_token="refresh",
+        user_id="1",
+        time_ranges=None,
+        timeout=None
     )
-    mock_data_service.get_user_spotify_data.assert_called_once_with("refresh")
     mock_add_user_spotify_data_to_queue.assert_called_once_with(
         sqs=mock_sqs,
         queue_url="queue_url",
@@ -373,7 +422,10 @@ def test_main_calls_expected_methods_with_expected_params(mocker):
             top_tracks_data=[],
             top_genres_data=[],
             top_emotions_data=[]
-        )
+        ),
+        claim_check=None,
+        format_version=1,
+        queue_router=None
     )
     mock_client_aclose.assert_called_once()
 
@@ -402,3 +454,260 @@ def test_main_closes_async_client_if_exception_occurs(mocker):
         asyncio.run(main({}))
 
     mock_client_aclose.assert_called_once()
+
+
+# 10. Test main releases message back to queue with delay if circuit open.
+def test_main_releases_message_back_to_queue_with_delay_if_circuit_open(mocker):
+    mocker.patch(
+        "src.lambda_function.get_settings",
+        return_value=Settings(
+            data_api_base_url="data_url",
+            request_timeout=10.0,
+            queue_url="queue_url"
+        )
+    )
+    mock_client = Mock()
+    mock_client.aclose = AsyncMock()
+    mocker.patch("src.lambda_function.httpx.AsyncClient", return_value=mock_client)
+    mock_data_service = Mock()
+    mock_data_service.get_user_spotify_data = AsyncMock(
+        side_effect=CircuitOpenException(message="Circuit open", retry_after=12.3)
+    )
+    mocker.patch("src.lambda_function.DataService", return_value=mock_data_service)
+    mock_add_user_spotify_data_to_queue = mocker.patch("src.lambda_function.add_user_spotify_data_to_queue")
+    mock_sqs = Mock()
+    mocker.patch("src.lambda_function.boto3.client", return_value=mock_sqs)
+    event = {
+        "Records": [
+            {
+                "body": json.dumps({"user_id": "1", "refresh_token": "refresh"}),
+                "receiptHandle": "receipt",
+                "eventSourceARN": "arn:aws:sqs:eu-north-1:123456789012:input-queue"
+            }
+        ]
+    }
+
+    with pytest.raises(CircuitOpenException):
+        asyncio.run(main(event))
+
+    mock_sqs.change_message_visibility.assert_called_once_with(
+        QueueUrl="https://sqs.eu-north-1.amazonaws.com/123456789012/input-queue",
+        ReceiptHandle="receipt",
+        VisibilityTimeout=13
+    )
+    mock_add_user_spotify_data_to_queue.assert_not_called()
+
+
+# 11. Test get_queue_url_from_arn returns expected queue url.
+def test_get_queue_url_from_arn_returns_expected_queue_url():
+    queue_url = get_queue_url_from_arn("arn:aws:sqs:eu-north-1:123456789012:queue-name")
+
+    assert queue_url == "https://sqs.eu-north-1.amazonaws.com/123456789012/queue-name"
+
+
+# 12. Test add_user_spotify_data_to_queue sends claim check pointer if message above threshold.
+def test_add_user_spotify_data_to_queue_sends_claim_check_pointer_if_message_above_threshold(tmp_path):
+    mock_sqs = Mock()
+    object_store = LocalObjectStore(root=str(tmp_path))
+    user_spotify_data = UserSpotifyData(
+        refresh_token="refresh",
+        top_artists_data=[
+            TopArtistsData(
+                top_artists=[TopArtist(id=str(index), position=index) for index in range(50)],
+                time_range=TimeRange.SHORT
+            )
+        ],
+        top_tracks_data=[],
+        top_genres_data=[],
+        top_emotions_data=[]
+    )
+
+    add_user_spotify_data_to_queue(
+        sqs=mock_sqs,
+        queue_url="url",
+        user_id="1",
+        user_spotify_data=user_spotify_data,
+        claim_check=ClaimCheck(object_store=object_store, threshold_bytes=500)
+    )
+
+    message = mock_sqs.send_message.call_args.kwargs["MessageBody"]
+    assert "claim_check" in json.loads(message)
+    message_data = read_message(body=message, object_store=object_store)
+    assert message_data["user_id"] == "1"
+    assert len(message_data["top_artists_data"][0]["top_artists"]) == 50
+
+
+# 13. Test create_message_data includes unchanged time ranges only if present.
+def test_create_message_data_includes_unchanged_time_ranges_only_if_present():
+    user_spotify_data = UserSpotifyData(
+        refresh_token=None,
+        top_artists_data=[],
+        top_tracks_data=[],
+        top_genres_data=[],
+        top_emotions_data=[]
+    )
+
+    assert "unchanged_time_ranges" not in create_message_data(user_id="1", user_spotify_data=user_spotify_data)
+
+    user_spotify_data.unchanged_time_ranges = {ItemType.ARTIST: [TimeRange.LONG]}
+
+    message_data = create_message_data(user_id="1", user_spotify_data=user_spotify_data)
+    assert message_data["unchanged_time_ranges"] == {"artist": ["long_term"]}
+
+
+# 14. Test get_settings reads top items field projection and limits.
+def test_get_settings_reads_top_items_field_projection_and_limits(monkeypatch):
+    with mock.patch.dict(os.environ, clear=True):
+        envvars = {
+            "DATA_API_BASE_URL": "DATA_API_BASE_URL",
+            "REQUEST_TIMEOUT": "10.0",
+            "QUEUE_URL": "QUEUE_URL",
+            "TOP_ITEMS_FIELD_PROJECTION": "true",
+            "TOP_ITEMS_LIMITS": json.dumps({"artist": 20, "genre": 10})
+        }
+        for key, value in envvars.items():
+            monkeypatch.setenv(key, value)
+
+        settings = get_settings()
+
+        assert settings.top_items_field_projection is True
+        assert settings.top_items_limits == {ItemType.ARTIST: 20, ItemType.GENRE: 10}
+
+
+# 15. Test get_timeout_from_context leaves margin before Lambda deadline only if enabled and time allows.
+@pytest.mark.parametrize("remaining_millis, expected_timeout", [(60000, 55.0), (5000, None), (3000, None)])
+def test_get_timeout_from_context_leaves_margin_before_lambda_deadline_only_if_enabled_and_time_allows(
+        monkeypatch,
+        remaining_millis,
+        expected_timeout
+):
+    mock_context = Mock()
+    mock_context.get_remaining_time_in_millis.return_value = remaining_millis
+    monkeypatch.delenv("USER_DEADLINE_ENABLED", raising=False)
+
+    assert get_timeout_from_context(mock_context) is None
+
+    monkeypatch.setenv("USER_DEADLINE_ENABLED", "true")
+
+    assert get_timeout_from_context(mock_context) == expected_timeout
+    assert get_timeout_from_context(None) is None
+
+
+# 16. Test lambda_handler reuses event loop and client across invocations.
+def test_lambda_handler_reuses_event_loop_and_client_across_invocations(mocker, monkeypatch):
+    get_runner.cache_clear()
+    monkeypatch.delenv("PROFILING_SAMPLE_RATE", raising=False)
+    invocations = []
+
+    async def fake_main(event, timeout, client):
+        invocations.append((asyncio.get_running_loop(), client))
+
+    mocker.patch("src.lambda_function.main", side_effect=fake_main)
+
+    try:
+        lambda_handler({}, None)
+        lambda_handler({}, None)
+    finally:
+        get_runner("asyncio").close()
+        get_runner.cache_clear()
+
+    assert invocations[0][0] is invocations[1][0]
+    assert invocations[0][1] is invocations[1][1]
+
+
+# 17. Test warm_up_container opens connections on the shared client and never raises.
+def test_warm_up_container_opens_connections_on_the_shared_client_and_never_raises(mocker, monkeypatch):
+    get_runner.cache_clear()
+    for key, value in {
+        "DATA_API_BASE_URL": "http://data-api.test",
+        "REQUEST_TIMEOUT": "10.0",
+        "QUEUE_URL": "queue_url",
+        "WARMUP_CONNECTIONS": "3"
+    }.items():
+        monkeypatch.setenv(key, value)
+    mock_sqs = Mock()
+    mocker.patch("src.lambda_function.boto3.client", return_value=mock_sqs)
+    mock_client = Mock()
+    mock_client.head = AsyncMock(return_value=httpx.Response(404))
+    mocker.patch("src.lambda_function.httpx.AsyncClient", return_value=mock_client)
+
+    try:
+        warm_up_container()
+    finally:
+        get_runner("asyncio").close()
+        get_runner.cache_clear()
+
+    assert mock_client.head.call_count == 3
+    mock_sqs.get_queue_attributes.assert_called_once_with(QueueUrl="queue_url", AttributeNames=["QueueArn"])
+
+    monkeypatch.setenv("WARMUP_CONNECTIONS", "not a number")
+    warm_up_container()
+
+
+# 18. Test main republishes cached result for redelivered message and skips recently published user.
+def test_main_republishes_cached_result_for_redelivered_message_and_skips_recently_published_user(mocker):
+    mocker.patch(
+        "src.lambda_function.get_settings",
+        return_value=Settings(data_api_base_url="data_url", request_timeout=10.0, queue_url="queue_url")
+    )
+    mock_client = Mock()
+    mock_client.aclose = AsyncMock()
+    mocker.patch("src.lambda_function.httpx.AsyncClient", return_value=mock_client)
+    user_spotify_data = UserSpotifyData(
+        refresh_token="new_refresh",
+        top_artists_data=[],
+        top_tracks_data=[],
+        top_genres_data=[],
+        top_emotions_data=[]
+    )
+    mock_data_service = Mock()
+    mock_data_service.get_user_spotify_data = AsyncMock(return_value=user_spotify_data)
+    mocker.patch("src.lambda_function.DataService", return_value=mock_data_service)
+    mock_add_user_spotify_data_to_queue = mocker.patch(
+        "src.lambda_function.add_user_spotify_data_to_queue",
+        side_effect=[Exception("send failed"), None]
+    )
+    mocker.patch("src.lambda_function.boto3.client", return_value=Mock())
+    result_cache = ResultCache(max_entries=10, freshness_window=60)
+    mocker.patch("src.lambda_function.get_result_cache", return_value=result_cache)
+
+    def create_event(message_id: str) -> dict:
+        return {
+            "Records": [
+                {"messageId": message_id, "body": json.dumps({"user_id": "1", "refresh_token": "refresh"})}
+            ]
+        }
+
+    with pytest.raises(Exception, match="send failed"):
+        asyncio.run(main(create_event("message1")))
+
+    asyncio.run(main(create_event("message1")))
+    asyncio.run(main(create_event("message2")))
+
+    mock_data_service.get_user_spotify_data.assert_called_once()
+    assert mock_add_user_spotify_data_to_queue.call_count == 2
+    assert mock_add_user_spotify_data_to_queue.call_args.kwargs["user_spotify_data"] == user_spotify_data
+
+
+# 19. Test get_settings accepts output queue urls in place of queue url.
+def test_get_settings_accepts_output_queue_urls_in_place_of_queue_url(monkeypatch):
+    with mock.patch.dict(os.environ, clear=True):
+        envvars = {
+            "DATA_API_BASE_URL": "DATA_API_BASE_URL",
+            "REQUEST_TIMEOUT": "10.0",
+            "OUTPUT_QUEUE_URLS": "queue_1, queue_2"
+        }
+        for key, value in envvars.items():
+            monkeypatch.setenv(key, value)
+
+        settings = get_settings()
+
+        assert settings.queue_url is None
+        assert settings.output_queue_urls == ["queue_1", "queue_2"]
+
+        monkeypatch.setenv("OUTPUT_QUEUE_URLS", "")
+
+        with pytest.raises(KeyError) as e:
+            get_settings()
+
+        assert "QUEUE_URL or OUTPUT_QUEUE_URLS" in str(e.value)
@@ -0,0 +1,96 @@
+import json
+
+import pytest
+
+from src.message_format import create_message_data, encode_user_spotify_data, decode_user_spotify_data, \
+    MessageFormatException
+from src.models import UserSpotifyData, TopArtistsData, TopArtist, TopTracksData, TopTrack, TopGenresData, TopGenre, \
+    TopEmotionsData, TopEmotion, TimeRange, ItemType
+
+# 1. Test encode_user_spotify_data stores each id and name once.
+# 2. Test decode_user_spotify_data returns exact user spotify data from dictionary-encoded message.
+# 3. Test decode_user_spotify_data returns exact user spotify data from original message.
+# 4. Test decode_user_spotify_data raises MessageFormatException if version unsupported or message invalid.
+
+
+@pytest.fixture
+def user_spotify_data() -> UserSpotifyData:
+    return UserSpotifyData(
+        refresh_token="refresh",
+        top_artists_data=[
+            TopArtistsData(
+                top_artists=[
+                    TopArtist(id=f"artist{index}", position=position) for position, index in enumerate(indices, 1)
+                ],
+                time_range=time_range
+            )
+            for time_range, indices in zip(TimeRange, [[1, 2, 3], [2, 3, 4], [3, 1, 5]])
+        ],
+        top_tracks_data=[
+            TopTracksData(
+                top_tracks=[TopTrack(id="track1", position=1), TopTrack(id="track2", position=2)],
+                time_range=time_range
+            )
+            for time_range in TimeRange
+        ],
+        top_genres_data=[
+            TopGenresData(
+                top_genres=[TopGenre(name="rock", count=3), TopGenre(name="pop", count=1)],
+                time_range=TimeRange.SHORT
+            )
+        ],
+        top_emotions_data=[
+            TopEmotionsData(
+                top_emotions=[
+                    TopEmotion(name="joy", percentage=0.3, track_id="track2"),
+                    TopEmotion(name="sadness", percentage=0.1, track_id="track3")
+                ],
+                time_range=TimeRange.LONG
+            )
+        ],
+        unchanged_time_ranges={ItemType.GENRE: [TimeRange.MEDIUM, TimeRange.LONG]}
+    )
+
+
+# 1. Test encode_user_spotify_data stores each id and name once.
+def test_encode_user_spotify_data_stores_each_id_and_name_once(user_spotify_data):
+    message_data = encode_user_spotify_data(user_id="1", user_spotify_data=user_spotify_data)
+
+    assert message_data["format_version"] == 2
+    assert message_data["ids"] == ["artist1", "artist2", "artist3", "artist4", "artist5", "track1", "track2", "track3"]
+    assert message_data["names"] == ["rock", "pop", "joy", "sadness"]
+    assert message_data["top_artists_data"][2] == {"time_range": "long_term", "ids": [2, 0, 4], "positions": [1, 2, 3]}
+    assert message_data["top_emotions_data"][0]["track_ids"] == [6, 7]
+
+
+# 2. Test decode_user_spotify_data returns exact user spotify data from dictionary-encoded message.
+def test_decode_user_spotify_data_returns_exact_user_spotify_data_from_dictionary_encoded_message(user_spotify_data):
+    message = json.dumps(create_message_data(user_id="1", user_spotify_data=user_spotify_data, format_version=2))
+
+    assert decode_user_spotify_data(json.loads(message)) == user_spotify_data
+
+
+# 3. Test decode_user_spotify_data returns exact user spotify data from original message.
+def test_decode_user_spotify_data_returns_exact_user_spotify_data_from_original_message(user_spotify_data):
+    message = json.dumps(create_message_data(user_id="1", user_spotify_data=user_spotify_data))
+
+    assert decode_user_spotify_data(json.loads(message)) == user_spotify_data
+
+
+# 4. Test decode_user_spotify_data raises MessageFormatException if version unsupported or message invalid.
+@pytest.mark.parametrize("message_data", [
+    {"format_version": 3},
+    {"format_version": 2, "refresh_token": None, "ids": [], "names": []},
+    {
+        "format_version": 2,
+        "refresh_token": None,
+        "ids": [],
+        "names": [],
+        "top_artists_data": [{"time_range": "short_term", "ids": [0], "positions": [1]}]
+    }
+])
+def test_decode_user_spotify_data_raises_message_format_exception_if_version_unsupported_or_message_invalid(
+        message_data
+):
+    with pytest.raises(MessageFormatException):
+        decode_user_spotify_data(message_data)
@@ -0,0 +1,31 @@
+import pytest
+
+from src.metrics import TransferMetrics, LatencyTracker
+
+# 1. Test TransferMetrics sums requests and bytes per endpoint.
+# 2. Test LatencyTracker.percentile returns expected latency.
+
+
+# 1. Test TransferMetrics sums requests and bytes per endpoint.
+def test_transfer_metrics_sums_requests_and_bytes_per_endpoint():
+    transfer_metrics = TransferMetrics()
+
+    transfer_metrics.record(endpoint="/data/me/top/artists", wire_bytes=100, decoded_bytes=400)
+    transfer_metrics.record(endpoint="/data/me/top/artists", wire_bytes=50, decoded_bytes=200)
+    transfer_metrics.record(endpoint="/auth/tokens/refresh", wire_bytes=80, decoded_bytes=80)
+
+    assert transfer_metrics.summary() == {
+        "/data/me/top/artists": {"requests": 2, "wire_bytes": 150, "decoded_bytes": 600},
+        "/auth/tokens/refresh": {"requests": 1, "wire_bytes": 80, "decoded_bytes": 80}
+    }
+
+
+# 2. Test LatencyTracker.percentile returns expected latency.
+@pytest.mark.parametrize("percentile, expected_latency", [(0.5, 5), (0.9, 9), (0.99, 10), (0.0, 1)])
+def test_latency_tracker_percentile_returns_expected_latency(percentile, expected_latency):
+    latency_tracker = LatencyTracker(window_size=10)
+
+    for latency in [10, 1, 9, 2, 8, 3, 7, 4, 6, 5]:
+        latency_tracker.observe(latency)
+
+    assert latency_tracker.percentile(percentile) == expected_latency
@@ -0,0 +1,47 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from src.process_pool import get_process_pool, parse_process_pool_workers, get_available_cpus
+
+# 1. Test parse_process_pool_workers returns available CPUs for auto and parses integers otherwise.
+
+# 2. Test get_process_pool returns None if workers less than 1.
+# 3. Test get_process_pool reuses the same pool across calls.
+# 4. Test get_process_pool returns None if process pool cannot be created.
+
+
+@pytest.fixture(autouse=True)
+def reset_process_pool():
+    get_process_pool.cache_clear()
+    yield
+    get_process_pool.cache_clear()
+
+
+# 1. Test parse_process_pool_workers returns available CPUs for auto and parses integers otherwise.
+@pytest.mark.parametrize("value, expected_workers", [("auto", get_available_cpus()), ("0", 0), ("3", 3)])
+def test_parse_process_pool_workers_returns_expected_workers(value, expected_workers):
+    assert parse_process_pool_workers(value) == expected_workers
+
+
+# 2. Test get_process_pool returns None if workers less than 1.
+def test_get_process_pool_returns_none_if_workers_less_than_1():
+    assert get_process_pool(0) is None
+
+
+# 3. Test get_process_pool reuses the same pool across calls.
+def test_get_process_pool_reuses_the_same_pool_across_calls():
+    process_pool = get_process_pool(1)
+
+    try:
+        assert isinstance(process_pool, ProcessPoolExecutor)
+        assert get_process_pool(1) is process_pool
+    finally:
+        process_pool.shutdown()
+
+
+# 4. Test get_process_pool returns None if process pool cannot be created.
+def test_get_process_pool_returns_none_if_process_pool_cannot_be_created(mocker):
+    mocker.patch("src.process_pool.ProcessPoolExecutor", side_effect=OSError("Function not implemented"))
+
+    assert get_process_pool(2) is None
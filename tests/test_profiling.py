@@ -0,0 +1,96 @@
+import asyncio
+import json
+import threading
+from unittest.mock import Mock
+
+import pytest
+
+from src.claim_check import LocalObjectStore
+from src.models import ProfilingSettings
+from src.profiling import SamplingProfiler, start_profiler
+
+# 1. Test start_profiler returns None if profiling disabled or invocation not sampled.
+# 2. Test SamplingProfiler separates cpu and await samples and saves collapsed stacks and summary.
+# 3. Test SamplingProfiler.finish does not raise if saving fails.
+# 4. Test SamplingProfiler counts waiting in uvloop as await and excludes other threads from cpu time.
+
+
+async def busy_then_wait():
+    deadline = asyncio.get_running_loop().time() + 0.1
+
+    while asyncio.get_running_loop().time() < deadline:
+        sum(range(1000))
+
+    await asyncio.sleep(0.1)
+
+
+# 1. Test start_profiler returns None if profiling disabled or invocation not sampled.
+def test_start_profiler_returns_none_if_profiling_disabled_or_invocation_not_sampled(tmp_path):
+    settings = ProfilingSettings(sample_rate=0.001, location=str(tmp_path), interval=0.01)
+
+    assert start_profiler(None) is None
+    assert start_profiler(settings, rng=lambda: 0.5) is None
+
+    profiler = start_profiler(settings, rng=lambda: 0.0005)
+    profiler.stop()
+    assert isinstance(profiler, SamplingProfiler)
+
+
+# 2. Test SamplingProfiler separates cpu and await samples and saves collapsed stacks and summary.
+def test_sampling_profiler_separates_cpu_and_await_samples_and_saves_collapsed_stacks_and_summary(tmp_path):
+    profiler = SamplingProfiler(object_store=LocalObjectStore(str(tmp_path)), interval=0.002)
+
+    profiler.start()
+    asyncio.run(busy_then_wait())
+    profiler.finish("request-id")
+
+    collapsed_files = list((tmp_path / "profiles").glob("*-request-id-*.collapsed"))
+    assert len(collapsed_files) == 1
+    collapsed = collapsed_files[0].read_text()
+    assert any(line.startswith("cpu;") and "busy_then_wait" in line for line in collapsed.splitlines())
+    assert any(line.startswith("await;") for line in collapsed.splitlines())
+
+    summary = json.loads(collapsed_files[0].with_suffix(".json").read_text())
+    assert summary["samples"]["cpu"] > 0 and summary["samples"]["await"] > 0
+    assert summary["await_seconds"] >= 0.05
+
+
+# 3. Test SamplingProfiler.finish does not raise if saving fails.
+def test_sampling_profiler_finish_does_not_raise_if_saving_fails():
+    mock_object_store = Mock()
+    mock_object_store.put.side_effect = Exception("test")
+    profiler = SamplingProfiler(object_store=mock_object_store, interval=0.01)
+    profiler.start()
+
+    profiler.finish()
+
+    mock_object_store.put.assert_called_once()
+
+
+# 4. Test SamplingProfiler counts waiting in uvloop as await and excludes other threads from cpu time.
+def test_sampling_profiler_counts_waiting_in_uvloop_as_await_and_excludes_other_threads_from_cpu_time(tmp_path):
+    uvloop = pytest.importorskip("uvloop")
+    stopping = threading.Event()
+
+    def spin():
+        while not stopping.is_set():
+            sum(range(1000))
+
+    busy_thread = threading.Thread(target=spin)
+    busy_thread.start()
+    profiler = SamplingProfiler(object_store=LocalObjectStore(str(tmp_path)), interval=0.002)
+
+    try:
+        profiler.start()
+
+        with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+            runner.run(asyncio.sleep(0.2))
+
+        profiler.stop()
+    finally:
+        stopping.set()
+        busy_thread.join()
+
+    summary = profiler.summary()
+    assert summary["samples"]["await"] > summary["samples"]["cpu"]
+    assert summary["cpu_seconds"] < 0.1
@@ -0,0 +1,116 @@
+import json
+from collections import Counter
+
+import pytest
+
+from src.lambda_function import add_user_spotify_data_to_queue
+from src.models import UserSpotifyData, TopGenresData, TopGenre, TimeRange
+from src.queue_router import QueueRouter, get_queue_router, parse_queue_urls
+from tests.local_sqs import LocalSQS
+
+# 1. Test QueueRouter always routes a user to the same queue and spreads users across queues.
+# 2. Test QueueRouter only moves users to a queue that is added.
+
+# 3. Test add_user_spotify_data_to_queue keeps each user's updates in order on one FIFO queue.
+# 4. Test add_user_spotify_data_to_queue drops duplicate content sent to FIFO queue.
+
+# 5. Test get_queue_router returns None if no queue urls and shared router otherwise.
+
+QUEUE_URLS = [f"https://sqs.eu-north-1.amazonaws.com/123456789012/output-{index}.fifo" for index in range(3)]
+
+
+def create_user_spotify_data(count: int) -> UserSpotifyData:
+    return UserSpotifyData(
+        refresh_token=None,
+        top_artists_data=[],
+        top_tracks_data=[],
+        top_genres_data=[TopGenresData(top_genres=[TopGenre(name="rock", count=count)], time_range=TimeRange.SHORT)],
+        top_emotions_data=[]
+    )
+
+
+# 1. Test QueueRouter always routes a user to the same queue and spreads users across queues.
+def test_queue_router_always_routes_a_user_to_the_same_queue_and_spreads_users_across_queues():
+    queue_router = QueueRouter(QUEUE_URLS)
+    user_ids = [str(index) for index in range(3000)]
+
+    assignments = {user_id: queue_router.get_queue_url(user_id) for user_id in user_ids}
+
+    rebuilt_queue_router = QueueRouter(QUEUE_URLS)
+    assert all(rebuilt_queue_router.get_queue_url(user_id) == assignments[user_id] for user_id in user_ids)
+    assert all(700 < count < 1300 for count in Counter(assignments.values()).values())
+
+
+# 2. Test QueueRouter only moves users to a queue that is added.
+def test_queue_router_only_moves_users_to_a_queue_that_is_added():
+    new_queue_url = "https://sqs.eu-north-1.amazonaws.com/123456789012/output-3.fifo"
+    before = QueueRouter(QUEUE_URLS)
+    after = QueueRouter([*QUEUE_URLS, new_queue_url])
+    user_ids = [str(index) for index in range(3000)]
+
+    moved = [user_id for user_id in user_ids if before.get_queue_url(user_id) != after.get_queue_url(user_id)]
+
+    assert all(after.get_queue_url(user_id) == new_queue_url for user_id in moved)
+    assert 450 < len(moved) < 1050
+
+
+# 3. Test add_user_spotify_data_to_queue keeps each user's updates in order on one FIFO queue.
+def test_add_user_spotify_data_to_queue_keeps_each_users_updates_in_order_on_one_fifo_queue():
+    local_sqs = LocalSQS()
+    queue_router = QueueRouter(QUEUE_URLS)
+    user_ids = [str(index) for index in range(30)]
+
+    for count in range(5):
+        for user_id in user_ids:
+            add_user_spotify_data_to_queue(
+                sqs=local_sqs,
+                queue_url=QUEUE_URLS[0],
+                user_id=user_id,
+                user_spotify_data=create_user_spotify_data(count),
+                queue_router=queue_router
+            )
+
+    assert all(local_sqs.messages(queue_url) for queue_url in QUEUE_URLS)
+
+    for user_id in user_ids:
+        queue_url = queue_router.get_queue_url(user_id)
+        messages = [
+            message for message in local_sqs.messages(queue_url) if message["Attributes"]["MessageGroupId"] == user_id
+        ]
+        counts = [json.loads(message["Body"])["top_genres_data"][0]["top_genres"][0]["count"] for message in messages]
+
+        assert counts == [0, 1, 2, 3, 4]
+        assert all(
+            message["Attributes"]["MessageGroupId"] != user_id
+            for other_queue_url in QUEUE_URLS
+            if other_queue_url != queue_url
+            for message in local_sqs.messages(other_queue_url)
+        )
+
+
+# 4. Test add_user_spotify_data_to_queue drops duplicate content sent to FIFO queue.
+def test_add_user_spotify_data_to_queue_drops_duplicate_content_sent_to_fifo_queue():
+    local_sqs = LocalSQS()
+
+    for count in [1, 1, 2]:
+        add_user_spotify_data_to_queue(
+            sqs=local_sqs,
+            queue_url=QUEUE_URLS[0],
+            user_id="1",
+            user_spotify_data=create_user_spotify_data(count)
+        )
+
+    assert len(local_sqs.messages(QUEUE_URLS[0])) == 2
+
+
+# 5. Test get_queue_router returns None if no queue urls and shared router otherwise.
+def test_get_queue_router_returns_none_if_no_queue_urls_and_shared_router_otherwise():
+    queue_urls = parse_queue_urls(f" {QUEUE_URLS[0]}, {QUEUE_URLS[1]},")
+
+    assert queue_urls == QUEUE_URLS[:2]
+    assert get_queue_router(None) is None
+    assert get_queue_router(queue_urls) is get_queue_router(list(queue_urls))
+    assert get_queue_router(QUEUE_URLS).queue_urls == QUEUE_URLS
+
+    with pytest.raises(ValueError):
+        QueueRouter([])
@@ -0,0 +1,154 @@
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
+
+import pytest
+
+from src.claim_check import LocalObjectStore
+from src.models import UserSpotifyData, TopArtistsData, TopArtist, TimeRange, ResultCacheSettings
+from src.result_cache import ResultCache, get_result_cache
+
+# 1. Test ResultCache.get_result returns cached result only within freshness window.
+# 2. Test ResultCache.was_recently_published only within freshness window.
+# 3. Test ResultCache shares results and published times through store.
+# 4. Test ResultCache treats store failures as misses.
+# 5. Test ResultCache is safe to use from several threads at once.
+# 6. Test ResultCache treats store entries that fail to decode as misses.
+
+# 5. Test ResultCache is safe to use from several threads at once.
+def test_result_cache_is_safe_to_use_from_several_threads_at_once(user_spotify_data):
+    result_cache = ResultCache(max_entries=4, freshness_window=60)
+
+    def use_cache(thread: int):
+        for i in range(5000):
+            key = str((thread + i) % 8)
+            result_cache.put_result(message_id=key, user_id=key, user_spotify_data=user_spotify_data)
+            result_cache.get_result(key)
+            result_cache.mark_published(key)
+            result_cache.was_recently_published(key)
+
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+
+    try:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for future in [executor.submit(use_cache, thread) for thread in range(8)]:
+                future.result()
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+    assert len(result_cache._results) <= 4
+    assert len(result_cache._published_at) <= 4
+
+
+# 6. Test ResultCache treats store entries that fail to decode as misses.
+@pytest.mark.parametrize(
+    "key, data",
+    [
+        ("results/messages/message.json", {"message_data": {"user_id": "1"}}),
+        ("results/messages/message.json", {"stored_at": 1000.0, "message_data": {"format_version": 2}}),
+        ("results/users/1.json", {}),
+    ]
+)
+def test_result_cache_treats_store_entries_that_fail_to_decode_as_misses(tmp_path, key, data):
+    store = LocalObjectStore(str(tmp_path))
+    store.put(key=key, data=json.dumps(data).encode())
+    result_cache = ResultCache(max_entries=10, freshness_window=60, store=store, clock=Clock())
+
+    assert result_cache.get_result("message") is None
+    assert result_cache.was_recently_published("1") is False
+
+
+# 7. Test get_result_cache returns None if settings missing and shared cache otherwise.
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def user_spotify_data() -> UserSpotifyData:
+    return UserSpotifyData(
+        refresh_token="refresh",
+        top_artists_data=[TopArtistsData(top_artists=[TopArtist(id="1", position=1)], time_range=TimeRange.SHORT)],
+        top_tracks_data=[],
+        top_genres_data=[],
+        top_emotions_data=[]
+    )
+
+
+# 1. Test ResultCache.get_result returns cached result only within freshness window.
+def test_result_cache_get_result_returns_cached_result_only_within_freshness_window(user_spotify_data):
+    clock = Clock()
+    result_cache = ResultCache(max_entries=10, freshness_window=60, clock=clock)
+    result_cache.put_result(message_id="message", user_id="1", user_spotify_data=user_spotify_data)
+
+    assert result_cache.get_result("message") == user_spotify_data
+    assert result_cache.get_result("other") is None
+    assert result_cache.get_result(None) is None
+
+    clock.now += 60
+
+    assert result_cache.get_result("message") is None
+
+
+# 2. Test ResultCache.was_recently_published only within freshness window.
+def test_result_cache_was_recently_published_only_within_freshness_window():
+    clock = Clock()
+    result_cache = ResultCache(max_entries=10, freshness_window=60, clock=clock)
+
+    assert result_cache.was_recently_published("1") is False
+
+    result_cache.mark_published("1")
+    clock.now += 59
+
+    assert result_cache.was_recently_published("1") is True
+
+    clock.now += 1
+
+    assert result_cache.was_recently_published("1") is False
+
+
+# 3. Test ResultCache shares results and published times through store.
+def test_result_cache_shares_results_and_published_times_through_store(tmp_path, user_spotify_data):
+    clock = Clock()
+    store = LocalObjectStore(str(tmp_path))
+    ResultCache(max_entries=10, freshness_window=60, store=store, clock=clock).put_result(
+        message_id="message",
+        user_id="1",
+        user_spotify_data=user_spotify_data
+    )
+    ResultCache(max_entries=10, freshness_window=60, store=store, clock=clock).mark_published("1")
+
+    result_cache = ResultCache(max_entries=10, freshness_window=60, store=store, clock=clock)
+
+    assert result_cache.get_result("message") == user_spotify_data
+    assert result_cache.was_recently_published("1") is True
+
+
+# 4. Test ResultCache treats store failures as misses.
+def test_result_cache_treats_store_failures_as_misses(user_spotify_data):
+    mock_store = Mock()
+    mock_store.get.side_effect = Exception("test")
+    mock_store.put.side_effect = Exception("test")
+    result_cache = ResultCache(max_entries=10, freshness_window=60, store=mock_store)
+
+    assert result_cache.get_result("message") is None
+    assert result_cache.was_recently_published("1") is False
+
+    result_cache.mark_published("1")
+
+    assert result_cache.was_recently_published("1") is True
+
+
+# 7. Test get_result_cache returns None if settings missing and shared cache otherwise.
+def test_get_result_cache_returns_none_if_settings_missing_and_shared_cache_otherwise():
+    settings = ResultCacheSettings(max_entries=10, freshness_window=60, store_location=None)
+
+    assert get_result_cache(None) is None
+    assert get_result_cache(settings) is get_result_cache(settings)
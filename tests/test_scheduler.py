@@ -0,0 +1,110 @@
+import asyncio
+import json
+
+import pytest
+
+from src.models import Priority
+from src.scheduler import PriorityScheduler, get_priority
+
+# 1. Test get_priority reads priority from message attributes or body and defaults to normal.
+
+# 2. Test PriorityScheduler serves higher priority users first when all slots are busy.
+# 3. Test PriorityScheduler keeps serving low priority users in proportion to their weight.
+# 4. Test PriorityScheduler frees slot if waiting user is cancelled.
+# 5. Test PriorityScheduler.summary reports latency per priority.
+
+
+async def run_in_order(scheduler: PriorityScheduler, priorities: list[Priority]) -> list[Priority]:
+    served = []
+    gate = asyncio.Event()
+
+    async def hold():
+        async with scheduler.slot(Priority.NORMAL):
+            await gate.wait()
+
+    async def process(priority: Priority):
+        async with scheduler.slot(priority):
+            served.append(priority)
+            await asyncio.sleep(0)
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    tasks = [asyncio.create_task(process(priority)) for priority in priorities]
+    await asyncio.sleep(0)
+    gate.set()
+    await asyncio.gather(holder, *tasks)
+    return served
+
+
+# 1. Test get_priority reads priority from message attributes or body and defaults to normal.
+@pytest.mark.parametrize("message, expected_priority", [
+    ({"Body": "{}", "MessageAttributes": {"priority": {"StringValue": "HIGH", "DataType": "String"}}}, Priority.HIGH),
+    ({"Body": json.dumps({"priority": "low"})}, Priority.LOW),
+    ({"Body": json.dumps({"priority": "urgent"})}, Priority.NORMAL),
+    ({"Body": "not json"}, Priority.NORMAL),
+    ({"Body": "{}"}, Priority.NORMAL)
+])
+def test_get_priority_reads_priority_from_message_attributes_or_body_and_defaults_to_normal(
+        message,
+        expected_priority
+):
+    assert get_priority(message) == expected_priority
+
+
+# 2. Test PriorityScheduler serves higher priority users first when all slots are busy.
+@pytest.mark.asyncio
+async def test_priority_scheduler_serves_higher_priority_users_first_when_all_slots_are_busy():
+    scheduler = PriorityScheduler(concurrency=1)
+
+    served = await run_in_order(scheduler, [Priority.LOW, Priority.NORMAL, Priority.HIGH])
+
+    assert served == [Priority.HIGH, Priority.NORMAL, Priority.LOW]
+
+
+# 3. Test PriorityScheduler keeps serving low priority users in proportion to their weight.
+@pytest.mark.asyncio
+async def test_priority_scheduler_keeps_serving_low_priority_users_in_proportion_to_their_weight():
+    scheduler = PriorityScheduler(concurrency=1, weights={Priority.HIGH: 3.0, Priority.NORMAL: 2.0, Priority.LOW: 1.0})
+
+    served = await run_in_order(scheduler, [Priority.LOW] * 4 + [Priority.HIGH] * 12)
+
+    assert served[:8].count(Priority.LOW) == 2
+    assert served.index(Priority.LOW) < 4
+
+
+# 4. Test PriorityScheduler frees slot if waiting user is cancelled.
+@pytest.mark.asyncio
+async def test_priority_scheduler_frees_slot_if_waiting_user_is_cancelled():
+    scheduler = PriorityScheduler(concurrency=1)
+    gate = asyncio.Event()
+
+    async def hold():
+        async with scheduler.slot(Priority.NORMAL):
+            await gate.wait()
+
+    async def wait_for_slot():
+        async with scheduler.slot(Priority.HIGH):
+            pass
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(wait_for_slot())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    gate.set()
+    await holder
+
+    await asyncio.wait_for(wait_for_slot(), timeout=1)
+
+
+# 5. Test PriorityScheduler.summary reports latency per priority.
+@pytest.mark.asyncio
+async def test_priority_scheduler_summary_reports_latency_per_priority():
+    now = [0.0]
+    scheduler = PriorityScheduler(concurrency=2, clock=lambda: now[0])
+
+    for latency in [1.0, 2.0, 3.0]:
+        async with scheduler.slot(Priority.HIGH):
+            now[0] += latency
+
+    assert scheduler.summary() == {"high": {"completed": 3, "p50": 2.0, "p95": 3.0}}
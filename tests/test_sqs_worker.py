@@ -0,0 +1,308 @@
+import asyncio
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from unittest.mock import Mock, AsyncMock
+
+import pytest
+
+from src.data_service import CircuitOpenException
+from src.models import UserSpotifyData, WorkerSettings
+from src.result_cache import ResultCache
+from src.scheduler import PriorityScheduler
+from src.sqs_worker import SQSWorker, get_worker_settings
+from tests.local_sqs import LocalSQS
+
+# 1. Test get_worker_settings returns expected settings with defaults.
+
+# 2. Test SQSWorker publishes every message and deletes it from the input queue.
+# 3. Test SQSWorker does not delete a message if processing fails.
+# 4. Test SQSWorker extends visibility timeout of slow messages.
+# 5. Test SQSWorker drains in-flight messages when stopped.
+# 6. Test SQSWorker releases message with delay if circuit open.
+# 7. Test SQSWorker fetches higher priority users first when scheduler concurrency reached.
+# 8. Test SQSWorker deletes message without fetching if user published within result cache window.
+# 9. Test SQSWorker keeps processing messages while the default executor is saturated.
+# 10. Test SQSWorker logs scheduler latency summary periodically while running.
+
+INPUT_QUEUE_URL = "input_queue_url"
+OUTPUT_QUEUE_URL = "output_queue_url"
+
+
+@pytest.fixture
+def local_sqs() -> LocalSQS:
+    return LocalSQS(time_scale=0.01)
+
+
+@pytest.fixture
+def mock_data_service() -> Mock:
+    mock_service = Mock()
+    mock_service.get_user_spotify_data = AsyncMock(
+        return_value=UserSpotifyData(
+            refresh_token="new_refresh",
+            top_artists_data=[],
+            top_tracks_data=[],
+            top_genres_data=[],
+            top_emotions_data=[]
+        )
+    )
+    mock_service.transfer_metrics = None
+    return mock_service
+
+
+@pytest.fixture
+def worker_factory(local_sqs, mock_data_service):
+    def _create(
+            visibility_timeout: int = 30,
+            scheduler: PriorityScheduler | None = None,
+            summary_interval: float = 60.0
+    ) -> SQSWorker:
+        return SQSWorker(
+            sqs=local_sqs,
+            data_service=mock_data_service,
+            input_queue_url=INPUT_QUEUE_URL,
+            output_queue_url=OUTPUT_QUEUE_URL,
+            pollers=3,
+            max_in_flight=15,
+            visibility_timeout=visibility_timeout,
+            wait_time_seconds=20,
+            delete_flush_interval=0.01,
+            scheduler=scheduler,
+            summary_interval=summary_interval
+        )
+
+    return _create
+
+
+def send_users(local_sqs: LocalSQS, count: int):
+    for index in range(count):
+        local_sqs.send_message(
+            QueueUrl=INPUT_QUEUE_URL,
+            MessageBody=json.dumps({"user_id": str(index), "refresh_token": f"refresh{index}"})
+        )
+
+
+async def run_until(worker: SQSWorker, condition, timeout: float = 5.0):
+    run_task = asyncio.create_task(worker.run())
+
+    async def wait_for_condition():
+        while not condition():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(wait_for_condition(), timeout=timeout)
+    worker.stop()
+    await asyncio.wait_for(run_task, timeout=timeout)
+
+
+# 1. Test get_worker_settings returns expected settings with defaults.
+def test_get_worker_settings_returns_expected_settings_with_defaults(monkeypatch):
+    with mock.patch.dict(os.environ, clear=True):
+        monkeypatch.setenv("INPUT_QUEUE_URL", "INPUT_QUEUE_URL")
+        monkeypatch.setenv("WORKER_POLLERS", "2")
+
+        worker_settings = get_worker_settings()
+
+        assert worker_settings == WorkerSettings(
+            input_queue_url="INPUT_QUEUE_URL",
+            pollers=2,
+            max_in_flight=20,
+            visibility_timeout=60
+        )
+
+
+# 2. Test SQSWorker publishes every message and deletes it from the input queue.
+@pytest.mark.asyncio
+async def test_sqs_worker_publishes_every_message_and_deletes_it_from_the_input_queue(local_sqs, worker_factory):
+    send_users(local_sqs, 25)
+    worker = worker_factory()
+
+    await run_until(worker, lambda: len(local_sqs.deleted.get(INPUT_QUEUE_URL, [])) == 25)
+
+    assert local_sqs.messages(INPUT_QUEUE_URL) == []
+    published_user_ids = sorted(
+        json.loads(message["Body"])["user_id"] for message in local_sqs.messages(OUTPUT_QUEUE_URL)
+    )
+    assert published_user_ids == sorted(str(index) for index in range(25))
+
+
+# 3. Test SQSWorker does not delete a message if processing fails.
+@pytest.mark.asyncio
+async def test_sqs_worker_does_not_delete_a_message_if_processing_fails(local_sqs, mock_data_service, worker_factory):
+    send_users(local_sqs, 1)
+    mock_data_service.get_user_spotify_data.side_effect = Exception("test")
+    worker = worker_factory()
+
+    await run_until(worker, lambda: mock_data_service.get_user_spotify_data.call_count == 1)
+
+    assert len(local_sqs.messages(INPUT_QUEUE_URL)) == 1
+    assert local_sqs.messages(OUTPUT_QUEUE_URL) == []
+
+
+# 4. Test SQSWorker extends visibility timeout of slow messages.
+@pytest.mark.asyncio
+async def test_sqs_worker_extends_visibility_timeout_of_slow_messages(local_sqs, mock_data_service, worker_factory):
+    send_users(local_sqs, 1)
+    get_user_spotify_data = mock_data_service.get_user_spotify_data
+
+    async def slow_get_user_spotify_data(
+            refresh_token: str,
+            user_id: str,
+            time_ranges: dict | None,
+            timeout: float | None
+    ) -> UserSpotifyData:
+        await asyncio.sleep(0.7)
+        return get_user_spotify_data.return_value
+
+    mock_data_service.get_user_spotify_data = slow_get_user_spotify_data
+    worker = worker_factory(visibility_timeout=1)
+
+    await run_until(worker, lambda: len(local_sqs.deleted.get(INPUT_QUEUE_URL, [])) == 1)
+
+    assert len(local_sqs.visibility_changes) == 1
+    assert len(local_sqs.messages(OUTPUT_QUEUE_URL)) == 1
+
+
+# 5. Test SQSWorker drains in-flight messages when stopped.
+@pytest.mark.asyncio
+async def test_sqs_worker_drains_in_flight_messages_when_stopped(local_sqs, mock_data_service, worker_factory):
+    send_users(local_sqs, 5)
+    started = asyncio.Event()
+    get_user_spotify_data = mock_data_service.get_user_spotify_data
+
+    async def slow_get_user_spotify_data(
+            refresh_token: str,
+            user_id: str,
+            time_ranges: dict | None,
+            timeout: float | None
+    ) -> UserSpotifyData:
+        started.set()
+        await asyncio.sleep(0.1)
+        return get_user_spotify_data.return_value
+
+    mock_data_service.get_user_spotify_data = slow_get_user_spotify_data
+    worker = worker_factory()
+
+    await run_until(worker, started.is_set)
+
+    assert len(local_sqs.messages(OUTPUT_QUEUE_URL)) == 5
+    assert local_sqs.messages(INPUT_QUEUE_URL) == []
+
+
+# 6. Test SQSWorker releases message with delay if circuit open.
+@pytest.mark.asyncio
+async def test_sqs_worker_releases_message_with_delay_if_circuit_open(local_sqs, mock_data_service, worker_factory):
+    send_users(local_sqs, 1)
+    mock_data_service.get_user_spotify_data.side_effect = CircuitOpenException(message="test", retry_after=4.5)
+    worker = worker_factory()
+
+    await run_until(worker, lambda: len(local_sqs.visibility_changes) == 1)
+
+    assert local_sqs.visibility_changes[0][1] == 5
+    assert len(local_sqs.messages(INPUT_QUEUE_URL)) == 1
+
+
+# 7. Test SQSWorker fetches higher priority users first when scheduler concurrency reached.
+@pytest.mark.asyncio
+async def test_sqs_worker_fetches_higher_priority_users_first_when_scheduler_concurrency_reached(
+        local_sqs,
+        mock_data_service,
+        worker_factory
+):
+    for index, priority in enumerate(["low", "low", "low", "high", "high", "high"]):
+        local_sqs.send_message(
+            QueueUrl=INPUT_QUEUE_URL,
+            MessageBody=json.dumps({"user_id": str(index), "refresh_token": f"refresh{index}"}),
+            MessageAttributes={"priority": {"StringValue": priority, "DataType": "String"}}
+        )
+
+    fetched_user_ids = []
+    get_user_spotify_data = mock_data_service.get_user_spotify_data
+
+    async def slow_get_user_spotify_data(
+            refresh_token: str,
+            user_id: str,
+            time_ranges: dict | None,
+            timeout: float | None
+    ) -> UserSpotifyData:
+        fetched_user_ids.append(user_id)
+        await asyncio.sleep(0.01)
+        return get_user_spotify_data.return_value
+
+    mock_data_service.get_user_spotify_data = slow_get_user_spotify_data
+    scheduler = PriorityScheduler(concurrency=1)
+    worker = worker_factory(scheduler=scheduler)
+
+    await run_until(worker, lambda: len(local_sqs.deleted.get(INPUT_QUEUE_URL, [])) == 6)
+
+    assert fetched_user_ids[:4] == ["0", "3", "4", "5"]
+    assert scheduler.summary()["high"]["completed"] == 3
+
+
+# 8. Test SQSWorker deletes message without fetching if user published within result cache window.
+@pytest.mark.asyncio
+async def test_sqs_worker_deletes_message_without_fetching_if_user_published_within_result_cache_window(
+        local_sqs,
+        mock_data_service
+):
+    send_users(local_sqs, 2)
+    result_cache = ResultCache(max_entries=10, freshness_window=60)
+    result_cache.mark_published("0")
+    worker = SQSWorker(
+        sqs=local_sqs,
+        data_service=mock_data_service,
+        input_queue_url=INPUT_QUEUE_URL,
+        output_queue_url=OUTPUT_QUEUE_URL,
+        pollers=1,
+        max_in_flight=10,
+        visibility_timeout=30,
+        delete_flush_interval=0.01,
+        result_cache=result_cache
+    )
+
+    await run_until(worker, lambda: len(local_sqs.deleted.get(INPUT_QUEUE_URL, [])) == 2)
+
+    mock_data_service.get_user_spotify_data.assert_called_once()
+    assert mock_data_service.get_user_spotify_data.call_args.kwargs["user_id"] == "1"
+    assert [json.loads(message["Body"])["user_id"] for message in local_sqs.messages(OUTPUT_QUEUE_URL)] == ["1"]
+    assert result_cache.was_recently_published("1") is True
+
+
+# 9. Test SQSWorker keeps processing messages while the default executor is saturated.
+@pytest.mark.asyncio
+async def test_sqs_worker_keeps_processing_messages_while_the_default_executor_is_saturated(local_sqs, worker_factory):
+    loop = asyncio.get_running_loop()
+    default_executor = ThreadPoolExecutor(max_workers=1)
+    loop.set_default_executor(default_executor)
+    release = threading.Event()
+    blocked = loop.run_in_executor(None, release.wait)
+    send_users(local_sqs, 5)
+    worker = worker_factory()
+
+    try:
+        await run_until(worker, lambda: len(local_sqs.deleted.get(INPUT_QUEUE_URL, [])) == 5)
+    finally:
+        release.set()
+        await blocked
+        default_executor.shutdown()
+
+    assert local_sqs.messages(INPUT_QUEUE_URL) == []
+
+
+# 10. Test SQSWorker logs scheduler latency summary periodically while running.
+@pytest.mark.asyncio
+async def test_sqs_worker_logs_scheduler_latency_summary_periodically_while_running(mocker, local_sqs, worker_factory):
+    mock_logger = mocker.patch("src.sqs_worker.logger")
+    send_users(local_sqs, 3)
+    worker = worker_factory(scheduler=PriorityScheduler(concurrency=1), summary_interval=0.02)
+    run_task = asyncio.create_task(worker.run())
+
+    await asyncio.sleep(0.2)
+    summaries_while_running = [
+        logged for logged in mock_logger.info.call_args_list if logged.args[0].startswith("Latency by priority")
+    ]
+    worker.stop()
+    await asyncio.wait_for(run_task, timeout=5.0)
+
+    assert len(summaries_while_running) >= 2
@@ -0,0 +1,52 @@
+from src.models import ItemType, TimeRange, CachedTopItems, TopGenresData
+from src.top_items_cache import TopItemsCache, get_top_items_cache
+
+# 1. Test TopItemsCache returns None if entry missing.
+# 2. Test TopItemsCache evicts least recently used entry when full.
+
+# 3. Test get_top_items_cache returns None if max entries less than 1 and shared cache otherwise.
+
+
+def create_cached_top_items(etag: str) -> CachedTopItems:
+    return CachedTopItems(
+        etag=etag,
+        last_modified=None,
+        top_items=TopGenresData(top_genres=[], time_range=TimeRange.SHORT)
+    )
+
+
+def put_genres(top_items_cache: TopItemsCache, user_id: str, etag: str):
+    top_items_cache.put(
+        user_id=user_id,
+        item_type=ItemType.GENRE,
+        time_range=TimeRange.SHORT,
+        cached_top_items=create_cached_top_items(etag)
+    )
+
+
+# 1. Test TopItemsCache returns None if entry missing.
+def test_top_items_cache_returns_none_if_entry_missing():
+    top_items_cache = TopItemsCache(max_entries=2)
+
+    assert top_items_cache.get(user_id="1", item_type=ItemType.GENRE, time_range=TimeRange.SHORT) is None
+
+
+# 2. Test TopItemsCache evicts least recently used entry when full.
+def test_top_items_cache_evicts_least_recently_used_entry_when_full():
+    top_items_cache = TopItemsCache(max_entries=2)
+    put_genres(top_items_cache, user_id="1", etag="a")
+    put_genres(top_items_cache, user_id="2", etag="b")
+    top_items_cache.get(user_id="1", item_type=ItemType.GENRE, time_range=TimeRange.SHORT)
+
+    put_genres(top_items_cache, user_id="3", etag="c")
+
+    assert len(top_items_cache) == 2
+    assert top_items_cache.get(user_id="1", item_type=ItemType.GENRE, time_range=TimeRange.SHORT).etag == "a"
+    assert top_items_cache.get(user_id="2", item_type=ItemType.GENRE, time_range=TimeRange.SHORT) is None
+
+
+# 3. Test get_top_items_cache returns None if max entries less than 1 and shared cache otherwise.
+def test_get_top_items_cache_returns_none_if_max_entries_less_than_1_and_shared_cache_otherwise():
+    assert get_top_items_cache(0) is None
+    assert get_top_items_cache(10) is get_top_items_cache(10)
+    assert get_top_items_cache(20) is not get_top_items_cache(10)
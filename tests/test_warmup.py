@@ -0,0 +1,52 @@
+import asyncio
+from unittest.mock import Mock
+
+import httpx
+import pytest
+
+from src.warmup import open_connections, warm_up
+
+# 1. Test open_connections counts any response as an open connection but not transport errors.
+# 2. Test warm_up continues past failed steps and reports what succeeded.
+
+
+# 1. Test open_connections counts any response as an open connection but not transport errors.
+@pytest.mark.asyncio
+async def test_open_connections_counts_any_response_as_an_open_connection_but_not_transport_errors():
+    responses = iter([httpx.Response(404), httpx.Response(200), None])
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        response = next(responses)
+
+        if response is None:
+            raise httpx.ConnectError("test")
+
+        return response
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handle)) as client:
+        assert await open_connections(client=client, url="http://data-api.test", connections=3) == 2
+
+
+# 2. Test warm_up continues past failed steps and reports what succeeded.
+def test_warm_up_continues_past_failed_steps_and_reports_what_succeeded():
+    mock_sqs = Mock()
+    mock_sqs.get_queue_attributes.side_effect = Exception("test")
+
+    async def handle_head(url: str) -> httpx.Response:
+        return httpx.Response(200)
+
+    mock_client = Mock()
+    mock_client.head = handle_head
+
+    with asyncio.Runner() as runner:
+        summary = warm_up(
+            data_api_base_url="http://data-api.test",
+            connections=2,
+            sqs=mock_sqs,
+            queue_url="queue_url",
+            runner=runner,
+            client=mock_client
+        )
+
+    assert summary["connections"] == 2
+    assert summary["sqs"] is False